@@ -19,6 +19,15 @@ from config import settings
 from routers import auth, agricultores, escolas, secretaria, dashboard, professores, fiscalizacao
 from middleware.security import SecurityHeadersMiddleware
 from middleware.logging import LoggingMiddleware
+from services.agregados import obter_agregados
+from services.consumo_colunar import obter_consumo_colunar
+from services.geolocation import obter_catalogo_produtores
+from services.matriz_proximidade import obter_matriz_proximidade, salvar_matriz_proximidade
+from services.ofertas import obter_indice_ofertas
+from services.llm import fechar_gateway_llm
+from services.fila_cardapios import obter_fila_cardapios, parar_fila_cardapios
+from services.pareceres_fiscais import obter_fila_pareceres, parar_fila_pareceres
+from storage import repositorio
 
 # Configurar logging
 logging.basicConfig(
@@ -53,7 +62,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["X-Total-Count", "X-Page-Count"],
+    expose_headers=["X-Total-Count", "X-Page-Count", "X-Next-Cursor"],
 )
 
 # 2. Trusted Host - Desabilitado para demo/hackathon
@@ -169,6 +178,30 @@ async def startup_event():
     logger.info("🚀 Conecta Merenda API iniciando...")
     logger.info(f"📍 Ambiente: {'Desenvolvimento' if settings.debug else 'Produção'}")
     logger.info(f"🌐 CORS habilitado para: {settings.cors_origins}")
+    
+    # Carregar dados em memória uma única vez
+    repositorio.carregar_todos()
+    
+    # Materializar agregados financeiros (mantidos a cada escrita de pedidos)
+    obter_agregados()
+    
+    # Espelho colunar do consumo diário (dashboards inteligentes)
+    obter_consumo_colunar()
+    
+    # Catálogo vetorizado de produtores (busca por proximidade)
+    obter_catalogo_produtores()
+    
+    # Matriz escola × produtor (reaproveita o arquivo salvo quando válido)
+    obter_matriz_proximidade()
+    
+    # Índice invertido de ofertas (busca por produto)
+    obter_indice_ofertas()
+    
+    # Workers da fila de cardápios (retoma jobs não concluídos)
+    obter_fila_cardapios()
+    
+    # Workers dos pareceres da IA sobre notas fiscais (retoma pendentes)
+    obter_fila_pareceres()
 
 
 @app.on_event("shutdown")
@@ -177,6 +210,18 @@ async def shutdown_event():
     Executado quando a aplicação é encerrada.
     """
     logger.info("🛑 Conecta Merenda API encerrando...")
+    
+    # Persistir as atualizações incrementais da matriz de proximidade
+    salvar_matriz_proximidade()
+    
+    # Parar os workers da fila de cardápios
+    parar_fila_cardapios()
+    
+    # Parar os workers dos pareceres fiscais
+    parar_fila_pareceres()
+    
+    # Fechar o pool de conexões do gateway de LLM
+    fechar_gateway_llm()
 
 
 # ========== MAIN ==========
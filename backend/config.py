@@ -34,6 +34,56 @@ class Settings(BaseSettings):
     # Configurações PNAE
     pnae_meta_percentage: int = 30
     
+    # Armazenamento: "json" (padrão, demos) ou "sqlite"
+    storage_backend: str = "json"
+    sqlite_path: str = ""  # Vazio = data/conecta_merenda.db
+    
+    # Journal append-only das coleções transacionais (backend json)
+    journal_compactar_apos: int = 1000
+    journal_fsync: bool = True
+    
+    # Snapshot binário (.snap) ao lado dos JSON, mapeado em memória na carga
+    snapshot_binario: bool = True
+    
+    # Cache de serialização (bytes JSON por registro) nas listagens
+    serializacao_cache: bool = True
+    
+    # Group commit: janela (ms) para juntar escritas e tamanho máximo do lote
+    escrita_janela_ms: float = 2.0
+    escrita_lote_maximo: int = 256
+    
+    # Planejamento em lote da secretaria: threads e pares escola × produtor
+    # a partir dos quais o ranking é dividido entre elas
+    planejamento_threads: int = 4
+    planejamento_pares_paralelo: int = 2_000_000
+    
+    # Gateway de LLM: timeout (s) por tentativa, novas tentativas, conexões
+    # no pool e chamadas simultâneas por modelo
+    llm_timeout_s: float = 60.0
+    llm_tentativas: int = 2
+    llm_conexoes: int = 20
+    llm_concorrencia_por_modelo: int = 8
+    
+    # Fila de cardápios: workers simultâneos e jobs pendentes aceitos
+    cardapio_workers: int = 2
+    cardapio_pendentes_maximo: int = 200
+    # Intervalo mínimo (s) entre gravações de `pratos_prontos` durante o streaming
+    cardapio_pratos_intervalo_s: float = 0.5
+    
+    # Prazo (s) da posse de um job pelas filas (cardápios e pareceres), renovado
+    # enquanto o processo trabalha; vencido, outro processo retoma o job
+    filas_posse_expiracao_s: int = 120
+    
+    # Workers que geram o parecer da IA das notas fiscais em segundo plano
+    parecer_fiscal_workers: int = 2
+    
+    # Prazo (s) comum às chamadas de IA do dashboard inteligente
+    dashboard_ia_prazo_s: float = 20.0
+    
+    # Cache das respostas da IA: entradas na LRU em memória de cada worker
+    # (o nível em disco, data/cache_ia.db, é compartilhado)
+    cache_ia_capacidade: int = 1024
+    
     @property
     def cors_origins(self) -> List[str]:
         """Retorna lista de origens CORS permitidas."""
@@ -0,0 +1,8 @@
+"""
+Configuração do pytest (testes em `tests/`).
+Este arquivo na raiz do backend coloca o diretório no sys.path, então os
+testes importam `storage`, `services` e `config` como a aplicação.
+"""
+
+# Script manual contra um servidor rodando (python test_api.py), não é do pytest
+collect_ignore = ["test_api.py"]
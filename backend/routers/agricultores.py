@@ -2,26 +2,21 @@
 Router de agricultores/produtores.
 Gerencia busca e informações de produtores rurais.
 """
-from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi import APIRouter, HTTPException, Query, Depends, Response
 from typing import List, Optional
-import json
-from pathlib import Path
 
-from schemas import ProdutorResponse, BuscaProdutoresRequest
-from services.geolocation import filtrar_por_raio, ordenar_produtores_por_match
+from schemas import ProdutorResponse, BuscaProdutoresRequest, BuscaOfertasRequest, OfertaProduto, RotaEntrega
+from services.geolocation import ResultadoMatch, obter_catalogo_produtores
+from services.matriz_proximidade import obter_matriz_proximidade
+from services.ofertas import obter_indice_ofertas
+from services.logistica import consolidar_entregas
 from routers.auth import verificar_token
+from routers.paginacao import codificar_cursor, decodificar_cursor_numerico
+from storage import repositorio
+from storage.serializacao import cache_serializacao
 
 router = APIRouter()
 
-# Caminho para os dados
-DATA_DIR = Path(__file__).parent.parent / "data"
-
-
-def carregar_produtores() -> List[dict]:
-    """Carrega lista de produtores do arquivo JSON."""
-    with open(DATA_DIR / "produtores.json", "r", encoding="utf-8") as f:
-        return json.load(f)
-
 
 @router.get(
     "/",
@@ -43,7 +38,7 @@ async def listar_produtores(
     - `avaliacao_minima`: Nota mínima (0-5)
     - `limite`: Máximo de resultados retornados
     """
-    produtores = carregar_produtores()
+    produtores = repositorio.colecao("produtores").todos()
     
     # Aplicar filtros
     if possui_dap is not None:
@@ -61,7 +56,11 @@ async def listar_produtores(
     # Limitar resultados
     produtores = produtores[:limite]
     
-    return produtores
+    # Registros já validados são servidos a partir dos bytes em cache
+    return Response(
+        content=cache_serializacao(ProdutorResponse, repositorio.colecao("produtores")).lista_json(produtores),
+        media_type="application/json"
+    )
 
 
 @router.get(
@@ -73,9 +72,7 @@ async def obter_produtor(produtor_id: str):
     """
     Retorna informações detalhadas de um produtor específico.
     """
-    produtores = carregar_produtores()
-    
-    produtor = next((p for p in produtores if p["id"] == produtor_id), None)
+    produtor = repositorio.colecao("produtores").obter(produtor_id)
     
     if not produtor:
         raise HTTPException(
@@ -83,7 +80,10 @@ async def obter_produtor(produtor_id: str):
             detail=f"Produtor com ID '{produtor_id}' não encontrado"
         )
     
-    return produtor
+    return Response(
+        content=cache_serializacao(ProdutorResponse, repositorio.colecao("produtores")).serializar(produtor),
+        media_type="application/json"
+    )
 
 
 @router.post(
@@ -104,45 +104,131 @@ async def buscar_produtores_proximos(
     - Calcula desconto por proximidade (até 20% para < 50km)
     - Ordena por melhor compatibilidade
     
+    **Paginação:** `top_k` limita a resposta aos k melhores matches (com
+    `offset` opcional); o cursor da próxima página vem no header
+    `X-Next-Cursor` e é repassado em `cursor`. O total de matches vem em
+    `X-Total-Count`.
+    
     **Requer autenticação JWT.**
     """
-    produtores = carregar_produtores()
-    
-    # Filtrar por raio
-    produtores_proximos = filtrar_por_raio(
-        produtores=produtores,
+    # Distâncias, filtros, scores e descontos em uma única passada vetorizada
+    produtores_ordenados, proxima, total = obter_catalogo_produtores().buscar_pagina(
         escola_lat=params.escola_latitude,
         escola_lon=params.escola_longitude,
-        raio_km=params.raio_km
+        raio_km=params.raio_km,
+        apenas_com_dap=params.apenas_com_dap,
+        categoria=params.categoria_produto,
+        avaliacao_minima=params.avaliacao_minima,
+        limite=params.top_k,
+        offset=params.offset,
+        apos=decodificar_cursor_numerico(params.cursor)
     )
     
-    # Aplicar filtros adicionais
-    if params.apenas_com_dap:
-        produtores_proximos = [p for p in produtores_proximos if p["possui_dap"]]
+    if not total:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Nenhum produtor encontrado em um raio de {params.raio_km}km com os critérios especificados"
+        )
     
-    if params.categoria_produto:
-        produtores_proximos = [
-            p for p in produtores_proximos
-            if any(prod["categoria"] == params.categoria_produto for prod in p["produtos"])
-        ]
+    return _resposta_busca(produtores_ordenados, proxima, total)
+
+
+@router.post(
+    "/ofertas",
+    response_model=List[OfertaProduto],
+    summary="Ofertas de um produto por proximidade"
+)
+async def buscar_ofertas_produto(
+    params: BuscaOfertasRequest,
+    response: Response,
+    token_data: dict = Depends(verificar_token)
+):
+    """
+    Quem vende um produto mais perto e mais barato?
+    
+    **Funcionalidades:**
+    - Busca pelo nome do produto (sem diferenciar acentos e maiúsculas)
+    - Preço já com o desconto por proximidade
+    - `ordenar_por`: `preco` (menor preço, empate pela distância) ou
+      `score` (mesmo ranking de `/buscar`)
+    - Retorna as `top_k` melhores ofertas; o total vem em `X-Total-Count`
     
-    if params.avaliacao_minima:
-        produtores_proximos = [p for p in produtores_proximos if p["avaliacao_media"] >= params.avaliacao_minima]
+    Usa o índice invertido de ofertas: só as ofertas do produto próximas
+    da escola são avaliadas.
     
-    # Calcular scores e ordenar
-    produtores_ordenados = ordenar_produtores_por_match(
-        produtores=produtores_proximos,
+    **Requer autenticação JWT.**
+    """
+    ofertas, total = obter_indice_ofertas().buscar(
+        produto=params.produto,
         escola_lat=params.escola_latitude,
-        escola_lon=params.escola_longitude
+        escola_lon=params.escola_longitude,
+        raio_km=params.raio_km,
+        top_k=params.top_k,
+        ordenar_por=params.ordenar_por,
+        categoria=params.categoria_produto,
+        apenas_com_dap=params.apenas_com_dap,
+        avaliacao_minima=params.avaliacao_minima
     )
     
-    if not produtores_ordenados:
+    if not ofertas:
         raise HTTPException(
             status_code=404,
-            detail=f"Nenhum produtor encontrado em um raio de {params.raio_km}km com os critérios especificados"
+            detail=f"Nenhuma oferta de '{params.produto}' em um raio de {params.raio_km}km com os critérios especificados"
+        )
+    
+    response.headers["X-Total-Count"] = str(total)
+    return ofertas
+
+
+@router.get(
+    "/por-escola/{escola_id}",
+    response_model=List[ProdutorResponse],
+    summary="Produtores recomendados para uma escola"
+)
+async def buscar_produtores_por_escola(
+    escola_id: str,
+    raio_km: int = Query(100, ge=10, le=200, description="Raio de busca em km"),
+    categoria_produto: Optional[str] = Query(None, description="Categoria de produto"),
+    apenas_com_dap: bool = Query(False, description="Apenas produtores com DAP"),
+    avaliacao_minima: float = Query(0.0, ge=0, le=5, description="Avaliação mínima"),
+    top_k: Optional[int] = Query(None, ge=1, le=100, description="Retornar apenas os k melhores matches"),
+    offset: int = Query(0, ge=0, description="Matches a pular antes da página"),
+    cursor: Optional[str] = Query(None, description="Cursor da página (header X-Next-Cursor)"),
+    token_data: dict = Depends(verificar_token)
+):
+    """
+    Mesmo ranking de `/buscar`, a partir da localização cadastrada da escola.
+    
+    As distâncias vêm prontas da matriz escola × produtor: a busca vira um
+    filtro sobre a linha da escola mais a ordenação por score. Aceita a
+    mesma paginação (`top_k`, `offset`, `cursor`).
+    
+    **Requer autenticação JWT.**
+    """
+    escola = repositorio.colecao("escolas").obter(escola_id)
+    if not escola:
+        raise HTTPException(status_code=404, detail="Escola não encontrada")
+    
+    produtores_ordenados, proxima, total = obter_catalogo_produtores().buscar_pagina(
+        escola_lat=escola["localizacao"]["latitude"],
+        escola_lon=escola["localizacao"]["longitude"],
+        raio_km=raio_km,
+        apenas_com_dap=apenas_com_dap,
+        categoria=categoria_produto,
+        avaliacao_minima=avaliacao_minima,
+        distancias=obter_matriz_proximidade().linha(escola_id),
+        limite=top_k,
+        offset=offset,
+        apos=decodificar_cursor_numerico(cursor)
+    )
+    
+    if not total:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Nenhum produtor encontrado em um raio de {raio_km}km com os critérios especificados"
         )
     
-    return produtores_ordenados
+    return _resposta_busca(produtores_ordenados, proxima, total)
 
 
 @router.get(
@@ -153,8 +239,7 @@ async def listar_produtos_produtor(produtor_id: str):
     """
     Lista todos os produtos oferecidos por um produtor específico.
     """
-    produtores = carregar_produtores()
-    produtor = next((p for p in produtores if p["id"] == produtor_id), None)
+    produtor = repositorio.colecao("produtores").obter(produtor_id)
     
     if not produtor:
         raise HTTPException(
@@ -169,6 +254,32 @@ async def listar_produtos_produtor(produtor_id: str):
     }
 
 
+@router.get(
+    "/{produtor_id}/rotas",
+    response_model=List[RotaEntrega],
+    summary="Rotas de entrega do produtor"
+)
+def obter_rotas_produtor(
+    produtor_id: str,
+    data_inicio: Optional[str] = Query(None, description="Data de entrega inicial (AAAA-MM-DD)"),
+    data_fim: Optional[str] = Query(None, description="Data de entrega final (AAAA-MM-DD)"),
+    token_data: dict = Depends(verificar_token)
+):
+    """
+    Entregas pendentes do produtor consolidadas em uma rota por dia: as
+    escolas na ordem de visita, saindo e voltando à propriedade.
+    
+    **Requer autenticação JWT.**
+    """
+    if not repositorio.colecao("produtores").obter(produtor_id):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Produtor com ID '{produtor_id}' não encontrado"
+        )
+    
+    return consolidar_entregas(data_inicio, data_fim, produtor_id)
+
+
 @router.get(
     "/{produtor_id}/avaliacoes",
     summary="Obter avaliações de um produtor"
@@ -177,8 +288,7 @@ async def obter_avaliacoes_produtor(produtor_id: str):
     """
     Retorna o resumo de avaliações de um produtor.
     """
-    produtores = carregar_produtores()
-    produtor = next((p for p in produtores if p["id"] == produtor_id), None)
+    produtor = repositorio.colecao("produtores").obter(produtor_id)
     
     if not produtor:
         raise HTTPException(
@@ -187,13 +297,7 @@ async def obter_avaliacoes_produtor(produtor_id: str):
         )
     
     # Carregar avaliações detalhadas
-    with open(DATA_DIR / "avaliacoes.json", "r", encoding="utf-8") as f:
-        todas_avaliacoes = json.load(f)
-    
-    avaliacoes_produtor = [
-        av for av in todas_avaliacoes
-        if av.get("produtor_id") == produtor_id
-    ]
+    avaliacoes_produtor = repositorio.colecao("avaliacoes").filtrar(produtor_id=produtor_id)
     
     return {
         "produtor_id": produtor_id,
@@ -202,3 +306,22 @@ async def obter_avaliacoes_produtor(produtor_id: str):
         "total_avaliacoes": produtor["total_avaliacoes"],
         "avaliacoes_recentes": avaliacoes_produtor[:10]  # Últimas 10
     }
+
+
+def _resposta_busca(resultados: List[ResultadoMatch], proxima: Optional[tuple], total: int) -> Response:
+    """
+    Resposta das buscas por proximidade com os headers de paginação.
+    
+    O JSON de cada produtor vem do cache de serialização (o registro não
+    muda entre buscas); só os campos calculados são escritos por resultado.
+    """
+    cache = cache_serializacao(ProdutorResponse, repositorio.colecao("produtores"))
+    conteudo = b",".join(
+        cache.serializar_com(resultado.produtor, resultado.campos_calculados())
+        for resultado in resultados
+    )
+    
+    headers = {"X-Total-Count": str(total)}
+    if proxima is not None:
+        headers["X-Next-Cursor"] = codificar_cursor(proxima)
+    return Response(content=b"[" + conteudo + b"]", media_type="application/json", headers=headers)
@@ -4,28 +4,15 @@ Endpoints consolidados para visualizações e métricas gerais.
 """
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.responses import HTMLResponse
-import json
-from pathlib import Path
 from collections import Counter
 from decimal import Decimal
 
 from routers.auth import verificar_token
 from services.dashboard_html import gerar_dashboard_html
+from storage import repositorio
 
 router = APIRouter()
 
-# Caminho para os dados
-DATA_DIR = Path(__file__).parent.parent / "data"
-
-
-def carregar_json(filename: str) -> list:
-    """Carrega arquivo JSON."""
-    filepath = DATA_DIR / filename
-    if filepath.exists():
-        with open(filepath, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
-
 
 @router.get("/visao-geral", summary="Visão geral do sistema")
 async def obter_visao_geral(token_data: dict = Depends(verificar_token)):
@@ -37,10 +24,10 @@ async def obter_visao_geral(token_data: dict = Depends(verificar_token)):
     - Valores transacionados
     - Status geral do programa
     """
-    escolas = carregar_json("escolas.json")
-    produtores = carregar_json("produtores.json")
-    pedidos = carregar_json("pedidos.json")
-    avaliacoes = carregar_json("avaliacoes.json")
+    escolas = repositorio.colecao("escolas")
+    produtores = repositorio.colecao("produtores")
+    pedidos = repositorio.colecao("pedidos").todos()
+    avaliacoes = repositorio.colecao("avaliacoes").todos()
     
     # Calcular métricas
     total_transacionado = sum(Decimal(str(p.get("valor_total", 0))) for p in pedidos)
@@ -56,8 +43,8 @@ async def obter_visao_geral(token_data: dict = Depends(verificar_token)):
     
     return {
         "totais": {
-            "escolas": len(escolas),
-            "produtores": len(produtores),
+            "escolas": escolas.contar(),
+            "produtores": produtores.contar(),
             "pedidos": len(pedidos),
             "avaliacoes": len(avaliacoes)
         },
@@ -81,7 +68,7 @@ async def obter_categorias_mais_compradas(token_data: dict = Depends(verificar_t
     Análise de quais categorias de produtos são mais demandadas.
     Útil para planejamento de produção.
     """
-    pedidos = carregar_json("pedidos.json")
+    pedidos = repositorio.colecao("pedidos").todos()
     
     # Contar produtos por categoria
     categorias_count = Counter()
@@ -120,7 +107,7 @@ async def obter_dados_mapa_produtores():
     Retorna coordenadas e informações básicas de todos os produtores
     para visualização em mapa interativo (Folium, Leaflet, etc).
     """
-    produtores = carregar_json("produtores.json")
+    produtores = repositorio.colecao("produtores").todos()
     
     dados_mapa = []
     for produtor in produtores:
@@ -150,8 +137,8 @@ async def obter_estatisticas_tempo_real(token_data: dict = Depends(verificar_tok
     
     Métricas atualizadas para monitoramento em dashboards live.
     """
-    pedidos = carregar_json("pedidos.json")
-    avaliacoes = carregar_json("avaliacoes.json")
+    pedidos = repositorio.colecao("pedidos").todos()
+    avaliacoes = repositorio.colecao("avaliacoes").todos()
     
     # Pedidos recentes (últimos 7 dias - simulado)
     pedidos_recentes = pedidos[-10:] if len(pedidos) > 10 else pedidos
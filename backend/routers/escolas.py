@@ -2,11 +2,11 @@
 Router de escolas.
 Gerencia pedidos, avaliações, feedbacks e sugestões de IA.
 """
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from typing import List
-import json
-from pathlib import Path
 from datetime import datetime
+import json
 import uuid
 
 from schemas import (
@@ -22,52 +22,42 @@ from schemas import (
     RelatorioCompraResponse,
     SolicitacaoCardapio,
     CardapioGerado,
+    JobCardapio,
     DashboardInteligente
 )
 from services.ia_cardapio import gerar_sugestao_substituicao, analisar_feedback_cardapio
-from services.ia_dashboard import gerar_cardapio_inteligente, gerar_dashboard_inteligente
+from services.cache_ia import obter_cache_ia
+from services.ia_dashboard import gerar_dashboard_inteligente
+from services.consumo_colunar import obter_consumo_colunar
+from services.fila_cardapios import COLECAO_JOBS, STATUS_FINAIS, FilaCheia, obter_fila_cardapios
 from services.pdf_reports import gerar_relatorio_compra_pdf, salvar_pdf
 from services.qrcode_gen import gerar_qrcode_pedido
 from routers.auth import verificar_token
+from routers.paginacao import ParametrosPaginacao, listar_paginado
+from storage import repositorio
+from storage.serializacao import cache_serializacao
 
 router = APIRouter()
 
-# Caminho para os dados
-DATA_DIR = Path(__file__).parent.parent / "data"
-
-
-def carregar_json(filename: str) -> list:
-    """Carrega arquivo JSON."""
-    filepath = DATA_DIR / filename
-    if filepath.exists():
-        with open(filepath, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
-
-
-def salvar_json(filename: str, data: list):
-    """Salva dados em arquivo JSON."""
-    with open(DATA_DIR / filename, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+# Espera máxima (s) entre eventos do SSE de um job (mantém a conexão viva e
+# relê a coleção, onde chegam as mudanças feitas por outros processos)
+INTERVALO_EVENTOS_S = 15.0
 
 
 @router.get("/", response_model=List[EscolaResponse], summary="Listar escolas")
-async def listar_escolas():
-    """Lista todas as escolas cadastradas no sistema."""
-    return carregar_json("escolas.json")
-
-
-@router.get("/{escola_id}", response_model=EscolaResponse, summary="Obter escola")
-async def obter_escola(escola_id: str):
-    """Retorna informações detalhadas de uma escola específica."""
-    escolas = carregar_json("escolas.json")
-    escola = next((e for e in escolas if e["id"] == escola_id), None)
-    
-    if not escola:
-        raise HTTPException(status_code=404, detail="Escola não encontrada")
+async def listar_escolas(
+    request: Request,
+    response: Response,
+    paginacao: ParametrosPaginacao = Depends()
+):
+    """
+    Lista todas as escolas cadastradas no sistema.
     
-    return escola
-
+    Aceita `limit`/`cursor` e `Accept: application/x-ndjson`.
+    """
+    return listar_paginado(
+        request, response, repositorio.colecao("escolas"), paginacao, modelo=EscolaResponse
+    )
 
 # ==================== PEDIDOS ====================
 
@@ -86,14 +76,12 @@ async def criar_pedido(
     4. Retorna dados com ID gerado
     """
     # Validar escola
-    escolas = carregar_json("escolas.json")
-    escola = next((e for e in escolas if e["id"] == pedido.escola_id), None)
+    escola = repositorio.colecao("escolas").obter(pedido.escola_id)
     if not escola:
         raise HTTPException(status_code=404, detail="Escola não encontrada")
     
     # Validar produtor
-    produtores = carregar_json("produtores.json")
-    produtor = next((p for p in produtores if p["id"] == pedido.produtor_id), None)
+    produtor = repositorio.colecao("produtores").obter(pedido.produtor_id)
     if not produtor:
         raise HTTPException(status_code=404, detail="Produtor não encontrado")
     
@@ -105,7 +93,7 @@ async def criar_pedido(
     
     # Criar pedido
     novo_pedido = {
-        "id": f"PED{str(uuid.uuid4())[:8].upper()}",
+        "id": None,  # Gerado pelo escritor da coleção
         "escola_id": pedido.escola_id,
         "produtor_id": pedido.produtor_id,
         "itens": [item.dict() for item in pedido.itens],
@@ -117,34 +105,40 @@ async def criar_pedido(
         "observacoes": pedido.observacoes
     }
     
-    # Salvar
-    pedidos = carregar_json("pedidos.json")
-    pedidos.append(novo_pedido)
-    salvar_json("pedidos.json", pedidos)
-    
-    return novo_pedido
+    # Salvar (group commit; responde após a gravação)
+    return await repositorio.escritor("pedidos").inserir_async(novo_pedido)
 
 
 @router.get("/pedidos", response_model=List[PedidoResponse], summary="Listar pedidos")
 async def listar_pedidos(
+    request: Request,
+    response: Response,
     escola_id: str = Query(None, description="Filtrar por escola"),
     produtor_id: str = Query(None, description="Filtrar por produtor"),
     status: str = Query(None, description="Filtrar por status"),
+    paginacao: ParametrosPaginacao = Depends(),
     token_data: dict = Depends(verificar_token)
 ):
-    """Lista pedidos com filtros opcionais."""
-    pedidos = carregar_json("pedidos.json")
+    """
+    Lista pedidos com filtros opcionais.
+    
+    Aceita `limit`/`cursor` e `Accept: application/x-ndjson`.
+    """
+    filtros = {}
     
     if escola_id:
-        pedidos = [p for p in pedidos if p["escola_id"] == escola_id]
+        filtros["escola_id"] = escola_id
     
     if produtor_id:
-        pedidos = [p for p in pedidos if p["produtor_id"] == produtor_id]
+        filtros["produtor_id"] = produtor_id
     
     if status:
-        pedidos = [p for p in pedidos if p["status"] == status]
+        filtros["status"] = status
     
-    return pedidos
+    return listar_paginado(
+        request, response, repositorio.colecao("pedidos"), paginacao,
+        filtros=filtros, modelo=PedidoResponse
+    )
 
 
 @router.get("/pedidos/{pedido_id}", response_model=PedidoResponse, summary="Obter pedido")
@@ -153,8 +147,7 @@ async def obter_pedido(
     token_data: dict = Depends(verificar_token)
 ):
     """Retorna detalhes de um pedido específico."""
-    pedidos = carregar_json("pedidos.json")
-    pedido = next((p for p in pedidos if p["id"] == pedido_id), None)
+    pedido = repositorio.colecao("pedidos").obter(pedido_id)
     
     if not pedido:
         raise HTTPException(status_code=404, detail="Pedido não encontrado")
@@ -175,24 +168,19 @@ async def criar_avaliacao(
     Atualiza automaticamente a média do produtor.
     """
     # Validar pedido existe
-    pedidos = carregar_json("pedidos.json")
-    pedido = next((p for p in pedidos if p["id"] == avaliacao.pedido_id), None)
+    pedido = repositorio.colecao("pedidos").obter(avaliacao.pedido_id)
     if not pedido:
         raise HTTPException(status_code=404, detail="Pedido não encontrado")
     
     # Criar avaliação
     nova_avaliacao = {
-        "id": f"AV{str(uuid.uuid4())[:8].upper()}",
+        "id": None,  # Gerado pelo escritor da coleção
         **avaliacao.dict(),
         "data_avaliacao": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     }
     
-    # Salvar
-    avaliacoes = carregar_json("avaliacoes.json")
-    avaliacoes.append(nova_avaliacao)
-    salvar_json("avaliacoes.json", avaliacoes)
-    
-    return nova_avaliacao
+    # Salvar (group commit; responde após a gravação)
+    return await repositorio.escritor("avaliacoes").inserir_async(nova_avaliacao)
 
 
 # ==================== FEEDBACK CARDÁPIO ====================
@@ -213,10 +201,8 @@ async def registrar_feedback(
         "data_registro": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     }
     
-    # Salvar em arquivo de feedbacks (criar se não existir)
-    feedbacks = carregar_json("feedbacks.json")
-    feedbacks.append(novo_feedback)
-    salvar_json("feedbacks.json", feedbacks)
+    # Salvar em arquivo de feedbacks (group commit; responde após a gravação)
+    await repositorio.escritor("feedbacks").inserir_async(novo_feedback)
     
     return {
         "message": "Feedback registrado com sucesso",
@@ -252,16 +238,16 @@ async def obter_sugestao_ia(
     ```
     """
     # Carregar dados necessários
-    escola = next((e for e in carregar_json("escolas.json") if e["id"] == request.escola_id), None)
+    escola = repositorio.colecao("escolas").obter(request.escola_id)
     if not escola:
         raise HTTPException(status_code=404, detail="Escola não encontrada")
     
     # Carregar produtores e safra
-    produtores = carregar_json("produtores.json")
-    safra = carregar_json("safra_regional.json")
+    produtores = repositorio.colecao("produtores").todos()
+    safra = repositorio.colecao("safra_regional").dados()
     
     # Gerar sugestão usando IA
-    sugestao = gerar_sugestao_substituicao(
+    sugestao = await gerar_sugestao_substituicao(
         produto_atual=request.produto_atual,
         motivo_troca=request.motivo_troca,
         produtos_disponiveis=produtores,
@@ -276,13 +262,30 @@ async def obter_sugestao_ia(
         if any(prod["nome"] == produto_sugerido for prod in p.get("produtos", []))
     ]
     
+    # O prompt pede os benefícios nutricionais como texto
+    beneficios = sugestao.get("beneficios_nutricionais", {})
+    if not isinstance(beneficios, dict):
+        beneficios = {"resumo": beneficios}
+    
     return {
         **sugestao,
         "producoes_disponiveis": produtores_disponiveis[:5],  # Top 5
-        "valor_nutricional_comparativo": sugestao.get("beneficios_nutricionais", {})
+        "valor_nutricional_comparativo": beneficios
     }
 
 
+@router.get("/sugestao-ia/cache", summary="Estatísticas do cache de sugestões da IA")
+async def obter_estatisticas_cache_ia(token_data: dict = Depends(verificar_token)):
+    """
+    **📈 Cache das sugestões da IA**
+    
+    Acertos na memória do worker e no disco compartilhado, faltas (chamadas
+    à IA), gravações, taxa de acerto e número de entradas em cada nível.
+    Os contadores são do processo que atende a requisição.
+    """
+    return obter_cache_ia().estatisticas()
+
+
 # ==================== RELATÓRIOS ====================
 
 @router.post("/relatorios", response_model=RelatorioCompraResponse, summary="Gerar relatório PDF")
@@ -300,15 +303,15 @@ async def gerar_relatorio(
     - Assinaturas para validação
     """
     # Buscar dados
-    pedido = next((p for p in carregar_json("pedidos.json") if p["id"] == request.pedido_id), None)
+    pedido = repositorio.colecao("pedidos").obter(request.pedido_id)
     if not pedido:
         raise HTTPException(status_code=404, detail="Pedido não encontrado")
     
-    escola = next((e for e in carregar_json("escolas.json") if e["id"] == request.escola_id), None)
+    escola = repositorio.colecao("escolas").obter(request.escola_id)
     if not escola:
         raise HTTPException(status_code=404, detail="Escola não encontrada")
     
-    produtor = next((p for p in carregar_json("produtores.json") if p["id"] == pedido["produtor_id"]), None)
+    produtor = repositorio.colecao("produtores").obter(pedido["produtor_id"])
     if not produtor:
         raise HTTPException(status_code=404, detail="Produtor não encontrado")
     
@@ -341,12 +344,12 @@ async def gerar_qrcode_rastreio(
     - Certificações do produtor
     - Dados da entrega
     """
-    pedido = next((p for p in carregar_json("pedidos.json") if p["id"] == pedido_id), None)
+    pedido = repositorio.colecao("pedidos").obter(pedido_id)
     if not pedido:
         raise HTTPException(status_code=404, detail="Pedido não encontrado")
     
-    escola = next((e for e in carregar_json("escolas.json") if e["id"] == pedido["escola_id"]), None)
-    produtor = next((p for p in carregar_json("produtores.json") if p["id"] == pedido["produtor_id"]), None)
+    escola = repositorio.colecao("escolas").obter(pedido["escola_id"])
+    produtor = repositorio.colecao("produtores").obter(pedido["produtor_id"])
     
     qrcode_base64 = gerar_qrcode_pedido(pedido_id, produtor, escola)
     
@@ -356,9 +359,15 @@ async def gerar_qrcode_rastreio(
     }
 
 
-@router.post("/cardapio-automatico", response_model=CardapioGerado)
+@router.post(
+    "/cardapio-automatico",
+    response_model=JobCardapio,
+    status_code=status.HTTP_202_ACCEPTED
+)
 def gerar_cardapio_automatico(
     solicitacao: SolicitacaoCardapio,
+    request: Request,
+    response: Response,
     usuario=Depends(verificar_token)
 ):
     """
@@ -382,45 +391,94 @@ def gerar_cardapio_automatico(
     
     Exemplo: prioridade_nutricao=7, prioridade_aceitacao=3
     = 70% peso em nutrição, 30% em aceitação
+    
+    **Geração em segundo plano:** responde na hora (202) com o job; o
+    cardápio sai em `GET /cardapio-automatico/jobs/{job_id}` (polling) ou
+    em `GET /cardapio-automatico/jobs/{job_id}/eventos` (Server-Sent Events).
     """
     try:
-        # Carregar dados necessários
-        consumo_historico = carregar_json("consumo_diario.json")
-        safra = carregar_json("safra_regional.json")
-        
-        # Filtrar histórico da escola
-        consumo_escola = [r for r in consumo_historico if r.get("escola_id") == solicitacao.escola_id]
-        
-        # Calcular período em dias
-        from datetime import datetime
-        data_inicio = datetime.fromisoformat(solicitacao.periodo_inicio)
-        data_fim = datetime.fromisoformat(solicitacao.periodo_fim)
-        periodo_dias = (data_fim - data_inicio).days + 1
-        
-        # Gerar cardápio com IA
-        cardapio = gerar_cardapio_inteligente(
-            escola_id=solicitacao.escola_id,
-            periodo_dias=periodo_dias,
-            tipo_refeicao=solicitacao.tipo_refeicao,
-            historico_consumo=consumo_escola,
-            safra_disponivel=safra.get("produtos_disponiveis", []),
-            prioridade_nutricao=solicitacao.prioridade_nutricao,
-            prioridade_aceitacao=solicitacao.prioridade_aceitacao,
-            restricoes=solicitacao.restricoes_alergias,
-            orcamento_diario=solicitacao.orcamento_diario
-        )
-        
-        # Adicionar datas aos pratos
-        cardapio["periodo_inicio"] = solicitacao.periodo_inicio
-        cardapio["periodo_fim"] = solicitacao.periodo_fim
-        
-        return cardapio
-        
-    except Exception as e:
+        datetime.fromisoformat(solicitacao.periodo_inicio)
+        datetime.fromisoformat(solicitacao.periodo_fim)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Período deve estar no formato YYYY-MM-DD")
+    
+    try:
+        job = obter_fila_cardapios().submeter(solicitacao.model_dump())
+    except FilaCheia as e:
         raise HTTPException(
-            status_code=500,
-            detail=f"Erro ao gerar cardápio: {str(e)}"
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Fila de cardápios cheia ({e}). Tente novamente em instantes."
         )
+    
+    response.headers["Location"] = str(request.url_for("obter_job_cardapio", job_id=job["id"]))
+    return job
+
+
+def _obter_job_cardapio(job_id: str) -> dict:
+    job = repositorio.colecao(COLECAO_JOBS).obter(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job de cardápio não encontrado")
+    return job
+
+
+@router.get("/cardapio-automatico/jobs/{job_id}", response_model=JobCardapio, summary="Consultar job de cardápio")
+async def obter_job_cardapio(
+    job_id: str,
+    usuario=Depends(verificar_token)
+):
+    """
+    **🍽️ Situação de um cardápio em geração**
+    
+    `status`: pendente → processando → concluido (com `resultado`) ou erro.
+    O job concluído é servido dos bytes JSON em cache: consultas repetidas
+    não validam nem serializam o cardápio de novo.
+    """
+    job = _obter_job_cardapio(job_id)
+    return Response(cache_serializacao(JobCardapio, repositorio.colecao(COLECAO_JOBS)).serializar(job), media_type="application/json")
+
+
+@router.get("/cardapio-automatico/jobs/{job_id}/eventos", summary="Acompanhar job de cardápio (SSE)")
+async def acompanhar_job_cardapio(
+    job_id: str,
+    usuario=Depends(verificar_token)
+):
+    """
+    **📡 Server-Sent Events do job de cardápio**
+    
+    Um evento por mudança de status (`event: pendente|processando|concluido|erro`,
+    `data:` com o job em JSON) e, durante a geração, um `event: prato` com
+    cada prato que a IA termina de escrever (gravados em grupos a cada
+    `cardapio_pratos_intervalo_s`). O stream termina no status final.
+    """
+    _obter_job_cardapio(job_id)
+    fila = obter_fila_cardapios()
+    cache = cache_serializacao(JobCardapio, repositorio.colecao(COLECAO_JOBS))
+    
+    async def eventos():
+        ultimo_status = None
+        pratos_enviados = 0
+        while True:
+            versao = fila.versao(job_id)
+            job = repositorio.colecao(COLECAO_JOBS).obter(job_id)
+            pratos = job.get("pratos_prontos") or []
+            novos = pratos[pratos_enviados:]
+            for prato in novos:
+                yield f"event: prato\ndata: {json.dumps(prato, ensure_ascii=False)}\n\n".encode("utf-8")
+            pratos_enviados += len(novos)
+            if job["status"] != ultimo_status:
+                ultimo_status = job["status"]
+                yield f"event: {ultimo_status}\ndata: ".encode("utf-8") + cache.serializar(job) + b"\n\n"
+                if ultimo_status in STATUS_FINAIS:
+                    return
+            elif not novos:
+                yield b": aguardando\n\n"
+            await fila.aguardar_mudanca(job_id, versao, INTERVALO_EVENTOS_S)
+    
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @router.get("/dashboard-inteligente/{escola_id}", response_model=DashboardInteligente)
@@ -455,20 +513,15 @@ def obter_dashboard_inteligente(
     - Beterraba rejeitada → Bolo de chocolate com beterraba
     """
     try:
-        # Carregar histórico de consumo
-        consumo_historico = carregar_json("consumo_diario.json")
-        
-        # Filtrar por escola e período
-        consumo_escola = [
-            r for r in consumo_historico 
-            if r.get("escola_id") == escola_id
-        ]
+        # Análise do histórico de consumo da escola (espelho colunar)
+        analise_consumo = obter_consumo_colunar().analisar(escola_id)
         
         # Gerar dashboard com IA
         dashboard = gerar_dashboard_inteligente(
             escola_id=escola_id,
-            historico_consumo=consumo_escola,
-            periodo_dias=periodo_dias
+            historico_consumo=None,
+            periodo_dias=periodo_dias,
+            analise=analise_consumo
         )
         
         return dashboard
@@ -478,3 +531,17 @@ def obter_dashboard_inteligente(
             status_code=500,
             detail=f"Erro ao gerar dashboard: {str(e)}"
         )
+
+
+# ==================== ESCOLA ====================
+# Rota dinâmica registrada por último para não capturar /pedidos etc.
+
+@router.get("/{escola_id}", response_model=EscolaResponse, summary="Obter escola")
+async def obter_escola(escola_id: str):
+    """Retorna informações detalhadas de uma escola específica."""
+    escola = repositorio.colecao("escolas").obter(escola_id)
+    
+    if not escola:
+        raise HTTPException(status_code=404, detail="Escola não encontrada")
+    
+    return escola
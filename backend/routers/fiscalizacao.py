@@ -3,12 +3,10 @@ Router de Fiscalização.
 - Diretoras: upload de notas fiscais
 - Governo: visualização de alertas e análises (EXCLUSIVO)
 """
-import json
 import logging
 from typing import List
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status
-from pathlib import Path
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 
 from schemas import (
     UploadNotaFiscal,
@@ -17,45 +15,19 @@ from schemas import (
     DashboardFiscalizacaoGoverno,
     RelatorioFiscalizacao
 )
-from services.ia_fiscalizacao import analisar_nota_fiscal_ia, gerar_dashboard_fiscalizacao_governo
+from services.ia_fiscalizacao import (
+    PARECER_PENDENTE,
+    analisar_nota_fiscal_regras,
+    gerar_dashboard_fiscalizacao_governo
+)
+from services.pareceres_fiscais import obter_fila_pareceres
 from routers.auth import verificar_token
+from routers.paginacao import ParametrosPaginacao, listar_paginado
+from storage import RegistroDuplicado, repositorio
 
 router = APIRouter(prefix="/api/v1/fiscalizacao", tags=["🔍 Fiscalização"])
 logger = logging.getLogger(__name__)
 
-# Caminho dos arquivos
-DATA_DIR = Path(__file__).parent.parent / "data"
-NOTAS_FILE = DATA_DIR / "notas_fiscais.json"
-ANALISES_FILE = DATA_DIR / "analises_fiscalizacao.json"
-
-
-def _carregar_notas() -> List[dict]:
-    """Carrega notas fiscais."""
-    if not NOTAS_FILE.exists():
-        return []
-    with open(NOTAS_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-
-def _salvar_notas(notas: List[dict]):
-    """Salva notas fiscais."""
-    with open(NOTAS_FILE, "w", encoding="utf-8") as f:
-        json.dump(notas, f, ensure_ascii=False, indent=2)
-
-
-def _carregar_analises() -> List[dict]:
-    """Carrega análises de fiscalização."""
-    if not ANALISES_FILE.exists():
-        return []
-    with open(ANALISES_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-
-def _salvar_analises(analises: List[dict]):
-    """Salva análises."""
-    with open(ANALISES_FILE, "w", encoding="utf-8") as f:
-        json.dump(analises, f, ensure_ascii=False, indent=2)
-
 
 # ==================== ENDPOINTS PARA DIRETORAS ====================
 
@@ -71,9 +43,10 @@ def enviar_nota_fiscal(
     
     **O sistema automaticamente:**
     1. Registra a nota fiscal
-    2. **Analisa com IA** (preços, fornecedor, produtos)
+    2. Analisa preços, fornecedor e produtos (regras locais, sem esperar a IA)
     3. Gera score de conformidade
     4. Detecta possíveis irregularidades
+    5. **Parecer da IA** das notas com alertas, anexado depois à análise
     
     **IMPORTANTE:** 
     - Diretoras NÃO veem os alertas de fiscalização
@@ -87,59 +60,57 @@ def enviar_nota_fiscal(
     - Arquivo PDF/foto da nota (opcional mas recomendado)
     """
     try:
-        notas = _carregar_notas()
-        
-        # Verificar duplicidade
-        if any(n["numero_nota"] == nota.numero_nota and n["escola_id"] == nota.escola_id 
-               for n in notas):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Nota fiscal já cadastrada para esta escola"
-            )
-        
-        # Gerar ID
-        nota_id = f"NF{len(notas) + 1:05d}"
+        notas = repositorio.colecao("notas_fiscais")
+        escritor_notas = repositorio.escritor("notas_fiscais")
         
-        # Preparar dados da nota
+        # Preparar dados da nota (id gerado pelo escritor da coleção)
         nota_dict = nota.model_dump()
-        nota_dict["id"] = nota_id
         nota_dict["data_upload"] = datetime.now().isoformat()
         nota_dict["status_analise"] = "em_analise"
         
-        # Salvar nota
-        notas.append(nota_dict)
-        _salvar_notas(notas)
+        # Salvar nota: o índice único (escola_id, numero_nota) rejeita duplicatas
+        # em O(1), verificado pelo escritor sem corrida entre requisições
+        try:
+            nota_dict = escritor_notas.inserir(nota_dict)
+        except RegistroDuplicado:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Nota fiscal já cadastrada para esta escola"
+            )
+        nota_id = nota_dict["id"]
         
-        # ===== ANÁLISE AUTOMÁTICA COM IA =====
-        # Carregar dados para contexto
-        historico_escola = [n for n in notas if n["escola_id"] == nota.escola_id]
+        # ===== ANÁLISE AUTOMÁTICA (REGRAS) =====
+        # Carregar dados para contexto (índice por escola: O(k) notas da escola)
+        historico_escola = notas.filtrar(escola_id=nota.escola_id)
         fornecedores_irregulares = []  # TODO: Carregar de lista real
         
-        # Analisar
-        analise = analisar_nota_fiscal_ia(
+        # Analisar: score e risco vêm só das regras locais
+        analise = analisar_nota_fiscal_regras(
             nota_dict,
             historico_escola,
             fornecedores_irregulares
         )
         
         # Salvar análise (SEPARADO das notas - governo acessa separadamente)
-        analises = _carregar_analises()
-        analises.append(analise)
-        _salvar_analises(analises)
+        analise = repositorio.escritor("analises_fiscalizacao").inserir(analise)
         
-        # Atualizar status da nota baseado na análise
-        nota_dict["conformidade_score"] = analise["conformidade_score"]
+        # Parecer do GPT em segundo plano: o upload não espera a IA
+        if analise["status_parecer"] == PARECER_PENDENTE:
+            obter_fila_pareceres().submeter(analise["id"])
         
+        # Atualizar status da nota baseado na análise
         if analise["conformidade_score"] >= 90:
-            nota_dict["status_analise"] = "aprovada"
+            status_analise = "aprovada"
         elif analise["conformidade_score"] >= 70:
-            nota_dict["status_analise"] = "aprovada"  # Aprovada mas com observações
+            status_analise = "aprovada"  # Aprovada mas com observações
         else:
-            nota_dict["status_analise"] = "com_alertas"  # Requer atenção
+            status_analise = "com_alertas"  # Requer atenção
         
         # Atualizar nota com status
-        notas[-1] = nota_dict
-        _salvar_notas(notas)
+        nota_dict = escritor_notas.atualizar(nota_id, {
+            "conformidade_score": analise["conformidade_score"],
+            "status_analise": status_analise
+        })
         
         logger.info(f"✅ Nota fiscal {nota_id} enviada e analisada - Score: {analise['conformidade_score']}")
         
@@ -167,6 +138,9 @@ def enviar_nota_fiscal(
 @router.get("/notas-fiscais/escola/{escola_id}", response_model=List[NotaFiscalResponse])
 def listar_notas_escola(
     escola_id: str,
+    request: Request,
+    response: Response,
+    paginacao: ParametrosPaginacao = Depends(),
     usuario=Depends(verificar_token)
 ):
     """
@@ -184,28 +158,23 @@ def listar_notas_escola(
     - Alertas detalhados (apenas governo vê)
     - Razões específicas de flags
     - Comparações com outras escolas
+    
+    **Paginação:** `limit` + `cursor` (header `X-Next-Cursor`) ou
+    `Accept: application/x-ndjson`.
     """
     try:
-        notas = _carregar_notas()
-        notas_escola = [n for n in notas if n["escola_id"] == escola_id]
-        
-        # Ordenar por data (mais recentes primeiro)
-        notas_escola.sort(key=lambda x: x.get("data_upload", ""), reverse=True)
-        
-        # Converter para response model (sem detalhes de fiscalização)
-        return [
-            NotaFiscalResponse(
-                id=n["id"],
-                escola_id=n["escola_id"],
-                numero_nota=n["numero_nota"],
-                valor_total=n["valor_total"],
-                status_analise=n["status_analise"],
-                data_upload=n["data_upload"],
-                conformidade_score=n.get("conformidade_score")
-            )
-            for n in notas_escola
-        ]
+        # Ordenar por data (mais recentes primeiro); o response model
+        # descarta os campos que não são exibidos às diretoras
+        return listar_paginado(
+            request, response, repositorio.colecao("notas_fiscais"), paginacao,
+            filtros={"escola_id": escola_id},
+            ordenar_por="data_upload",
+            decrescente=True,
+            modelo=NotaFiscalResponse
+        )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Erro ao listar notas: {e}")
         raise HTTPException(
@@ -287,9 +256,10 @@ def obter_analise_detalhada(
     # TODO: Verificar permissão
     
     try:
-        analises = _carregar_analises()
-        
-        analise = next((a for a in analises if a["nota_fiscal_id"] == nota_fiscal_id), None)
+        analise = next(
+            repositorio.colecao("analises_fiscalizacao").iterar(nota_fiscal_id=nota_fiscal_id),
+            None
+        )
         
         if not analise:
             raise HTTPException(
@@ -335,8 +305,7 @@ def listar_escolas_alto_risco(
     # TODO: Implementar com dados reais
     
     try:
-        analises = _carregar_analises()
-        notas = _carregar_notas()
+        analises = repositorio.colecao("analises_fiscalizacao").todos()
         
         # Agrupar por escola e calcular score médio
         escolas_scores = {}
@@ -0,0 +1,146 @@
+"""
+Paginação por cursor e streaming NDJSON para os endpoints de listagem.
+
+- `?limit=N` devolve uma página; o cursor da próxima vem em `X-Next-Cursor`
+  e é repassado em `?cursor=...` (opaco para o cliente)
+- `Accept: application/x-ndjson` devolve um registro JSON por linha,
+  serializado e enviado em blocos (o corpo da resposta nunca é montado inteiro)
+- `X-Total-Count` e `X-Page-Count` vêm das contagens dos índices
+- Com um response model, cada registro é serializado uma vez e reaproveitado
+  (ver `storage.serializacao`)
+"""
+import base64
+import binascii
+import json
+import math
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from fastapi import HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from storage import Colecao
+from storage.colecao import ChavePagina, Intervalo, _json_default
+from storage.serializacao import cache_serializacao
+
+# Maior página aceita em `limit`
+LIMITE_MAXIMO = 1000
+
+# Tamanho dos blocos lidos do repositório durante o streaming
+BLOCO_STREAMING = 500
+
+MEDIA_NDJSON = "application/x-ndjson"
+
+
+class ParametrosPaginacao:
+    """Dependência com os parâmetros `cursor` e `limit` das listagens."""
+
+    def __init__(
+        self,
+        cursor: Optional[str] = Query(None, description="Cursor da página (header X-Next-Cursor)"),
+        limit: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO, description="Registros por página")
+    ):
+        self.cursor = cursor
+        self.limit = limit
+
+
+def codificar_cursor(chave: ChavePagina) -> str:
+    """Serializa a chave de paginação em um token opaco (base64 url-safe)."""
+    dados = json.dumps(list(chave), default=_json_default, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(dados).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor: Optional[str]) -> Optional[ChavePagina]:
+    """Converte o token de volta na chave de paginação (400 se inválido)."""
+    if not cursor:
+        return None
+    try:
+        dados = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        valor, posicao = json.loads(dados)
+        return (valor, int(posicao))
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+def decodificar_cursor_numerico(cursor: Optional[str]) -> Optional[Tuple[float, int]]:
+    """
+    Cursor de um ranking numérico (ex.: score das buscas por proximidade).
+    Um cursor de outra listagem (ex.: chave por data) é rejeitado com 400.
+    """
+    apos = decodificar_cursor(cursor)
+    if apos is None:
+        return None
+    valor, posicao = apos
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return (float(valor), posicao)
+
+
+def aceita_ndjson(request: Request) -> bool:
+    """Verifica se o cliente pediu a resposta em NDJSON."""
+    return MEDIA_NDJSON in request.headers.get("accept", "")
+
+
+def listar_paginado(
+    request: Request,
+    response: Response,
+    colecao: Colecao,
+    paginacao: ParametrosPaginacao,
+    filtros: Optional[Dict[str, Any]] = None,
+    intervalo: Optional[Intervalo] = None,
+    ordenar_por: Optional[str] = None,
+    decrescente: bool = False,
+    modelo: Optional[Type[BaseModel]] = None
+):
+    """
+    Responde uma listagem com paginação por cursor ou em NDJSON.
+
+    Sem `limit` a listagem continua completa (compatível com os clientes
+    atuais), mas os headers de contagem são sempre preenchidos.
+    Com `modelo` (o `response_model` do endpoint) a resposta é montada a
+    partir dos bytes em cache de cada registro, sem revalidar a lista.
+    """
+    filtros = filtros or {}
+    apos = decodificar_cursor(paginacao.cursor)
+    limite = paginacao.limit
+
+    total = colecao.contar(intervalo=intervalo, **filtros)
+    headers = {
+        "X-Total-Count": str(total),
+        "X-Page-Count": str(math.ceil(total / limite) if limite else 1),
+    }
+
+    if aceita_ndjson(request) and limite is None:
+        # Exportação completa: lida em blocos enquanto é enviada
+        blocos = colecao.blocos(
+            filtros, intervalo, ordenar_por, decrescente, apos=apos, tamanho=BLOCO_STREAMING
+        )
+        linhas = (_linhas_ndjson(registros, colecao, modelo) for registros in blocos)
+        return StreamingResponse(linhas, media_type=MEDIA_NDJSON, headers=headers)
+
+    registros, proxima = colecao.pagina(
+        filtros, intervalo, ordenar_por, decrescente, apos=apos, limite=limite
+    )
+    if proxima is not None:
+        headers["X-Next-Cursor"] = codificar_cursor(proxima)
+
+    if aceita_ndjson(request):
+        linhas = iter([_linhas_ndjson(registros, colecao, modelo)])
+        return StreamingResponse(linhas, media_type=MEDIA_NDJSON, headers=headers)
+
+    if modelo is not None:
+        conteudo = cache_serializacao(modelo, colecao).lista_json(registros)
+        return Response(content=conteudo, media_type="application/json", headers=headers)
+
+    response.headers.update(headers)
+    return registros
+
+
+def _linhas_ndjson(registros: List[dict], colecao: Colecao, modelo: Optional[Type[BaseModel]]) -> bytes:
+    """Serializa registros em NDJSON (uma linha JSON por registro)."""
+    if modelo is not None:
+        return cache_serializacao(modelo, colecao).linhas_ndjson(registros)
+    return b"".join(
+        json.dumps(registro, ensure_ascii=False, default=_json_default).encode("utf-8") + b"\n"
+        for registro in registros
+    )
@@ -2,40 +2,22 @@
 Router para funcionalidades dos Professores.
 Registro diário de consumo e desperdício alimentar.
 """
-import json
 import logging
 from typing import List
-from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status
-from pathlib import Path
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 
 from schemas import (
     RegistroConsumoDiario,
     RegistroConsumoResponse
 )
 from routers.auth import verificar_token
+from routers.paginacao import ParametrosPaginacao, listar_paginado
+from storage import repositorio
 
 router = APIRouter(prefix="/api/v1/professores", tags=["Professores"])
 logger = logging.getLogger(__name__)
 
-# Caminho do arquivo de dados
-DATA_DIR = Path(__file__).parent.parent / "data"
-CONSUMO_FILE = DATA_DIR / "consumo_diario.json"
-
-
-def _carregar_registros() -> List[dict]:
-    """Carrega registros de consumo do arquivo JSON."""
-    if not CONSUMO_FILE.exists():
-        return []
-    with open(CONSUMO_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-
-def _salvar_registros(registros: List[dict]):
-    """Salva registros no arquivo JSON."""
-    with open(CONSUMO_FILE, "w", encoding="utf-8") as f:
-        json.dump(registros, f, ensure_ascii=False, indent=2)
-
 
 @router.post("/consumo-diario", response_model=RegistroConsumoResponse, status_code=status.HTTP_201_CREATED)
 def registrar_consumo_diario(
@@ -59,11 +41,6 @@ def registrar_consumo_diario(
     - `observacoes`: Comentários do professor sobre reação das crianças
     """
     try:
-        registros = _carregar_registros()
-        
-        # Gerar ID único
-        registro_id = f"REG{len(registros) + 1:04d}"
-        
         # Calcular métricas
         total_servido = sum(item.quantidade_servida for item in registro.itens)
         total_consumido = sum(item.quantidade_consumida for item in registro.itens)
@@ -77,7 +54,7 @@ def registrar_consumo_diario(
         
         # Criar registro completo
         registro_completo = {
-            "id": registro_id,
+            "id": None,  # Gerado pelo escritor da coleção
             "escola_id": registro.escola_id,
             "professor_id": registro.professor_id,
             "professor_nome": registro.professor_nome,
@@ -97,8 +74,9 @@ def registrar_consumo_diario(
             "criado_em": datetime.now().isoformat()
         }
         
-        registros.append(registro_completo)
-        _salvar_registros(registros)
+        # Group commit: o id sequencial é atribuído na gravação
+        registro_completo = repositorio.escritor("consumo_diario").inserir(registro_completo)
+        registro_id = registro_completo["id"]
         
         logger.info(f"✅ Registro de consumo criado: {registro_id} - Escola: {registro.escola_id}")
         
@@ -122,40 +100,41 @@ def registrar_consumo_diario(
 @router.get("/consumo-diario/escola/{escola_id}", response_model=List[dict])
 def listar_consumo_escola(
     escola_id: str,
+    request: Request,
+    response: Response,
     periodo_dias: int = 30,
+    paginacao: ParametrosPaginacao = Depends(),
     usuario=Depends(verificar_token)
 ):
     """
     📊 **Listar histórico de consumo de uma escola**
     
     Retorna registros dos últimos N dias para análise.
+    
+    **Grandes volumes:** use `limit` + `cursor` (header `X-Next-Cursor`) ou
+    `Accept: application/x-ndjson` para exportar o período em streaming.
     """
     try:
-        registros = _carregar_registros()
-        
-        # Filtrar por escola
-        registros_escola = [r for r in registros if r["escola_id"] == escola_id]
-        
-        # Ordenar por data (mais recentes primeiro)
-        registros_escola.sort(key=lambda x: x["data"], reverse=True)
-        
-        # Limitar ao período
+        # Limitar ao período (datas ISO YYYY-MM-DD comparam como texto)
+        intervalo = None
         if periodo_dias:
-            data_limite = datetime.now().date()
-            registros_filtrados = []
-            for r in registros_escola:
-                try:
-                    data_registro = datetime.fromisoformat(r["data"]).date()
-                    diff_dias = (data_limite - data_registro).days
-                    if diff_dias <= periodo_dias:
-                        registros_filtrados.append(r)
-                except:
-                    continue
-            registros_escola = registros_filtrados
+            data_inicio = (datetime.now().date() - timedelta(days=periodo_dias)).isoformat()
+            intervalo = ("data", data_inicio, None)
+        
+        # Filtrar por escola, ordenando por data (mais recentes primeiro)
+        resultado = listar_paginado(
+            request, response, repositorio.colecao("consumo_diario"), paginacao,
+            filtros={"escola_id": escola_id},
+            intervalo=intervalo,
+            ordenar_por="data",
+            decrescente=True
+        )
         
-        logger.info(f"📊 Listados {len(registros_escola)} registros para escola {escola_id}")
-        return registros_escola
+        logger.info(f"📊 Listados registros de consumo da escola {escola_id}")
+        return resultado
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Erro ao listar consumo: {e}")
         raise HTTPException(
@@ -175,11 +154,12 @@ def listar_consumo_professor(
     Útil para acompanhar os registros feitos por cada professor.
     """
     try:
-        registros = _carregar_registros()
-        registros_professor = [r for r in registros if r["professor_id"] == professor_id]
-        
         # Ordenar por data (mais recentes primeiro)
-        registros_professor.sort(key=lambda x: x["data"], reverse=True)
+        registros_professor = list(repositorio.colecao("consumo_diario").consultar(
+            {"professor_id": professor_id},
+            ordenar_por="data",
+            decrescente=True
+        ))
         
         logger.info(f"📝 Listados {len(registros_professor)} registros do professor {professor_id}")
         return registros_professor
@@ -201,9 +181,7 @@ def obter_registro(
     🔍 **Obter detalhes de um registro específico**
     """
     try:
-        registros = _carregar_registros()
-        
-        registro = next((r for r in registros if r["id"] == registro_id), None)
+        registro = repositorio.colecao("consumo_diario").obter(registro_id)
         
         if not registro:
             raise HTTPException(
@@ -2,34 +2,36 @@
 Router de secretaria.
 Dashboard, auditoria e gestão de recursos PNAE.
 """
-from fastapi import APIRouter, HTTPException, Depends, Query
-from typing import List
+import csv
+import io
 import json
-from pathlib import Path
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from fastapi.responses import StreamingResponse
+from typing import Dict, Iterator, List, Literal, Optional, get_args
 from decimal import Decimal
 
 from schemas import (
     DashboardFinanceiroResponse,
     RankingEscola,
-    RankingProdutor
+    RankingProdutor,
+    ProximidadeEscola,
+    PlanejamentoLoteRequest,
+    ProdutoresEscola,
+    ProdutorResponse,
+    CategoriaProduto,
+    CoberturaCategoria,
+    RotaEntrega
 )
 from routers.auth import verificar_token
 from config import settings
+from services.agregados import obter_agregados
+from services.matriz_proximidade import obter_matriz_proximidade
+from services.logistica import consolidar_entregas
+from storage import repositorio
+from storage.serializacao import cache_serializacao
 
 router = APIRouter()
 
-# Caminho para os dados
-DATA_DIR = Path(__file__).parent.parent / "data"
-
-
-def carregar_json(filename: str) -> list:
-    """Carrega arquivo JSON."""
-    filepath = DATA_DIR / filename
-    if filepath.exists():
-        with open(filepath, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
-
 
 @router.get(
     "/dashboard-financeiro",
@@ -49,25 +51,10 @@ async def obter_dashboard_financeiro(token_data: dict = Depends(verificar_token)
     
     **Meta PNAE:** Lei 11.947/2009 - Mínimo 30% para agricultura familiar
     """
-    # Carregar dados
-    pedidos = carregar_json("pedidos.json")
-    escolas = carregar_json("escolas.json")
-    produtores = carregar_json("produtores.json")
-    
-    # Calcular totais
-    gasto_total = Decimal(0)
-    gasto_agricultura_familiar = Decimal(0)
-    
-    produtores_com_dap = {p["id"]: p["possui_dap"] for p in produtores}
-    
-    for pedido in pedidos:
-        valor = Decimal(str(pedido.get("valor_total", 0)))
-        gasto_total += valor
-        
-        # Verificar se é agricultura familiar (possui DAP)
-        produtor_id = pedido.get("produtor_id")
-        if produtores_com_dap.get(produtor_id, False):
-            gasto_agricultura_familiar += valor
+    # Totais mantidos incrementalmente a cada pedido criado/alterado
+    resumo = obter_agregados().resumo()
+    gasto_total = resumo["gasto_total"]
+    gasto_agricultura_familiar = resumo["gasto_agricultura_familiar"]
     
     # Calcular percentual
     percentual_af = float((gasto_agricultura_familiar / gasto_total * 100) if gasto_total > 0 else 0)
@@ -75,18 +62,14 @@ async def obter_dashboard_financeiro(token_data: dict = Depends(verificar_token)
     # Economia estimada (compras diretas economizam ~20% vs intermediários)
     economia_gerada = gasto_total * Decimal("0.20")
     
-    # Contar ativos
-    escolas_ids_ativas = set(p["escola_id"] for p in pedidos)
-    produtores_ids_ativos = set(p["produtor_id"] for p in pedidos)
-    
     return {
         "gasto_total": gasto_total,
         "gasto_agricultura_familiar": gasto_agricultura_familiar,
         "percentual_af": round(percentual_af, 2),
         "meta_pnae": settings.pnae_meta_percentage,
         "economia_gerada": economia_gerada,
-        "numero_escolas": len(escolas_ids_ativas),
-        "numero_produtores_ativos": len(produtores_ids_ativos)
+        "numero_escolas": resumo["numero_escolas"],
+        "numero_produtores_ativos": resumo["numero_produtores_ativos"]
     }
 
 
@@ -108,51 +91,14 @@ async def obter_ranking_escolas(
     
     Útil para identificar escolas modelo e compartilhar boas práticas.
     """
-    pedidos = carregar_json("pedidos.json")
-    escolas = carregar_json("escolas.json")
-    produtores = carregar_json("produtores.json")
-    
-    produtores_com_dap = {p["id"]: p["possui_dap"] for p in produtores}
-    escolas_dict = {e["id"]: e for e in escolas}
-    
-    # Agregar dados por escola
-    stats_escolas = {}
-    
-    for pedido in pedidos:
-        escola_id = pedido["escola_id"]
-        valor = Decimal(str(pedido.get("valor_total", 0)))
-        
-        if escola_id not in stats_escolas:
-            stats_escolas[escola_id] = {
-                "gasto_total": Decimal(0),
-                "gasto_af": Decimal(0),
-                "numero_pedidos": 0
-            }
-        
-        stats_escolas[escola_id]["gasto_total"] += valor
-        stats_escolas[escola_id]["numero_pedidos"] += 1
-        
-        # Se for agricultura familiar
-        if produtores_com_dap.get(pedido["produtor_id"], False):
-            stats_escolas[escola_id]["gasto_af"] += valor
-    
-    # Criar ranking
-    ranking = []
-    for escola_id, stats in stats_escolas.items():
-        percentual_af = float((stats["gasto_af"] / stats["gasto_total"] * 100) if stats["gasto_total"] > 0 else 0)
-        
-        ranking.append({
-            "escola_id": escola_id,
-            "escola_nome": escolas_dict.get(escola_id, {}).get("nome", "Desconhecida"),
-            "percentual_af": round(percentual_af, 2),
-            "gasto_total": stats["gasto_total"],
-            "numero_pedidos": stats["numero_pedidos"]
-        })
+    escolas = repositorio.colecao("escolas")
     
-    # Ordenar por percentual AF (decrescente)
-    ranking.sort(key=lambda x: x["percentual_af"], reverse=True)
+    # Ranking mantido pelos agregados (ordenado por percentual AF, decrescente)
+    ranking = obter_agregados().ranking_escolas(limite)
+    for item in ranking:
+        item["escola_nome"] = (escolas.obter(item["escola_id"]) or {}).get("nome", "Desconhecida")
     
-    return ranking[:limite]
+    return ranking
 
 
 @router.get(
@@ -174,44 +120,179 @@ async def obter_ranking_produtores(
     
     Identifica parceiros mais relevantes do programa.
     """
-    pedidos = carregar_json("pedidos.json")
-    produtores = carregar_json("produtores.json")
+    produtores = repositorio.colecao("produtores")
     
-    produtores_dict = {p["id"]: p for p in produtores}
+    # Ranking mantido pelos agregados (ordenado por total de vendas, decrescente)
+    ranking = obter_agregados().ranking_produtores(limite)
+    for item in ranking:
+        produtor = produtores.obter(item["produtor_id"]) or {}
+        item["produtor_nome"] = produtor.get("nome", "Desconhecido")
+        item["avaliacao_media"] = produtor.get("avaliacao_media", 0)
     
-    # Agregar vendas por produtor
-    stats_produtores = {}
+    return ranking
+
+
+@router.get(
+    "/planejamento/proximidade",
+    response_model=List[ProximidadeEscola],
+    summary="Oferta de produtores por escola"
+)
+async def obter_proximidade_rede(
+    raio_km: float = Query(50, gt=0, le=500, description="Raio considerado em km"),
+    token_data: dict = Depends(verificar_token)
+):
+    """
+    **🗺️ Planejamento da Rede**
     
-    for pedido in pedidos:
-        produtor_id = pedido["produtor_id"]
-        valor = Decimal(str(pedido.get("valor_total", 0)))
-        
-        if produtor_id not in stats_produtores:
-            stats_produtores[produtor_id] = {
-                "total_vendas": Decimal(0),
-                "numero_entregas": 0
-            }
-        
-        stats_produtores[produtor_id]["total_vendas"] += valor
-        stats_produtores[produtor_id]["numero_entregas"] += 1
+    Para cada escola da rede:
+    - Produtores dentro do raio
+    - Quantos possuem DAP (agricultura familiar)
+    - Distância do produtor mais próximo
     
-    # Criar ranking
-    ranking = []
-    for produtor_id, stats in stats_produtores.items():
-        produtor = produtores_dict.get(produtor_id, {})
-        
-        ranking.append({
-            "produtor_id": produtor_id,
-            "produtor_nome": produtor.get("nome", "Desconhecido"),
-            "total_vendas": stats["total_vendas"],
-            "numero_entregas": stats["numero_entregas"],
-            "avaliacao_media": produtor.get("avaliacao_media", 0)
-        })
+    Escolas com poucas opções próximas são candidatas a chamadas públicas
+    regionais. Calculado sobre a matriz escola × produtor já pronta.
+    """
+    escolas = repositorio.colecao("escolas")
     
-    # Ordenar por total de vendas (decrescente)
-    ranking.sort(key=lambda x: float(x["total_vendas"]), reverse=True)
+    resumo = obter_matriz_proximidade().resumo_rede(raio_km)
+    for item in resumo:
+        item["escola_nome"] = (escolas.obter(item["escola_id"]) or {}).get("nome", "Desconhecida")
     
-    return ranking[:limite]
+    # Menos opções primeiro
+    return sorted(resumo, key=lambda item: item["produtores_no_raio"])
+
+
+@router.post(
+    "/planejamento/produtores-por-escola",
+    response_model=List[ProdutoresEscola],
+    summary="Melhores produtores para várias escolas"
+)
+def planejar_produtores_por_escola(
+    params: PlanejamentoLoteRequest,
+    token_data: dict = Depends(verificar_token)
+):
+    """
+    **🧭 Planejamento de Compras em Lote**
+    
+    Os `top_k` melhores produtores de cada escola (ou de toda a rede, sem
+    `escola_ids`), no mesmo ranking de `/agricultores/buscar`, em uma
+    única chamada. O ranking de todas as escolas é calculado de uma vez
+    sobre a matriz escola × produtor, dividido entre threads em redes
+    grandes.
+    """
+    escolas = repositorio.colecao("escolas")
+    if params.escola_ids is not None:
+        desconhecidas = [escola_id for escola_id in params.escola_ids if escolas.obter(escola_id) is None]
+        if desconhecidas:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Escolas não encontradas: {', '.join(desconhecidas)}"
+            )
+    
+    planejamento = obter_matriz_proximidade().melhores_por_escola(
+        escola_ids=params.escola_ids,
+        raio_km=params.raio_km,
+        top_k=params.top_k,
+        apenas_com_dap=params.apenas_com_dap,
+        categoria=params.categoria_produto,
+        avaliacao_minima=params.avaliacao_minima
+    )
+    
+    # JSON montado a partir dos bytes em cache de cada produtor
+    cache = cache_serializacao(ProdutorResponse, repositorio.colecao("produtores"))
+    partes = []
+    for item in planejamento:
+        cabecalho = json.dumps({
+            "escola_id": item["escola_id"],
+            "escola_nome": (escolas.obter(item["escola_id"]) or {}).get("nome", "Desconhecida"),
+            "produtores_no_raio": item["produtores_no_raio"],
+        }, ensure_ascii=False)[:-1].encode("utf-8")
+        produtores = b",".join(
+            cache.serializar_com(resultado.produtor, resultado.campos_calculados())
+            for resultado in item["resultados"]
+        )
+        partes.append(cabecalho + b',"produtores":[' + produtores + b"]}")
+    
+    return Response(content=b"[" + b",".join(partes) + b"]", media_type="application/json")
+
+
+@router.get(
+    "/planejamento/cobertura",
+    response_model=List[CoberturaCategoria],
+    summary="Cobertura de agricultura familiar por escola e categoria"
+)
+def obter_cobertura_rede(
+    raio_km: float = Query(50, gt=0, le=500, description="Distância máxima para considerar a categoria coberta"),
+    apenas_descobertas: bool = Query(False, description="Somente escola × categoria sem produtor no raio"),
+    formato: Literal["json", "csv"] = Query("json", description="json ou csv (exportação)"),
+    token_data: dict = Depends(verificar_token)
+):
+    """
+    **🌱 Cobertura da Agricultura Familiar (meta PNAE)**
+    
+    Para cada escola e categoria de produto: o produtor com DAP mais
+    próximo que oferece a categoria e a distância até ele. Combinações sem
+    produtor dentro de `raio_km` indicam onde a meta de 30% depende de
+    novas chamadas públicas.
+    
+    Calculado de uma vez para toda a rede sobre a matriz escola × produtor.
+    Com `formato=csv` a resposta é um arquivo para planilhas, gerado em
+    streaming.
+    """
+    escolas = repositorio.colecao("escolas")
+    categorias = list(get_args(CategoriaProduto))
+    cobertura = obter_matriz_proximidade().cobertura(categorias)
+    
+    def linhas() -> Iterator[Dict]:
+        for item in cobertura:
+            escola_nome = (escolas.obter(item["escola_id"]) or {}).get("nome", "Desconhecida")
+            for categoria, (produtor, distancia) in item["categorias"].items():
+                coberta = distancia is not None and distancia <= raio_km
+                if apenas_descobertas and coberta:
+                    continue
+                yield {
+                    "escola_id": item["escola_id"],
+                    "escola_nome": escola_nome,
+                    "categoria": categoria,
+                    "produtor_id": produtor["id"] if produtor else None,
+                    "produtor_nome": produtor["nome"] if produtor else None,
+                    "distancia_km": distancia,
+                    "coberta": coberta,
+                }
+    
+    if formato == "csv":
+        return StreamingResponse(
+            _linhas_csv(linhas(), list(CoberturaCategoria.model_fields)),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": 'attachment; filename="cobertura_agricultura_familiar.csv"'}
+        )
+    
+    return list(linhas())
+
+
+@router.get(
+    "/logistica/rotas",
+    response_model=List[RotaEntrega],
+    summary="Rotas consolidadas de entrega"
+)
+def obter_rotas_entrega(
+    data_inicio: Optional[str] = Query(None, description="Data de entrega inicial (AAAA-MM-DD)"),
+    data_fim: Optional[str] = Query(None, description="Data de entrega final (AAAA-MM-DD)"),
+    produtor_id: Optional[str] = Query(None, description="Somente as rotas de um produtor"),
+    token_data: dict = Depends(verificar_token)
+):
+    """
+    **🚚 Consolidação de Entregas**
+    
+    Agrupa os pedidos com entrega pendentes ou confirmados por produtor e
+    data de entrega e monta uma rota com várias paradas (uma por escola),
+    saindo e voltando à propriedade.
+    
+    A rota é gerada por vizinho mais próximo e melhorada com 2-opt sobre as
+    distâncias de Haversine. Cada rota informa a economia em km em relação
+    a uma viagem de ida e volta por pedido.
+    """
+    return consolidar_entregas(data_inicio, data_fim, produtor_id)
 
 
 @router.get("/auditoria/avaliacoes-baixas", summary="Auditoria de avaliações baixas")
@@ -225,23 +306,17 @@ async def obter_avaliacoes_baixas(
     Lista avaliações com notas baixas para investigação.
     Ajuda a identificar problemas de qualidade ou logística.
     """
-    avaliacoes = carregar_json("avaliacoes.json")
-    pedidos = carregar_json("pedidos.json")
-    produtores = carregar_json("produtores.json")
-    escolas = carregar_json("escolas.json")
-    
-    # Criar dicionários para lookup
-    pedidos_dict = {p["id"]: p for p in pedidos}
-    produtores_dict = {p["id"]: p for p in produtores}
-    escolas_dict = {e["id"]: e for e in escolas}
+    pedidos = repositorio.colecao("pedidos")
+    produtores = repositorio.colecao("produtores")
+    escolas = repositorio.colecao("escolas")
     
     # Filtrar avaliações baixas
-    avaliacoes_baixas = [av for av in avaliacoes if av.get("nota", 5) <= nota_maxima]
+    avaliacoes_baixas = repositorio.colecao("avaliacoes").consultar(intervalo=("nota", None, nota_maxima))
     
     # Enriquecer com informações
     resultado = []
     for av in avaliacoes_baixas:
-        pedido = pedidos_dict.get(av["pedido_id"], {})
+        pedido = pedidos.obter(av["pedido_id"]) or {}
         
         resultado.append({
             "avaliacao_id": av["id"],
@@ -249,8 +324,8 @@ async def obter_avaliacoes_baixas(
             "tags": av.get("tags", []),
             "comentario": av.get("comentario", ""),
             "data": av.get("data_avaliacao", ""),
-            "escola": escolas_dict.get(av["escola_id"], {}).get("nome", ""),
-            "produtor": produtores_dict.get(av["produtor_id"], {}).get("nome", ""),
+            "escola": (escolas.obter(av["escola_id"]) or {}).get("nome", ""),
+            "produtor": (produtores.obter(av["produtor_id"]) or {}).get("nome", ""),
             "valor_pedido": pedido.get("valor_total", 0)
         })
     
@@ -268,7 +343,7 @@ async def obter_alertas_climaticos():
     Retorna alertas climáticos que podem afetar a produção.
     Ajuda no planejamento de compras e gestão de riscos.
     """
-    alertas = carregar_json("clima_previsao.json")
+    alertas = repositorio.colecao("clima_previsao").todos()
     
     return {
         "total_alertas": len(alertas),
@@ -284,7 +359,7 @@ async def obter_produtos_safra(mes: str = Query("dezembro_2024", description="M
     Lista produtos em safra para o período especificado.
     Recomenda compras mais econômicas e sustentáveis.
     """
-    safra = carregar_json("safra_regional.json")
+    safra = repositorio.colecao("safra_regional").dados()
     
     dados_mes = safra.get(mes, {})
     
@@ -305,3 +380,17 @@ async def obter_produtos_safra(mes: str = Query("dezembro_2024", description="M
         "total_produtos": len(produtos),
         "produtos_recomendados": produtos_recomendados
     }
+
+
+def _linhas_csv(registros: Iterator[Dict], campos: List[str], bloco: int = 1000) -> Iterator[str]:
+    """CSV com cabeçalho, emitido em blocos de linhas."""
+    buffer = io.StringIO()
+    escritor = csv.DictWriter(buffer, fieldnames=campos)
+    escritor.writeheader()
+    for i, registro in enumerate(registros, 1):
+        escritor.writerow(registro)
+        if i % bloco == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
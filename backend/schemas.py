@@ -3,7 +3,7 @@ Schemas Pydantic para validação de dados.
 Define os modelos de entrada e saída da API.
 """
 from pydantic import BaseModel, EmailStr, Field, validator
-from typing import Optional, List, Literal, Dict
+from typing import Any, Optional, List, Literal, Dict
 from datetime import datetime
 from decimal import Decimal
 
@@ -26,6 +26,10 @@ class TokenResponse(BaseModel):
 
 # ==================== PRODUTOR/AGRICULTOR ====================
 
+# Categorias de produto da agricultura familiar
+CategoriaProduto = Literal["Hortaliças", "Frutas", "Tubérculos", "Proteínas", "Outros"]
+
+
 class LocalizacaoBase(BaseModel):
     """Dados de localização."""
     endereco: str
@@ -39,7 +43,7 @@ class LocalizacaoBase(BaseModel):
 class ProdutoBase(BaseModel):
     """Produto oferecido por um agricultor."""
     nome: str = Field(..., min_length=2, max_length=100)
-    categoria: Literal["Hortaliças", "Frutas", "Tubérculos", "Proteínas", "Outros"]
+    categoria: CategoriaProduto
     unidade: str = Field(..., examples=["kg", "maço", "dúzia", "unidade"])
     preco_unitario: Decimal = Field(..., gt=0, decimal_places=2)
 
@@ -123,6 +127,28 @@ class PedidoResponse(BaseModel):
     observacoes: Optional[str] = None
 
 
+class ParadaRota(BaseModel):
+    """Parada de uma rota de entrega (uma escola)."""
+    ordem: int
+    escola_id: str
+    escola_nome: str
+    pedido_ids: List[str]
+    distancia_trecho_km: float
+
+
+class RotaEntrega(BaseModel):
+    """Rota consolidada de um produtor em uma data de entrega."""
+    produtor_id: str
+    produtor_nome: str
+    data_entrega: str
+    numero_pedidos: int
+    paradas: List[ParadaRota]
+    distancia_retorno_km: float
+    distancia_total_km: float
+    distancia_viagens_individuais_km: float
+    economia_km: float
+
+
 # ==================== AVALIAÇÕES ====================
 
 class AvaliacaoCreate(BaseModel):
@@ -221,6 +247,44 @@ class RankingProdutor(BaseModel):
     avaliacao_media: float
 
 
+class ProximidadeEscola(BaseModel):
+    """Oferta de produtores ao redor de uma escola (planejamento da rede)."""
+    escola_id: str
+    escola_nome: str
+    produtores_no_raio: int
+    produtores_dap_no_raio: int
+    distancia_mais_proxima_km: Optional[float] = None
+
+
+class PlanejamentoLoteRequest(BaseModel):
+    """Melhores produtores para várias escolas em uma única chamada."""
+    escola_ids: Optional[List[str]] = Field(default=None, description="Escolas consideradas (vazio = toda a rede)")
+    raio_km: int = Field(default=100, ge=10, le=200, description="Raio de busca em km")
+    top_k: int = Field(default=10, ge=1, le=50, description="Produtores por escola")
+    categoria_produto: Optional[CategoriaProduto] = None
+    apenas_com_dap: bool = Field(default=False, description="Filtrar apenas produtores com DAP")
+    avaliacao_minima: float = Field(default=0.0, ge=0, le=5)
+
+
+class ProdutoresEscola(BaseModel):
+    """Melhores produtores de uma escola no planejamento em lote."""
+    escola_id: str
+    escola_nome: str
+    produtores_no_raio: int
+    produtores: List[ProdutorResponse]
+
+
+class CoberturaCategoria(BaseModel):
+    """Produtor com DAP mais próximo de uma escola para uma categoria."""
+    escola_id: str
+    escola_nome: str
+    categoria: CategoriaProduto
+    produtor_id: Optional[str] = None
+    produtor_nome: Optional[str] = None
+    distancia_km: Optional[float] = None
+    coberta: bool
+
+
 # ==================== GEOLOCALIZAÇÃO ====================
 
 class BuscaProdutoresRequest(BaseModel):
@@ -228,11 +292,42 @@ class BuscaProdutoresRequest(BaseModel):
     escola_latitude: float = Field(..., ge=-90, le=90)
     escola_longitude: float = Field(..., ge=-180, le=180)
     raio_km: int = Field(default=100, ge=10, le=200, description="Raio de busca em km")
-    categoria_produto: Optional[Literal["Hortaliças", "Frutas", "Tubérculos", "Proteínas", "Outros"]] = None
+    categoria_produto: Optional[CategoriaProduto] = None
+    apenas_com_dap: bool = Field(default=False, description="Filtrar apenas produtores com DAP")
+    avaliacao_minima: float = Field(default=0.0, ge=0, le=5)
+    top_k: Optional[int] = Field(default=None, ge=1, le=100, description="Retornar apenas os k melhores matches")
+    offset: int = Field(default=0, ge=0, description="Matches a pular antes da página")
+    cursor: Optional[str] = Field(default=None, description="Cursor da página (header X-Next-Cursor)")
+
+
+class BuscaOfertasRequest(BaseModel):
+    """Parâmetros da busca de ofertas de um produto."""
+    produto: str = Field(..., min_length=2, max_length=100, examples=["Abóbora"])
+    escola_latitude: float = Field(..., ge=-90, le=90)
+    escola_longitude: float = Field(..., ge=-180, le=180)
+    raio_km: int = Field(default=100, ge=10, le=200, description="Raio de busca em km")
+    top_k: int = Field(default=10, ge=1, le=100, description="Número de ofertas retornadas")
+    ordenar_por: Literal["preco", "score"] = Field(default="preco", description="Menor preço com desconto ou melhor match")
+    categoria_produto: Optional[CategoriaProduto] = None
     apenas_com_dap: bool = Field(default=False, description="Filtrar apenas produtores com DAP")
     avaliacao_minima: float = Field(default=0.0, ge=0, le=5)
 
 
+class OfertaProduto(BaseModel):
+    """Oferta de um produto por um produtor, com o desconto por proximidade."""
+    produtor_id: str
+    produtor_nome: str
+    possui_dap: bool
+    produto_nome: str
+    categoria: CategoriaProduto
+    unidade: str
+    preco_unitario: float
+    preco_com_desconto: float
+    desconto_proximidade: float
+    distancia_km: float
+    score_match: float
+
+
 # ==================== RELATÓRIOS ====================
 
 class RelatorioCompraRequest(BaseModel):
@@ -317,6 +412,11 @@ class PratoCardapio(BaseModel):
     custo_estimado: float
     producao_local: bool
     justificativa: str
+    
+    @validator('dia', pre=True)
+    def converter_dia(cls, v):
+        """A IA costuma numerar os dias (1, 2, ...)."""
+        return str(v) if isinstance(v, int) else v
 
 
 class CardapioGerado(BaseModel):
@@ -332,6 +432,23 @@ class CardapioGerado(BaseModel):
     recomendacoes_ia: List[str] = Field(..., description="Recomendações adicionais da IA")
 
 
+class JobCardapio(BaseModel):
+    """Geração de cardápio em segundo plano (fila de jobs)."""
+    id: str
+    escola_id: str
+    status: Literal["pendente", "processando", "concluido", "erro"]
+    solicitacao: SolicitacaoCardapio
+    data_criacao: str
+    data_inicio: Optional[str] = None
+    data_conclusao: Optional[str] = None
+    erro: Optional[str] = None
+    pratos_prontos: List[PratoCardapio] = Field(
+        default=[],
+        description="Pratos já recebidos da IA enquanto o cardápio é gerado (concluído: os do resultado)"
+    )
+    resultado: Optional[CardapioGerado] = Field(None, description="Cardápio, quando concluído")
+
+
 # ==================== DASHBOARD INTELIGENTE ====================
 
 class AnaliseAceitacao(BaseModel):
@@ -370,6 +487,10 @@ class DashboardInteligente(BaseModel):
     acoes_recomendadas: List[str] = Field(..., description="Ações prioritárias sugeridas pela IA")
     receitas_sugeridas: List[Dict[str, str]] = Field(..., description="Receitas para alimentos rejeitados")
     economia_potencial: float = Field(..., description="Economia estimada seguindo recomendações")
+    secoes_degradadas: List[str] = Field(
+        default=[],
+        description="Seções de IA que falharam ou estouraram o prazo e trazem sugestões padrão"
+    )
 
 
 # ==================== FISCALIZAÇÃO E CONFORMIDADE ====================
@@ -422,7 +543,7 @@ class AlertaFiscalizacao(BaseModel):
     ]
     severidade: Literal["baixa", "media", "alta", "critica"]
     descricao: str
-    detalhes: Dict[str, any]
+    detalhes: Dict[str, Any]
     recomendacao: str
 
 
@@ -433,10 +554,15 @@ class AnaliseNotaFiscal(BaseModel):
     conformidade_score: float = Field(..., ge=0, le=100, description="0=muito suspeito, 100=totalmente conforme")
     risco_fraude: Literal["baixo", "medio", "alto", "critico"]
     alertas: List[AlertaFiscalizacao]
-    analise_preco: Dict[str, any] = Field(..., description="Comparação com preços de mercado")
-    analise_fornecedor: Dict[str, any] = Field(..., description="Histórico e regularidade do fornecedor")
-    analise_compatibilidade: Dict[str, any] = Field(..., description="Produtos compatíveis com PNAE")
+    analise_preco: Dict[str, Any] = Field(..., description="Comparação com preços de mercado")
+    analise_fornecedor: Dict[str, Any] = Field(..., description="Histórico e regularidade do fornecedor")
+    analise_compatibilidade: Dict[str, Any] = Field(..., description="Produtos compatíveis com PNAE")
     justificativa_ia: str = Field(..., description="Explicação da IA sobre a análise")
+    status_parecer: Optional[Literal["pendente", "concluido", "indisponivel", "dispensado"]] = Field(
+        None, description="Parecer da IA: gerado em segundo plano após o upload"
+    )
+    pontos_atencao: Optional[List[str]] = None
+    recomendacao_final: Optional[str] = None
     requer_investigacao: bool = Field(..., description="Se deve ser investigado manualmente")
 
 
@@ -455,9 +581,9 @@ class DashboardFiscalizacaoGoverno(BaseModel):
     distribuicao_severidade: Dict[str, int] = Field(..., description="Contagem por severidade")
     
     # Top alertas
-    escolas_alto_risco: List[Dict[str, any]] = Field(..., description="Escolas que requerem investigação")
-    fornecedores_suspeitos: List[Dict[str, any]] = Field(..., description="Fornecedores com padrões irregulares")
-    produtos_preco_inflacionado: List[Dict[str, any]]
+    escolas_alto_risco: List[Dict[str, Any]] = Field(..., description="Escolas que requerem investigação")
+    fornecedores_suspeitos: List[Dict[str, Any]] = Field(..., description="Fornecedores com padrões irregulares")
+    produtos_preco_inflacionado: List[Dict[str, Any]]
     
     # Estatísticas de conformidade
     score_conformidade_medio: float = Field(..., ge=0, le=100)
@@ -466,7 +592,7 @@ class DashboardFiscalizacaoGoverno(BaseModel):
     percentual_irregulares: float = Field(..., ge=0, le=100)
     
     # Tendências
-    tendencia_mes_atual: Dict[str, any]
+    tendencia_mes_atual: Dict[str, Any]
     economia_potencial_recuperacao: float = Field(..., description="Valor estimado de possíveis desvios")
 
 
@@ -474,7 +600,7 @@ class RelatorioFiscalizacao(BaseModel):
     """Relatório detalhado para auditoria."""
     escola_id: str
     periodo: str
-    notas_fiscais: List[Dict[str, any]]
+    notas_fiscais: List[Dict[str, Any]]
     total_gasto: float
     conformidade_geral: float
     alertas_encontrados: List[AlertaFiscalizacao]
@@ -6,7 +6,20 @@ from .geolocation import (
     calcular_score_match,
     calcular_desconto_proximidade,
     ordenar_produtores_por_match,
-    filtrar_por_raio
+    filtrar_por_raio,
+    haversine_lote,
+    ResultadoMatch,
+    CatalogoProdutores,
+    obter_catalogo_produtores
+)
+from .llm import (
+    GatewayLLM,
+    LLMIndisponivel,
+    obter_gateway_llm
+)
+from .cache_ia import (
+    CacheRespostasIA,
+    obter_cache_ia
 )
 from .ia_cardapio import (
     gerar_sugestao_substituicao,
@@ -21,6 +34,30 @@ from .pdf_reports import (
     gerar_relatorio_compra_pdf,
     salvar_pdf
 )
+from .agregados import (
+    AgregadosFinanceiros,
+    obter_agregados
+)
+from .matriz_proximidade import (
+    MatrizProximidade,
+    obter_matriz_proximidade
+)
+from .ofertas import (
+    IndiceOfertas,
+    obter_indice_ofertas
+)
+from .fila_cardapios import (
+    FilaCardapios,
+    obter_fila_cardapios
+)
+from .pareceres_fiscais import (
+    FilaPareceres,
+    obter_fila_pareceres
+)
+from .logistica import (
+    consolidar_entregas,
+    planejar_rota
+)
 
 __all__ = [
     # Geolocalização
@@ -29,6 +66,19 @@ __all__ = [
     "calcular_desconto_proximidade",
     "ordenar_produtores_por_match",
     "filtrar_por_raio",
+    "haversine_lote",
+    "ResultadoMatch",
+    "CatalogoProdutores",
+    "obter_catalogo_produtores",
+    
+    # Gateway de LLM
+    "GatewayLLM",
+    "LLMIndisponivel",
+    "obter_gateway_llm",
+    
+    # Cache de respostas da IA
+    "CacheRespostasIA",
+    "obter_cache_ia",
     
     # IA Cardápio
     "gerar_sugestao_substituicao",
@@ -42,4 +92,28 @@ __all__ = [
     # PDF Reports
     "gerar_relatorio_compra_pdf",
     "salvar_pdf",
+    
+    # Agregados financeiros
+    "AgregadosFinanceiros",
+    "obter_agregados",
+    
+    # Matriz escola × produtor
+    "MatrizProximidade",
+    "obter_matriz_proximidade",
+    
+    # Índice de ofertas
+    "IndiceOfertas",
+    "obter_indice_ofertas",
+    
+    # Fila de cardápios
+    "FilaCardapios",
+    "obter_fila_cardapios",
+    
+    # Pareceres fiscais da IA
+    "FilaPareceres",
+    "obter_fila_pareceres",
+    
+    # Logística de entregas
+    "consolidar_entregas",
+    "planejar_rota",
 ]
@@ -0,0 +1,267 @@
+"""
+Agregados financeiros materializados para os dashboards da secretaria.
+Mantidos incrementalmente a partir das mudanças nas coleções de pedidos e
+produtores, em vez de reagregar todo o histórico a cada requisição.
+"""
+import heapq
+import threading
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from storage import Observador, repositorio
+
+# Pedidos cancelados não contam como gasto
+STATUS_FORA_DOS_AGREGADOS = {"cancelado"}
+
+
+class ClassificacaoTopK:
+    """
+    Itens por chave (crescente) em um heap com invalidação preguiçosa, para
+    servir rankings. Atualizar ou remover um item custa O(log n): a entrada
+    antiga fica no heap e é descartada quando chega ao topo. Os k primeiros
+    saem em O(k log n) (mais as entradas vencidas descartadas no caminho).
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[Any, int, str]] = []
+        self._entradas: Dict[str, int] = {}  # Entrada vigente de cada item
+        self._sequencia = 0
+
+    def definir(self, item_id: str, chave: Any):
+        """Insere ou reposiciona um item."""
+        self._sequencia += 1
+        self._entradas[item_id] = self._sequencia
+        heapq.heappush(self._heap, (chave, self._sequencia, item_id))
+        self._compactar()
+
+    def remover(self, item_id: str):
+        if self._entradas.pop(item_id, None) is not None:
+            self._compactar()
+
+    def _vigente(self, entrada: Tuple[Any, int, str]) -> bool:
+        return self._entradas.get(entrada[2]) == entrada[1]
+
+    def _compactar(self):
+        # Entradas vencidas demais: reconstrói o heap só com as vigentes (O(n))
+        if len(self._heap) > 2 * len(self._entradas) + 64:
+            self._heap = [entrada for entrada in self._heap if self._vigente(entrada)]
+            heapq.heapify(self._heap)
+
+    def primeiros(self, k: int) -> List[str]:
+        topo: List[Tuple[Any, int, str]] = []
+        while self._heap and len(topo) < k:
+            entrada = heapq.heappop(self._heap)
+            if self._vigente(entrada):
+                topo.append(entrada)
+        for entrada in topo:
+            heapq.heappush(self._heap, entrada)
+        return [item_id for _, _, item_id in topo]
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+
+class AgregadosFinanceiros:
+    """
+    Totais por escola e por produtor, atualizados em O(1) por pedido
+    criado ou alterado, mais O(log n) para reposicionar escola e produtor
+    nos rankings.
+
+    - Escola: gasto_total, gasto_af, numero_pedidos
+    - Produtor: total_vendas, numero_entregas
+    - Rede: gasto total e gasto com agricultura familiar (produtores com DAP)
+
+    Empates nos rankings seguem a ordem em que escola/produtor apareceram
+    pela primeira vez nos pedidos.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._dap: Dict[str, bool] = {}
+        self._limpar_pedidos()
+
+    def _limpar_pedidos(self):
+        self.gasto_total = Decimal(0)
+        self.gasto_af = Decimal(0)
+        self._escolas: Dict[str, Dict[str, Any]] = {}
+        self._produtores: Dict[str, Dict[str, Any]] = {}
+        # Gasto por produtor e escola: permite corrigir gasto_af quando a DAP muda
+        self._gasto_por_produtor_escola: Dict[str, Dict[str, Decimal]] = {}
+        self._ordem = 0
+        self._ranking_escolas = ClassificacaoTopK()
+        self._ranking_produtores = ClassificacaoTopK()
+
+    # ==================== ATUALIZAÇÃO ====================
+
+    def _proxima_ordem(self) -> int:
+        self._ordem += 1
+        return self._ordem
+
+    def _aplicar_pedido(self, pedido: dict, sinal: int):
+        """Soma (sinal=1) ou subtrai (sinal=-1) a contribuição de um pedido."""
+        if pedido.get("status") in STATUS_FORA_DOS_AGREGADOS:
+            return
+
+        escola_id = pedido.get("escola_id")
+        produtor_id = pedido.get("produtor_id")
+        valor = Decimal(str(pedido.get("valor_total", 0))) * sinal
+        familiar = self._dap.get(produtor_id, False)
+
+        self.gasto_total += valor
+        if familiar:
+            self.gasto_af += valor
+
+        escola = self._escolas.get(escola_id)
+        if escola is None:
+            escola = self._escolas[escola_id] = {
+                "gasto_total": Decimal(0), "gasto_af": Decimal(0),
+                "numero_pedidos": 0, "ordem": self._proxima_ordem()
+            }
+        escola["gasto_total"] += valor
+        escola["numero_pedidos"] += sinal
+        if familiar:
+            escola["gasto_af"] += valor
+
+        produtor = self._produtores.get(produtor_id)
+        if produtor is None:
+            produtor = self._produtores[produtor_id] = {
+                "total_vendas": Decimal(0), "numero_entregas": 0, "ordem": self._proxima_ordem()
+            }
+        produtor["total_vendas"] += valor
+        produtor["numero_entregas"] += sinal
+
+        por_escola = self._gasto_por_produtor_escola.setdefault(produtor_id, {})
+        por_escola[escola_id] = por_escola.get(escola_id, Decimal(0)) + valor
+
+        self._reposicionar_escola(escola_id)
+        self._reposicionar_produtor(produtor_id)
+
+    def _reposicionar_escola(self, escola_id: str):
+        escola = self._escolas[escola_id]
+        if escola["numero_pedidos"] <= 0:
+            self._ranking_escolas.remover(escola_id)
+            return
+        self._ranking_escolas.definir(escola_id, (-self._percentual_af(escola), escola["ordem"]))
+
+    def _reposicionar_produtor(self, produtor_id: str):
+        produtor = self._produtores[produtor_id]
+        if produtor["numero_entregas"] <= 0:
+            self._ranking_produtores.remover(produtor_id)
+            return
+        self._ranking_produtores.definir(produtor_id, (-float(produtor["total_vendas"]), produtor["ordem"]))
+
+    def _definir_dap(self, produtor_id: str, possui_dap: bool):
+        """Atualiza a DAP de um produtor e corrige o gasto_af já agregado."""
+        if self._dap.get(produtor_id, False) == possui_dap:
+            self._dap[produtor_id] = possui_dap
+            return
+        self._dap[produtor_id] = possui_dap
+
+        sinal = 1 if possui_dap else -1
+        for escola_id, valor in self._gasto_por_produtor_escola.get(produtor_id, {}).items():
+            self.gasto_af += valor * sinal
+            self._escolas[escola_id]["gasto_af"] += valor * sinal
+            self._reposicionar_escola(escola_id)
+
+    @staticmethod
+    def _percentual_af(escola: Dict[str, Any]) -> float:
+        if escola["gasto_total"] <= 0:
+            return 0.0
+        return round(float(escola["gasto_af"] / escola["gasto_total"] * 100), 2)
+
+    # ==================== CONSULTA ====================
+
+    def resumo(self) -> Dict[str, Any]:
+        """Totais da rede para o dashboard financeiro."""
+        with self._lock:
+            return {
+                "gasto_total": self.gasto_total,
+                "gasto_agricultura_familiar": self.gasto_af,
+                "numero_escolas": len(self._ranking_escolas),
+                "numero_produtores_ativos": len(self._ranking_produtores),
+            }
+
+    def ranking_escolas(self, limite: int) -> List[Dict[str, Any]]:
+        """Escolas com maior percentual de agricultura familiar."""
+        with self._lock:
+            return [
+                {
+                    "escola_id": escola_id,
+                    "percentual_af": self._percentual_af(self._escolas[escola_id]),
+                    "gasto_total": self._escolas[escola_id]["gasto_total"],
+                    "numero_pedidos": self._escolas[escola_id]["numero_pedidos"],
+                }
+                for escola_id in self._ranking_escolas.primeiros(limite)
+            ]
+
+    def ranking_produtores(self, limite: int) -> List[Dict[str, Any]]:
+        """Produtores com maior volume de vendas."""
+        with self._lock:
+            return [
+                {
+                    "produtor_id": produtor_id,
+                    "total_vendas": self._produtores[produtor_id]["total_vendas"],
+                    "numero_entregas": self._produtores[produtor_id]["numero_entregas"],
+                }
+                for produtor_id in self._ranking_produtores.primeiros(limite)
+            ]
+
+
+class _ObservadorPedidos(Observador):
+    def __init__(self, agregados: AgregadosFinanceiros):
+        self.agregados = agregados
+
+    def limpar(self):
+        with self.agregados._lock:
+            self.agregados._limpar_pedidos()
+
+    def adicionar(self, registro: dict):
+        with self.agregados._lock:
+            self.agregados._aplicar_pedido(registro, 1)
+
+    def remover(self, registro: dict):
+        with self.agregados._lock:
+            self.agregados._aplicar_pedido(registro, -1)
+
+
+class _ObservadorProdutores(Observador):
+    def __init__(self, agregados: AgregadosFinanceiros):
+        self.agregados = agregados
+
+    def limpar(self):
+        with self.agregados._lock:
+            for produtor_id in list(self.agregados._dap):
+                self.agregados._definir_dap(produtor_id, False)
+
+    def adicionar(self, registro: dict):
+        with self.agregados._lock:
+            self.agregados._definir_dap(registro.get("id"), bool(registro.get("possui_dap", False)))
+
+    def remover(self, registro: dict):
+        with self.agregados._lock:
+            self.agregados._definir_dap(registro.get("id"), False)
+
+
+_agregados: Optional[AgregadosFinanceiros] = None
+_lock = threading.Lock()
+
+
+def obter_agregados() -> AgregadosFinanceiros:
+    """
+    Retorna os agregados da rede, criando-os na primeira chamada a partir
+    das coleções do repositório (que passam a notificá-los a cada escrita).
+    """
+    global _agregados
+    if _agregados is not None:
+        # Escritas de outros processos chegam pela recarga das coleções
+        repositorio.colecao("produtores").sincronizar()
+        repositorio.colecao("pedidos").sincronizar()
+    else:
+        with _lock:
+            if _agregados is None:
+                agregados = AgregadosFinanceiros()
+                # Produtores primeiro: a DAP define o que conta como agricultura familiar
+                repositorio.colecao("produtores").observar(_ObservadorProdutores(agregados))
+                repositorio.colecao("pedidos").observar(_ObservadorPedidos(agregados))
+                _agregados = agregados
+    return _agregados
@@ -0,0 +1,135 @@
+"""
+Cache das respostas da IA em dois níveis: LRU em memória (por processo) e
+uma tabela SQLite em modo WAL compartilhada pelos workers. Uma resposta
+gerada por um worker atende os demais a partir do disco e sobe para a LRU
+de cada um. As entradas valem até o fim do mês em que foram geradas, quando
+a safra vigente muda.
+"""
+import calendar
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from config import settings
+from storage import repositorio
+from storage.sqlite import BancoSQLite
+
+# Arquivo do nível em disco (ao lado das coleções)
+ARQUIVO_CACHE = "cache_ia.db"
+
+
+def fim_do_mes(momento: datetime) -> float:
+    """Timestamp do último instante do mês de `momento` (horário local)."""
+    ultimo_dia = calendar.monthrange(momento.year, momento.month)[1]
+    fim = momento.replace(day=ultimo_dia, hour=23, minute=59, second=59, microsecond=999999)
+    return fim.timestamp()
+
+
+class CacheRespostasIA:
+    """
+    Respostas (dicts JSON) por chave, com expiração absoluta.
+
+    `obter` consulta a LRU e depois o disco; `gravar` escreve nos dois
+    níveis. Os contadores de acertos e faltas são do processo.
+    """
+
+    def __init__(self, caminho: Path, capacidade: int = 1024):
+        self.banco = BancoSQLite(caminho)
+        self.capacidade = capacidade
+        self._memoria: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._estatisticas = {"acertos_memoria": 0, "acertos_disco": 0, "faltas": 0, "gravacoes": 0}
+
+        conexao = self.banco.conexao()
+        conexao.execute(
+            "CREATE TABLE IF NOT EXISTS respostas ("
+            "chave TEXT PRIMARY KEY, valor TEXT NOT NULL, expira_em REAL NOT NULL)"
+        )
+        conexao.execute("CREATE INDEX IF NOT EXISTS idx_respostas_expira_em ON respostas (expira_em)")
+
+    def _guardar_memoria(self, chave: str, expira_em: float, valor: Dict[str, Any]):
+        self._memoria[chave] = (expira_em, valor)
+        self._memoria.move_to_end(chave)
+        while len(self._memoria) > self.capacidade:
+            self._memoria.popitem(last=False)
+
+    def obter(self, chave: str) -> Optional[Dict[str, Any]]:
+        """Cópia da resposta em cache ou None (ausente ou expirada)."""
+        agora = time.time()
+        with self._lock:
+            entrada = self._memoria.get(chave)
+            if entrada is not None:
+                if entrada[0] > agora:
+                    self._memoria.move_to_end(chave)
+                    self._estatisticas["acertos_memoria"] += 1
+                    return dict(entrada[1])
+                del self._memoria[chave]
+
+        linha = self.banco.conexao().execute(
+            "SELECT valor, expira_em FROM respostas WHERE chave = ? AND expira_em > ?",
+            (chave, agora)
+        ).fetchone()
+        with self._lock:
+            if linha is None:
+                self._estatisticas["faltas"] += 1
+                return None
+            valor = json.loads(linha[0])
+            if self.capacidade:
+                self._guardar_memoria(chave, linha[1], valor)
+            self._estatisticas["acertos_disco"] += 1
+        return dict(valor)
+
+    def gravar(self, chave: str, valor: Dict[str, Any], expira_em: float):
+        """Grava nos dois níveis e descarta do disco as entradas vencidas."""
+        conexao = self.banco.conexao()
+        conexao.execute("DELETE FROM respostas WHERE expira_em <= ?", (time.time(),))
+        conexao.execute(
+            "INSERT OR REPLACE INTO respostas (chave, valor, expira_em) VALUES (?, ?, ?)",
+            (chave, json.dumps(valor, ensure_ascii=False), expira_em)
+        )
+        with self._lock:
+            if self.capacidade:
+                self._guardar_memoria(chave, expira_em, dict(valor))
+            self._estatisticas["gravacoes"] += 1
+
+    def limpar(self):
+        """Esvazia os dois níveis (os contadores são mantidos)."""
+        self.banco.conexao().execute("DELETE FROM respostas")
+        with self._lock:
+            self._memoria.clear()
+
+    def estatisticas(self) -> Dict[str, Any]:
+        """Acertos por nível, faltas, gravações, taxa de acerto e tamanhos."""
+        entradas_disco = self.banco.conexao().execute(
+            "SELECT COUNT(*) FROM respostas WHERE expira_em > ?", (time.time(),)
+        ).fetchone()[0]
+        with self._lock:
+            resumo: Dict[str, Any] = dict(self._estatisticas)
+            resumo["entradas_memoria"] = len(self._memoria)
+        consultas = resumo["acertos_memoria"] + resumo["acertos_disco"] + resumo["faltas"]
+        acertos = resumo["acertos_memoria"] + resumo["acertos_disco"]
+        resumo["taxa_acerto"] = round(acertos / consultas, 4) if consultas else 0.0
+        resumo["entradas_disco"] = entradas_disco
+        resumo["capacidade_memoria"] = self.capacidade
+        return resumo
+
+
+_cache: Optional[CacheRespostasIA] = None
+_lock = threading.Lock()
+
+
+def obter_cache_ia() -> CacheRespostasIA:
+    """Retorna o cache de respostas da IA, criado na primeira chamada."""
+    global _cache
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                _cache = CacheRespostasIA(
+                    repositorio.data_dir / ARQUIVO_CACHE,
+                    capacidade=settings.cache_ia_capacidade
+                )
+    return _cache
@@ -0,0 +1,230 @@
+"""
+Espelho colunar (NumPy) dos registros de consumo diário.
+Cada item consumido vira uma linha em arrays paralelos, com textos
+codificados em dicionário; as análises do dashboard viram group-bys
+vetorizados (`np.bincount`) em vez de laços sobre dicionários aninhados.
+"""
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from storage import Observador, repositorio
+
+# Nível de aceitação codificado (qualquer outro valor conta como baixa)
+NIVEIS_ACEITACAO = {"baixa": 0, "media": 1, "alta": 2}
+
+
+class Dicionario:
+    """Codificação de textos em inteiros (0, 1, 2, ... na ordem de chegada)."""
+
+    def __init__(self):
+        self.codigos: Dict[Any, int] = {}
+        self.valores: List[Any] = []
+
+    def codificar(self, valor: Any) -> int:
+        codigo = self.codigos.get(valor)
+        if codigo is None:
+            codigo = self.codigos[valor] = len(self.valores)
+            self.valores.append(valor)
+        return codigo
+
+    def __len__(self) -> int:
+        return len(self.valores)
+
+
+class Colunas:
+    """Arrays NumPy paralelos que crescem por duplicação da capacidade."""
+
+    def __init__(self, tipos: Dict[str, Any], capacidade: int = 1024):
+        self.tipos = tipos
+        self.tamanho = 0
+        self.arrays = {nome: np.zeros(capacidade, dtype=tipo) for nome, tipo in tipos.items()}
+
+    def anexar(self, linhas: Dict[str, List[Any]]) -> int:
+        """Anexa linhas (uma lista por coluna) e retorna a posição da primeira."""
+        n = len(next(iter(linhas.values())))
+        inicio = self.tamanho
+        if inicio + n > len(next(iter(self.arrays.values()))):
+            capacidade = max(2 * (inicio + n), 1024)
+            for nome, array in self.arrays.items():
+                novo = np.zeros(capacidade, dtype=array.dtype)
+                novo[:inicio] = array[:inicio]
+                self.arrays[nome] = novo
+        for nome, valores in linhas.items():
+            self.arrays[nome][inicio:inicio + n] = valores
+        self.tamanho = inicio + n
+        return inicio
+
+    def __getitem__(self, nome: str) -> np.ndarray:
+        return self.arrays[nome][:self.tamanho]
+
+
+class ConsumoColunar(Observador):
+    """
+    Itens de consumo em formato colunar, mantido a cada escrita.
+
+    Colunas por item: escola, data, prato, registro, servida, consumida,
+    desperdicada, aceitacao e ativo (itens de registros alterados ficam
+    inativos e a nova versão é anexada).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.limpar()
+
+    def limpar(self):
+        with self._lock:
+            self.escolas = Dicionario()
+            self.pratos = Dicionario()
+            self.registros = Dicionario()
+            self.itens = Colunas({
+                "escola": np.int32,
+                "data": "datetime64[D]",
+                "prato": np.int32,
+                "registro": np.int32,
+                "servida": np.int64,
+                "consumida": np.int64,
+                "desperdicada": np.int64,
+                "aceitacao": np.int8,
+                "ativo": np.bool_,
+            })
+            # Faixa de linhas [inicio, fim) de cada registro ativo
+            self._linhas_registro: Dict[Any, tuple] = {}
+
+    def adicionar(self, registro: dict):
+        itens = registro.get("itens") or []
+        with self._lock:
+            codigo_registro = self.registros.codificar(registro.get("id"))
+            if not itens:
+                return
+            n = len(itens)
+            inicio = self.itens.anexar({
+                "escola": [self.escolas.codificar(registro.get("escola_id"))] * n,
+                "data": [_data(registro.get("data"))] * n,
+                "prato": [self.pratos.codificar(item.get("prato_nome")) for item in itens],
+                "registro": [codigo_registro] * n,
+                "servida": [item.get("quantidade_servida", 0) for item in itens],
+                "consumida": [item.get("quantidade_consumida", 0) for item in itens],
+                "desperdicada": [item.get("quantidade_desperdicada", 0) for item in itens],
+                "aceitacao": [NIVEIS_ACEITACAO.get(item.get("nivel_aceitacao"), 0) for item in itens],
+                "ativo": [True] * n,
+            })
+            self._linhas_registro[registro.get("id")] = (inicio, inicio + n)
+
+    def remover(self, registro: dict):
+        with self._lock:
+            faixa = self._linhas_registro.pop(registro.get("id"), None)
+            if faixa is not None:
+                self.itens.arrays["ativo"][faixa[0]:faixa[1]] = False
+
+    # ==================== ANÁLISE ====================
+
+    def analisar(
+        self,
+        escola_id: str,
+        data_inicio: Optional[str] = None,
+        data_fim: Optional[str] = None
+    ) -> Dict:
+        """
+        Mesmo resultado de `ia_dashboard.analisar_historico_consumo` para os
+        registros da escola (opcionalmente limitados a um período).
+        """
+        with self._lock:
+            codigo_escola = self.escolas.codigos.get(escola_id)
+            if codigo_escola is None:
+                return _analise_vazia()
+
+            mascara = self.itens["ativo"] & (self.itens["escola"] == codigo_escola)
+            if data_inicio:
+                mascara &= self.itens["data"] >= np.datetime64(data_inicio, "D")
+            if data_fim:
+                mascara &= self.itens["data"] <= np.datetime64(data_fim, "D")
+
+            pratos = self.itens["prato"][mascara]
+            if not len(pratos):
+                return _analise_vazia()
+
+            n_pratos = len(self.pratos)
+            total_registros = np.count_nonzero(np.bincount(self.itens["registro"][mascara]))
+            vezes = np.bincount(pratos, minlength=n_pratos)
+            servido = np.bincount(pratos, weights=self.itens["servida"][mascara], minlength=n_pratos)
+            consumido = np.bincount(pratos, weights=self.itens["consumida"][mascara], minlength=n_pratos)
+            desperdicado = np.bincount(pratos, weights=self.itens["desperdicada"][mascara], minlength=n_pratos)
+            # Contagem por (prato, nível) em uma única passada
+            niveis = np.bincount(
+                pratos * 3 + self.itens["aceitacao"][mascara], minlength=n_pratos * 3
+            ).reshape(n_pratos, 3)
+
+            # Pratos na ordem da primeira aparição (como na análise por registro):
+            # atribuindo em ordem reversa, prevalece a menor posição de cada prato
+            primeira = np.full(n_pratos, len(pratos))
+            primeira[pratos[::-1]] = np.arange(len(pratos) - 1, -1, -1)
+            presentes = np.flatnonzero(vezes)
+            ordem = presentes[np.argsort(primeira[presentes], kind="stable")]
+            nomes = self.pratos.valores
+
+        vezes_f = np.maximum(vezes, 1).astype(np.float64)
+        servido_f = np.maximum(servido, 1)
+        score = (niveis[:, 2] * 10 + niveis[:, 1] * 5) / vezes_f
+        perc_desperdicio = (desperdicado / servido_f) * 100
+        perc_consumo = (consumido / servido_f) * 100
+
+        analise = {
+            "total_registros": int(total_registros),
+            "preferencias": {},
+            "desperdicio": {},
+            "tendencias": {}
+        }
+        for prato in ordem.tolist():
+            nome = nomes[prato]
+            analise["preferencias"][nome] = {
+                "score_aceitacao": round(float(score[prato]), 2),
+                "vezes_servido": int(vezes[prato]),
+                "percentual_consumo": round(float(perc_consumo[prato]), 2)
+            }
+            analise["desperdicio"][nome] = {
+                "percentual": round(float(perc_desperdicio[prato]), 2),
+                "quantidade_total": int(desperdicado[prato]),
+                "frequencia": int(vezes[prato])
+            }
+        return analise
+
+
+def _data(valor: Any) -> np.datetime64:
+    """Data ISO do registro (NaT se ausente ou inválida)."""
+    try:
+        return np.datetime64(str(valor)[:10], "D")
+    except ValueError:
+        return np.datetime64("NaT")
+
+
+def _analise_vazia() -> Dict:
+    return {
+        "total_registros": 0,
+        "preferencias": {},
+        "desperdicio": {},
+        "tendencias": {}
+    }
+
+
+_consumo: Optional[ConsumoColunar] = None
+_lock = threading.Lock()
+
+
+def obter_consumo_colunar() -> ConsumoColunar:
+    """
+    Retorna o espelho colunar de `consumo_diario`, criado na primeira
+    chamada e mantido pelas notificações da coleção.
+    """
+    global _consumo
+    if _consumo is not None:
+        # Escritas de outros processos chegam pela recarga da coleção
+        repositorio.colecao("consumo_diario").sincronizar()
+    else:
+        with _lock:
+            if _consumo is None:
+                consumo = ConsumoColunar()
+                repositorio.colecao("consumo_diario").observar(consumo)
+                _consumo = consumo
+    return _consumo
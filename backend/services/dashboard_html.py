@@ -4,7 +4,8 @@ Gera página HTML com gráficos usando Chart.js.
 """
 import json
 from typing import Dict
-from pathlib import Path
+
+from storage import repositorio
 
 
 def gerar_dashboard_html(escola_id: str = "ESC001") -> str:
@@ -14,28 +15,25 @@ def gerar_dashboard_html(escola_id: str = "ESC001") -> str:
     """
     
     # Carregar dados mockados
-    DATA_DIR = Path(__file__).parent.parent / "data"
-    
     try:
-        with open(DATA_DIR / "preferencias_alunos.json", "r", encoding="utf-8") as f:
-            prefs = json.load(f)
-            alimentos = prefs.get("preferencias_alunos", [])[:10]
-            
-            # Se não encontrou, tenta direto na raiz
-            if not alimentos:
-                # Usar dados de exemplo
-                alimentos = [
-                    {"alimento": "Arroz com feijão", "score_aceitacao": 9.2, "percentual_consumo": 92},
-                    {"alimento": "Frango grelhado", "score_aceitacao": 8.8, "percentual_consumo": 88},
-                    {"alimento": "Batata frita", "score_aceitacao": 9.5, "percentual_consumo": 95},
-                    {"alimento": "Macarrão", "score_aceitacao": 8.5, "percentual_consumo": 85},
-                    {"alimento": "Banana", "score_aceitacao": 8.9, "percentual_consumo": 89},
-                    {"alimento": "Melancia", "score_aceitacao": 9.3, "percentual_consumo": 93},
-                    {"alimento": "Suco natural", "score_aceitacao": 9.0, "percentual_consumo": 90},
-                    {"alimento": "Salada", "score_aceitacao": 6.5, "percentual_consumo": 60},
-                    {"alimento": "Chuchu", "score_aceitacao": 4.2, "percentual_consumo": 42},
-                    {"alimento": "Jiló", "score_aceitacao": 2.8, "percentual_consumo": 25}
-                ]
+        prefs = repositorio.colecao("preferencias_alunos").dados()
+        alimentos = prefs.get("preferencias_alunos", [])[:10]
+        
+        # Se não encontrou, tenta direto na raiz
+        if not alimentos:
+            # Usar dados de exemplo
+            alimentos = [
+                {"alimento": "Arroz com feijão", "score_aceitacao": 9.2, "percentual_consumo": 92},
+                {"alimento": "Frango grelhado", "score_aceitacao": 8.8, "percentual_consumo": 88},
+                {"alimento": "Batata frita", "score_aceitacao": 9.5, "percentual_consumo": 95},
+                {"alimento": "Macarrão", "score_aceitacao": 8.5, "percentual_consumo": 85},
+                {"alimento": "Banana", "score_aceitacao": 8.9, "percentual_consumo": 89},
+                {"alimento": "Melancia", "score_aceitacao": 9.3, "percentual_consumo": 93},
+                {"alimento": "Suco natural", "score_aceitacao": 9.0, "percentual_consumo": 90},
+                {"alimento": "Salada", "score_aceitacao": 6.5, "percentual_consumo": 60},
+                {"alimento": "Chuchu", "score_aceitacao": 4.2, "percentual_consumo": 42},
+                {"alimento": "Jiló", "score_aceitacao": 2.8, "percentual_consumo": 25}
+            ]
     except Exception as e:
         # Dados de fallback
         alimentos = [
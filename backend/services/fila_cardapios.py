@@ -0,0 +1,315 @@
+"""
+Fila de geração de cardápios em segundo plano.
+Cada solicitação vira um job na coleção `jobs_cardapio` (journal: sobrevive
+a reinícios) e é processada por um pool fixo de workers, que limita quantas
+gerações com IA rodam ao mesmo tempo. O cardápio pronto fica gravado no
+próprio job; consultas repetidas só leem o registro. A resposta da IA é
+lida em streaming e os pratos validados entram em `pratos_prontos` do job
+conforme chegam (gravados no máximo a cada `cardapio_pratos_intervalo_s`);
+na conclusão a lista passa a ser a do cardápio final.
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import settings
+from schemas import CardapioGerado, PratoCardapio
+from storage import repositorio
+from services.consumo_colunar import obter_consumo_colunar
+from services.ia_dashboard import gerar_cardapio_inteligente
+from services.posse_registros import PosseRegistros
+
+logger = logging.getLogger(__name__)
+
+COLECAO_JOBS = "jobs_cardapio"
+
+# Status de um job; os dois últimos são finais
+STATUS_PENDENTE = "pendente"
+STATUS_PROCESSANDO = "processando"
+STATUS_CONCLUIDO = "concluido"
+STATUS_ERRO = "erro"
+STATUS_FINAIS = (STATUS_CONCLUIDO, STATUS_ERRO)
+
+
+class FilaCheia(RuntimeError):
+    """Há jobs pendentes demais para aceitar uma nova solicitação."""
+
+
+def montar_cardapio(
+    solicitacao: Dict[str, Any],
+    ao_gerar_prato: Optional[Callable[[Dict], None]] = None
+) -> Dict[str, Any]:
+    """
+    Gera o cardápio de uma solicitação (formato de `SolicitacaoCardapio`)
+    e o valida contra `CardapioGerado`. `ao_gerar_prato` recebe cada prato
+    durante o streaming (ver `gerar_cardapio_inteligente`).
+    """
+    safra = repositorio.colecao("safra_regional").dados()
+
+    # Análise do histórico da escola (group-by vetorizado no espelho colunar)
+    analise_consumo = obter_consumo_colunar().analisar(solicitacao["escola_id"])
+
+    data_inicio = datetime.fromisoformat(solicitacao["periodo_inicio"])
+    data_fim = datetime.fromisoformat(solicitacao["periodo_fim"])
+    periodo_dias = (data_fim - data_inicio).days + 1
+
+    cardapio = gerar_cardapio_inteligente(
+        escola_id=solicitacao["escola_id"],
+        periodo_dias=periodo_dias,
+        tipo_refeicao=solicitacao["tipo_refeicao"],
+        historico_consumo=None,
+        safra_disponivel=safra.get("produtos_disponiveis", []),
+        prioridade_nutricao=solicitacao["prioridade_nutricao"],
+        prioridade_aceitacao=solicitacao["prioridade_aceitacao"],
+        restricoes=solicitacao.get("restricoes_alergias"),
+        orcamento_diario=solicitacao.get("orcamento_diario"),
+        analise=analise_consumo,
+        ao_gerar_prato=ao_gerar_prato
+    )
+    # O cardápio de fallback não traz escola nem refeição
+    cardapio["escola_id"] = solicitacao["escola_id"]
+    cardapio["tipo_refeicao"] = solicitacao["tipo_refeicao"]
+    cardapio["periodo_inicio"] = solicitacao["periodo_inicio"]
+    cardapio["periodo_fim"] = solicitacao["periodo_fim"]
+    return CardapioGerado.model_validate(cardapio).model_dump()
+
+
+class FilaCardapios:
+    """
+    Workers (threads) que consomem os ids de jobs de uma fila em memória.
+
+    A fila em memória é só o despacho: o estado vive na coleção. Um worker
+    só processa o job que reivindicou (pendente → processando, com dono;
+    ver `PosseRegistros`), então vários processos podem consumir a mesma
+    coleção. No início, jobs pendentes e os processando cuja posse venceu
+    (processo encerrado no meio) voltam para a fila; depois, uma thread
+    vigia renova as posses deste processo e retoma as vencidas. Quem acompanha um job lê a `versao` dele antes de consultá-lo e
+    aguarda a próxima mudança (`aguardar_mudanca`) em vez de consultar a
+    coleção em intervalos.
+    """
+
+    def __init__(self, workers: int = 2, pendentes_maximo: int = 200, posse_expiracao_s: float = 120):
+        self.workers = workers
+        self.pendentes_maximo = pendentes_maximo
+        self._posse = PosseRegistros(COLECAO_JOBS, posse_expiracao_s)
+        self._fila: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._parada = threading.Event()
+        self._ouvintes: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+        self._versoes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    # ==================== CICLO DE VIDA ====================
+
+    def iniciar(self):
+        """Retoma os jobs pendentes e os abandonados e sobe os workers e a vigia."""
+        jobs = repositorio.colecao(COLECAO_JOBS)
+        retomados = sorted(
+            jobs.filtrar(status=STATUS_PENDENTE)
+            + [job for job in jobs.filtrar(status=STATUS_PROCESSANDO) if self._posse.livre(job)],
+            key=lambda job: job["data_criacao"]
+        )
+        for job in retomados:
+            self._fila.put(job["id"])
+        if retomados:
+            logger.info(f"🍽️ {len(retomados)} jobs de cardápio retomados")
+
+        for numero in range(self.workers):
+            thread = threading.Thread(target=self._executar, name=f"cardapio-{numero}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        threading.Thread(target=self._vigiar, name="cardapio-vigia", daemon=True).start()
+
+    def parar(self):
+        """Sinaliza o fim aos workers (jobs em andamento são retomados quando a posse vencer)."""
+        self._parada.set()
+        for _ in self._threads:
+            self._fila.put(None)
+        self._threads = []
+
+    def _vigiar(self):
+        """Renova as posses deste processo e retoma jobs de processos que pararam no meio."""
+        while not self._parada.wait(self._posse.expiracao_s / 3):
+            try:
+                self._posse.renovar()
+                for job in repositorio.colecao(COLECAO_JOBS).filtrar(status=STATUS_PROCESSANDO):
+                    if self._posse.vencida(job):
+                        logger.warning(f"🍽️ Posse do job de cardápio {job['id']} venceu: retomando")
+                        self._fila.put(job["id"])
+            except Exception as e:
+                logger.error(f"❌ Erro na vigia da fila de cardápios: {e}", exc_info=True)
+
+    # ==================== SUBMISSÃO ====================
+
+    def submeter(self, solicitacao: Dict[str, Any]) -> dict:
+        """Grava o job como pendente e o coloca na fila. Retorna o job."""
+        jobs = repositorio.colecao(COLECAO_JOBS)
+        if jobs.contar(status=STATUS_PENDENTE) >= self.pendentes_maximo:
+            raise FilaCheia(f"{self.pendentes_maximo} cardápios aguardando geração")
+
+        job = repositorio.escritor(COLECAO_JOBS).inserir({
+            "id": None,  # Gerado pelo escritor da coleção
+            "escola_id": solicitacao["escola_id"],
+            "solicitacao": solicitacao,
+            "status": STATUS_PENDENTE,
+            "data_criacao": datetime.now().isoformat(),
+            "data_inicio": None,
+            "data_conclusao": None,
+            "erro": None,
+            "pratos_prontos": [],
+            "resultado": None,
+        })
+        self._fila.put(job["id"])
+        return job
+
+    # ==================== WORKERS ====================
+
+    def _executar(self):
+        while True:
+            job_id = self._fila.get()
+            if job_id is None:
+                return
+            try:
+                self._processar(job_id)
+            except Exception as e:
+                logger.error(f"❌ Erro inesperado no job de cardápio {job_id}: {e}", exc_info=True)
+
+    def _atualizar(self, job_id: str, alteracoes: dict) -> Optional[dict]:
+        """Atualiza o job enquanto ele é deste processo (None se a posse foi perdida)."""
+        job = self._posse.atualizar(job_id, alteracoes)
+        self._notificar(job_id)
+        return job
+
+    def _processar(self, job_id: str):
+        job = repositorio.colecao(COLECAO_JOBS).obter(job_id)
+        if job is None or job["status"] in STATUS_FINAIS:
+            return
+
+        # Só um worker (de qualquer processo) ganha a reivindicação
+        job = self._posse.reivindicar(job, {"status": job["status"]}, {
+            "status": STATUS_PROCESSANDO,
+            "data_inicio": datetime.now().isoformat(),
+            "pratos_prontos": []
+        })
+        if job is None:
+            return
+        self._notificar(job_id)
+        try:
+            self._gerar(job)
+        finally:
+            self._posse.soltar(job_id)
+
+    def _gerar(self, job: dict):
+        job_id = job["id"]
+        pratos: List[dict] = []
+        ultima_gravacao: Optional[float] = None
+
+        def ao_gerar_prato(prato: dict):
+            nonlocal ultima_gravacao
+            try:
+                pratos.append(PratoCardapio.model_validate(prato).model_dump())
+            except ValueError as e:
+                logger.warning(f"Prato inválido no job {job_id}: {e}")
+                return
+            # Cada gravação leva a lista inteira ao journal: agrupa os pratos
+            # que chegam dentro do intervalo (o primeiro sai na hora)
+            agora = time.monotonic()
+            if ultima_gravacao is not None and agora - ultima_gravacao < settings.cardapio_pratos_intervalo_s:
+                return
+            ultima_gravacao = agora
+            self._atualizar(job_id, {"pratos_prontos": list(pratos)})
+
+        try:
+            cardapio = montar_cardapio(job["solicitacao"], ao_gerar_prato)
+        except Exception as e:
+            logger.error(f"❌ Erro ao gerar cardápio do job {job_id}: {e}")
+            self._atualizar(job_id, {
+                "status": STATUS_ERRO,
+                "erro": str(e),
+                "data_conclusao": datetime.now().isoformat()
+            })
+            return
+
+        # Se o streaming falhou no meio, o resultado é o cardápio padrão:
+        # os pratos parciais da IA não ficam ao lado dele no job
+        self._atualizar(job_id, {
+            "status": STATUS_CONCLUIDO,
+            "pratos_prontos": cardapio["pratos"],
+            "resultado": cardapio,
+            "data_conclusao": datetime.now().isoformat()
+        })
+        logger.info(f"✅ Job de cardápio {job_id} concluído")
+
+    # ==================== ACOMPANHAMENTO ====================
+
+    def _notificar(self, job_id: str):
+        with self._lock:
+            self._versoes[job_id] = self._versoes.get(job_id, 0) + 1
+            ouvintes = self._ouvintes.pop(job_id, [])
+        for loop, evento in ouvintes:
+            try:
+                loop.call_soon_threadsafe(evento.set)
+            except RuntimeError:
+                pass  # Loop já encerrado (cliente desconectou)
+
+    def versao(self, job_id: str) -> int:
+        """Contador de mudanças do job neste processo."""
+        with self._lock:
+            return self._versoes.get(job_id, 0)
+
+    async def aguardar_mudanca(self, job_id: str, versao: int, timeout: float):
+        """
+        Retorna quando a versão do job deixar de ser `versao` neste processo
+        (na hora, se já mudou) ou após `timeout` segundos; mudanças feitas por
+        outro processo só aparecem ao reler a coleção.
+        """
+        evento = asyncio.Event()
+        ouvinte = (asyncio.get_running_loop(), evento)
+        with self._lock:
+            if self._versoes.get(job_id, 0) != versao:
+                return
+            self._ouvintes.setdefault(job_id, []).append(ouvinte)
+        try:
+            await asyncio.wait_for(evento.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                ouvintes = self._ouvintes.get(job_id)
+                if ouvintes and ouvinte in ouvintes:
+                    ouvintes.remove(ouvinte)
+                    if not ouvintes:
+                        del self._ouvintes[job_id]
+
+
+_fila: Optional[FilaCardapios] = None
+_lock = threading.Lock()
+
+
+def obter_fila_cardapios() -> FilaCardapios:
+    """Retorna a fila de cardápios, iniciada (workers e jobs retomados) na primeira chamada."""
+    global _fila
+    if _fila is None:
+        with _lock:
+            if _fila is None:
+                fila = FilaCardapios(
+                    settings.cardapio_workers,
+                    settings.cardapio_pendentes_maximo,
+                    settings.filas_posse_expiracao_s
+                )
+                fila.iniciar()
+                _fila = fila
+    return _fila
+
+
+def parar_fila_cardapios():
+    """Para os workers da fila (shutdown da aplicação)."""
+    global _fila
+    with _lock:
+        fila, _fila = _fila, None
+    if fila is not None:
+        fila.parar()
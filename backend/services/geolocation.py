@@ -1,11 +1,30 @@
 """
 Serviço de geolocalização e matching de produtores.
 Calcula distâncias e scores de compatibilidade.
+
+As funções escalares (`haversine_distance`, `calcular_score_match`,
+`calcular_desconto_proximidade`) têm versões em lote sobre arrays NumPy,
+usadas pela busca de produtores através do `CatalogoProdutores`.
 """
 import math
-from typing import List, Tuple
+import threading
+from typing import Dict, List, Optional, Set, Tuple
 from decimal import Decimal
 
+import numpy as np
+
+from storage import Observador, repositorio
+from services.consumo_colunar import Colunas, Dicionario
+
+# Raio médio da Terra em km
+RAIO_TERRA_KM = 6371.0
+
+# Lado das células do índice espacial (graus; ~55 km de latitude)
+TAMANHO_CELULA_GRAUS = 0.5
+
+# Folga da caixa de busca: cobre o arredondamento da distância (0,005 km)
+MARGEM_CAIXA_KM = 0.01
+
 
 def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """
@@ -21,8 +40,7 @@ def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     A fórmula de Haversine é ideal para calcular distâncias curtas na superfície
     esférica da Terra, sendo muito precisa para distâncias até 500km.
     """
-    # Raio médio da Terra em km
-    R = 6371.0
+    R = RAIO_TERRA_KM
     
     # Converter graus para radianos
     lat1_rad = math.radians(lat1)
@@ -104,6 +122,22 @@ def calcular_desconto_proximidade(distancia_km: float, max_distancia: int = 50)
     return round(desconto, 2)
 
 
+def aplicar_desconto_centavos(preco_centavos: int, desconto_centesimos: int) -> int:
+    """
+    Preço com desconto em aritmética inteira.
+    
+    Args:
+        preco_centavos: Preço base em centavos
+        desconto_centesimos: Desconto em centésimos de ponto percentual
+            (ex: 1550 para 15.5%)
+    
+    Returns:
+        Preço com desconto em centavos (meio centavo arredonda para cima)
+    """
+    quociente, resto = divmod(preco_centavos * (10000 - desconto_centesimos), 10000)
+    return quociente + (resto * 2 >= 10000)
+
+
 def aplicar_desconto_preco(preco_original: Decimal, desconto_percentual: float) -> Decimal:
     """
     Aplica desconto ao preço original.
@@ -113,17 +147,120 @@ def aplicar_desconto_preco(preco_original: Decimal, desconto_percentual: float)
         desconto_percentual: Desconto em percentual (ex: 15.5 para 15.5%)
     
     Returns:
-        Preço com desconto aplicado
+        Preço com desconto aplicado (2 casas decimais)
     """
     if desconto_percentual <= 0:
         return preco_original
     
-    fator_desconto = Decimal(1 - (desconto_percentual / 100))
-    preco_com_desconto = preco_original * fator_desconto
-    
-    # Arredondar para 2 casas decimais
-    return preco_com_desconto.quantize(Decimal('0.01'))
+    centavos = int((preco_original * 100).to_integral_value())
+    return Decimal(aplicar_desconto_centavos(centavos, round(desconto_percentual * 100))).scaleb(-2)
+
+
+# ==================== CÁLCULO EM LOTE ====================
+
+def _arredondar(valores: np.ndarray, casas: int) -> np.ndarray:
+    """
+    Equivalente em lote a `round(valor, casas)`: np.round, com os valores
+    muito próximos de meio (onde os dois podem divergir) refeitos com round.
+    """
+    arredondados = np.round(valores, casas)
+    escalados = valores * 10.0 ** casas
+    for posicao in np.flatnonzero(np.abs(escalados - np.floor(escalados) - 0.5) < 1e-6):
+        arredondados.flat[posicao] = round(float(valores.flat[posicao]), casas)
+    return arredondados
+
+
+def haversine_lote(
+    lat: float,
+    lon: float,
+    lats_rad: np.ndarray,
+    lons_rad: np.ndarray,
+    cos_lats: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Distâncias (km, 2 casas) de um ponto a vários pontos de uma vez.
+    Mesma fórmula de `haversine_distance`; as coordenadas dos destinos já
+    vêm em radianos (e, opcionalmente, com o cosseno da latitude pronto).
+    """
+    lat_rad = math.radians(lat)
+    lon_rad = math.radians(lon)
+    if cos_lats is None:
+        cos_lats = np.cos(lats_rad)
+
+    a = np.sin((lats_rad - lat_rad) / 2) ** 2 + math.cos(lat_rad) * cos_lats * np.sin((lons_rad - lon_rad) / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return _arredondar(RAIO_TERRA_KM * c, 2)
+
 
+def calcular_score_match_lote(distancias_km: np.ndarray, notas_medias: np.ndarray) -> np.ndarray:
+    """Versão em lote de `calcular_score_match`."""
+    distancias_km = np.where(distancias_km <= 0, 0.1, distancias_km)
+    return _arredondar(0.6 / distancias_km + 0.4 * (notas_medias / 5.0), 4)
+
+
+def calcular_desconto_proximidade_lote(distancias_km: np.ndarray, max_distancia: int = 50) -> np.ndarray:
+    """Versão em lote de `calcular_desconto_proximidade`."""
+    desconto = np.minimum((max_distancia - distancias_km) / 2, 20.0)
+    return _arredondar(np.where(distancias_km >= max_distancia, 0.0, desconto), 2)
+
+
+def aplicar_desconto_centavos_lote(precos_centavos: np.ndarray, descontos: np.ndarray) -> np.ndarray:
+    """Versão em lote de `aplicar_desconto_centavos` (descontos em percentual)."""
+    fatores = 10000 - np.rint(descontos * 100).astype(np.int64)
+    quocientes, restos = np.divmod(precos_centavos.astype(np.int64) * fatores, 10000)
+    return quocientes + (restos * 2 >= 10000)
+
+
+def _coordenadas(produtores: List[dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """Latitudes e longitudes (radianos) de uma lista de produtores."""
+    lats = np.array([p["localizacao"]["latitude"] for p in produtores], dtype=np.float64)
+    lons = np.array([p["localizacao"]["longitude"] for p in produtores], dtype=np.float64)
+    return np.radians(lats), np.radians(lons)
+
+
+class ResultadoMatch:
+    """
+    Resultado de uma busca: referência ao registro do produtor mais os
+    campos calculados para a escola. O registro (compartilhado com a
+    coleção e o catálogo) nunca é alterado; preços com desconto são
+    calculados sob demanda, em centavos.
+    """
+
+    __slots__ = ("produtor", "distancia_km", "score_match", "desconto_proximidade")
+
+    def __init__(self, produtor: dict, distancia_km: float, score_match: float, desconto_proximidade: float):
+        self.produtor = produtor
+        self.distancia_km = distancia_km
+        self.score_match = score_match
+        self.desconto_proximidade = desconto_proximidade
+
+    def preco_com_desconto(self, produto: dict) -> float:
+        """Preço unitário do produto com o desconto por proximidade."""
+        centavos = round(float(produto["preco_unitario"]) * 100)
+        if self.desconto_proximidade > 0:
+            centavos = aplicar_desconto_centavos(centavos, round(self.desconto_proximidade * 100))
+        return centavos / 100
+
+    def campos_calculados(self) -> dict:
+        """Campos do match, na ordem do `ProdutorResponse`."""
+        return {
+            "distancia_km": self.distancia_km,
+            "score_match": self.score_match,
+            "desconto_proximidade": self.desconto_proximidade,
+        }
+
+    def como_dict(self) -> dict:
+        """Cópia do produtor com os campos calculados (e preços com desconto)."""
+        produtor = {**self.produtor, **self.campos_calculados()}
+        if self.desconto_proximidade > 0:
+            produtor["produtos"] = [
+                {**produto, "preco_com_desconto": self.preco_com_desconto(produto)}
+                for produto in self.produtor.get("produtos", [])
+            ]
+        return produtor
+
+
+# ==================== MATCHING ====================
 
 def ordenar_produtores_por_match(
     produtores: List[dict],
@@ -132,7 +269,8 @@ def ordenar_produtores_por_match(
 ) -> List[dict]:
     """
     Ordena lista de produtores por score de match.
-    Adiciona campos calculados: distancia_km, score_match, desconto_proximidade.
+    Retorna cópias com os campos calculados: distancia_km, score_match,
+    desconto_proximidade (os dicionários recebidos não são alterados).
     
     Args:
         produtores: Lista de dicionários com dados dos produtores
@@ -142,33 +280,21 @@ def ordenar_produtores_por_match(
     Returns:
         Lista ordenada por score (melhor match primeiro)
     """
-    for produtor in produtores:
-        # Calcular distância
-        prod_lat = produtor["localizacao"]["latitude"]
-        prod_lon = produtor["localizacao"]["longitude"]
-        distancia = haversine_distance(escola_lat, escola_lon, prod_lat, prod_lon)
-        
-        # Calcular score
-        score = calcular_score_match(distancia, produtor["avaliacao_media"])
-        
-        # Calcular desconto
-        desconto = calcular_desconto_proximidade(distancia)
-        
-        # Adicionar campos calculados
-        produtor["distancia_km"] = distancia
-        produtor["score_match"] = score
-        produtor["desconto_proximidade"] = desconto
-        
-        # Aplicar desconto aos produtos
-        if desconto > 0:
-            for produto in produtor.get("produtos", []):
-                preco_original = Decimal(str(produto["preco_unitario"]))
-                produto["preco_com_desconto"] = float(aplicar_desconto_preco(preco_original, desconto))
-    
-    # Ordenar por score (maior primeiro)
-    produtores_ordenados = sorted(produtores, key=lambda x: x["score_match"], reverse=True)
-    
-    return produtores_ordenados
+    if not produtores:
+        return []
+
+    lats_rad, lons_rad = _coordenadas(produtores)
+    distancias = haversine_lote(escola_lat, escola_lon, lats_rad, lons_rad)
+    notas = np.array([p["avaliacao_media"] for p in produtores], dtype=np.float64)
+    scores = calcular_score_match_lote(distancias, notas)
+    descontos = calcular_desconto_proximidade_lote(distancias).tolist()
+    distancias = distancias.tolist()
+
+    # Ordenar por score (maior primeiro; empates mantêm a ordem da lista)
+    return [
+        ResultadoMatch(produtores[i], distancias[i], float(scores[i]), descontos[i]).como_dict()
+        for i in np.argsort(-scores, kind="stable").tolist()
+    ]
 
 
 def filtrar_por_raio(
@@ -179,6 +305,7 @@ def filtrar_por_raio(
 ) -> List[dict]:
     """
     Filtra produtores dentro de um raio específico.
+    Retorna cópias com o campo `distancia_km` preenchido.
     
     Args:
         produtores: Lista de produtores
@@ -189,15 +316,353 @@ def filtrar_por_raio(
     Returns:
         Lista filtrada de produtores dentro do raio
     """
-    produtores_filtrados = []
-    
-    for produtor in produtores:
-        prod_lat = produtor["localizacao"]["latitude"]
-        prod_lon = produtor["localizacao"]["longitude"]
-        distancia = haversine_distance(escola_lat, escola_lon, prod_lat, prod_lon)
-        
-        if distancia <= raio_km:
-            produtor["distancia_km"] = distancia
-            produtores_filtrados.append(produtor)
-    
-    return produtores_filtrados
+    if not produtores:
+        return []
+
+    lats_rad, lons_rad = _coordenadas(produtores)
+    distancias = haversine_lote(escola_lat, escola_lon, lats_rad, lons_rad)
+
+    return [
+        {**produtores[posicao], "distancia_km": float(distancias[posicao])}
+        for posicao in np.flatnonzero(distancias <= raio_km).tolist()
+    ]
+
+
+# ==================== ÍNDICE ESPACIAL ====================
+
+Caixa = Tuple[float, float, float, float]
+
+
+def caixa_envolvente(lat: float, lon: float, raio_km: float) -> Optional[Caixa]:
+    """
+    Caixa (lat_min, lat_max, lon_min, lon_max), em graus, que contém todo
+    ponto a até `raio_km` (mais a margem de arredondamento) do centro.
+    Retorna None quando o círculo alcança um polo ou cruza o antimeridiano.
+    """
+    angulo = (raio_km + MARGEM_CAIXA_KM) / RAIO_TERRA_KM
+    delta_lat = math.degrees(angulo)
+    if abs(lat) + delta_lat >= 90:
+        return None
+    delta_lon = math.degrees(math.asin(min(1.0, math.sin(angulo) / math.cos(math.radians(lat)))))
+    if lon - delta_lon < -180 or lon + delta_lon > 180:
+        return None
+    return (lat - delta_lat, lat + delta_lat, lon - delta_lon, lon + delta_lon)
+
+
+class GradeEspacial:
+    """
+    Índice espacial em grade regular de latitude/longitude.
+    Cada célula guarda as posições dos produtores nela; inserir, remover e
+    mover um produtor custa O(1).
+    """
+
+    def __init__(self, tamanho: float = TAMANHO_CELULA_GRAUS):
+        self.tamanho = tamanho
+        self._celulas: Dict[Tuple[int, int], Set[int]] = {}
+        self._celula_de: Dict[int, Tuple[int, int]] = {}
+
+    def _celula(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.tamanho), math.floor(lon / self.tamanho))
+
+    def inserir(self, posicao: int, lat: float, lon: float):
+        self.remover(posicao)
+        celula = self._celula(lat, lon)
+        self._celulas.setdefault(celula, set()).add(posicao)
+        self._celula_de[posicao] = celula
+
+    def remover(self, posicao: int):
+        celula = self._celula_de.pop(posicao, None)
+        if celula is None:
+            return
+        posicoes = self._celulas[celula]
+        posicoes.discard(posicao)
+        if not posicoes:
+            del self._celulas[celula]
+
+    def posicoes(self) -> np.ndarray:
+        """Todas as posições indexadas, em ordem crescente."""
+        return np.sort(np.fromiter(self._celula_de, dtype=np.int64, count=len(self._celula_de)))
+
+    def candidatos(self, caixa: Caixa) -> np.ndarray:
+        """Posições (em ordem crescente) nas células que tocam a caixa."""
+        lat_min, lat_max, lon_min, lon_max = caixa
+        linha_min, coluna_min = self._celula(lat_min, lon_min)
+        linha_max, coluna_max = self._celula(lat_max, lon_max)
+
+        total_celulas = (linha_max - linha_min + 1) * (coluna_max - coluna_min + 1)
+        if total_celulas <= len(self._celulas):
+            celulas = (
+                self._celulas.get((linha, coluna))
+                for linha in range(linha_min, linha_max + 1)
+                for coluna in range(coluna_min, coluna_max + 1)
+            )
+        else:
+            # Caixa grande: mais barato percorrer só as células ocupadas
+            celulas = (
+                posicoes for (linha, coluna), posicoes in self._celulas.items()
+                if linha_min <= linha <= linha_max and coluna_min <= coluna <= coluna_max
+            )
+
+        posicoes: List[int] = []
+        for celula in celulas:
+            if celula:
+                posicoes.extend(celula)
+        return np.sort(np.array(posicoes, dtype=np.int64))
+
+
+# ==================== CATÁLOGO VETORIZADO ====================
+
+class CatalogoProdutores(Observador):
+    """
+    Colunas NumPy com os dados de matching de todos os produtores
+    (coordenadas em radianos, cosseno da latitude, nota, DAP e categorias),
+    mantidas a cada escrita na coleção `produtores`.
+
+    Uma busca visita apenas os produtores das células da `GradeEspacial`
+    que tocam a caixa envolvente do raio, descarta os de fora da caixa e
+    calcula distâncias, scores e descontos dos restantes em uma única
+    passada vetorizada; filtro e ranking usam as mesmas distâncias. Cada
+    produtor ocupa uma posição fixa (a da primeira aparição), o que
+    preserva a ordem da coleção nos empates.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.limpar()
+
+    def limpar(self):
+        with self._lock:
+            self.categorias = Dicionario()
+            self.colunas = Colunas({
+                "lat": np.float64,
+                "lon": np.float64,
+                "lat_rad": np.float64,
+                "lon_rad": np.float64,
+                "cos_lat": np.float64,
+                "nota": np.float64,
+                "dap": np.bool_,
+                "categorias": np.int64,
+                "ativo": np.bool_,
+            })
+            self.grade = GradeEspacial()
+            self._registros: List[Optional[dict]] = []
+            self._posicoes: Dict[str, int] = {}
+
+    def _mascara_categorias(self, produtor: dict) -> int:
+        mascara = 0
+        for produto in produtor.get("produtos", []):
+            mascara |= 1 << self.categorias.codificar(produto.get("categoria"))
+        return mascara
+
+    def adicionar(self, registro: dict):
+        lat = registro["localizacao"]["latitude"]
+        lon = registro["localizacao"]["longitude"]
+        lat_rad = math.radians(lat)
+        valores = {
+            "lat": lat,
+            "lon": lon,
+            "lat_rad": lat_rad,
+            "lon_rad": math.radians(lon),
+            "cos_lat": math.cos(lat_rad),
+            "nota": registro.get("avaliacao_media", 0.0),
+            "dap": bool(registro.get("possui_dap", False)),
+            "categorias": self._mascara_categorias(registro),
+            "ativo": True,
+        }
+        with self._lock:
+            posicao = self._posicoes.get(registro.get("id"))
+            if posicao is None:
+                posicao = self.colunas.anexar({nome: [valor] for nome, valor in valores.items()})
+                self._posicoes[registro.get("id")] = posicao
+                self._registros.append(registro)
+            else:
+                for nome, valor in valores.items():
+                    self.colunas.arrays[nome][posicao] = valor
+                self._registros[posicao] = registro
+            self.grade.inserir(posicao, lat, lon)
+
+    def remover(self, registro: dict):
+        with self._lock:
+            posicao = self._posicoes.get(registro.get("id"))
+            if posicao is not None:
+                self.colunas.arrays["ativo"][posicao] = False
+                self._registros[posicao] = None
+                self.grade.remover(posicao)
+
+    def posicao(self, produtor_id: str) -> Optional[int]:
+        """Posição fixa do produtor nas colunas do catálogo."""
+        return self._posicoes.get(produtor_id)
+
+    def registro(self, posicao: int) -> Optional[dict]:
+        """Registro ativo na posição (None se removido)."""
+        return self._registros[posicao]
+
+    # ==================== BUSCA ====================
+
+    def _candidatos(self, lat: float, lon: float, raio_km: float) -> np.ndarray:
+        """
+        Posições que podem estar no raio: as das células da grade que tocam
+        a caixa envolvente, já filtradas pela caixa (prefiltro barato antes
+        do haversine). Sem caixa possível, todos os produtores ativos.
+        """
+        caixa = caixa_envolvente(lat, lon, raio_km)
+        if caixa is None:
+            return np.flatnonzero(self.colunas["ativo"])
+
+        candidatos = self.grade.candidatos(caixa)
+        lat_min, lat_max, lon_min, lon_max = np.radians(caixa)
+        lats = self.colunas["lat_rad"][candidatos]
+        lons = self.colunas["lon_rad"][candidatos]
+        return candidatos[(lats >= lat_min) & (lats <= lat_max) & (lons >= lon_min) & (lons <= lon_max)]
+
+    def _filtrar(
+        self,
+        escola_lat: float,
+        escola_lon: float,
+        raio_km: float,
+        apenas_com_dap: bool,
+        categoria: Optional[str],
+        avaliacao_minima: float,
+        distancias: Optional[np.ndarray]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Posições e distâncias dos produtores que atendem à busca (chamar com o lock)."""
+        colunas = self.colunas
+        if distancias is not None and len(distancias) == colunas.tamanho:
+            candidatos = np.flatnonzero(colunas["ativo"])
+            distancias = distancias[candidatos]
+        else:
+            candidatos = self._candidatos(escola_lat, escola_lon, raio_km)
+            distancias = haversine_lote(
+                escola_lat, escola_lon,
+                colunas["lat_rad"][candidatos], colunas["lon_rad"][candidatos], colunas["cos_lat"][candidatos]
+            )
+        mascara = distancias <= raio_km
+        if apenas_com_dap:
+            mascara &= colunas["dap"][candidatos]
+        if categoria:
+            codigo = self.categorias.codigos.get(categoria)
+            if codigo is None:
+                return candidatos[:0], distancias[:0]
+            mascara &= (colunas["categorias"][candidatos] & (1 << codigo)) != 0
+        if avaliacao_minima:
+            mascara &= colunas["nota"][candidatos] >= avaliacao_minima
+        return candidatos[mascara], distancias[mascara]
+
+    def buscar(
+        self,
+        escola_lat: float,
+        escola_lon: float,
+        raio_km: float,
+        apenas_com_dap: bool = False,
+        categoria: Optional[str] = None,
+        avaliacao_minima: float = 0.0,
+        distancias: Optional[np.ndarray] = None
+    ) -> List[ResultadoMatch]:
+        """
+        Produtores dentro do raio que atendem aos filtros, ordenados por
+        score de match. Mesmo ranking de `filtrar_por_raio` seguido de
+        `ordenar_produtores_por_match`, mas sem copiar nem alterar os
+        registros: cada resultado é um `ResultadoMatch` que os referencia.
+
+        `distancias` já calculadas para todas as posições do catálogo (a
+        linha da escola na `MatrizProximidade`) dispensam grade e haversine.
+        """
+        resultados, _, _ = self.buscar_pagina(
+            escola_lat, escola_lon, raio_km, apenas_com_dap, categoria, avaliacao_minima, distancias
+        )
+        return resultados
+
+    def buscar_pagina(
+        self,
+        escola_lat: float,
+        escola_lon: float,
+        raio_km: float,
+        apenas_com_dap: bool = False,
+        categoria: Optional[str] = None,
+        avaliacao_minima: float = 0.0,
+        distancias: Optional[np.ndarray] = None,
+        limite: Optional[int] = None,
+        offset: int = 0,
+        apos: Optional[Tuple[float, int]] = None
+    ) -> Tuple[List[ResultadoMatch], Optional[Tuple[float, int]], int]:
+        """
+        Uma página do ranking de `buscar`: os `limite` melhores depois de
+        pular `offset` resultados (contados a partir do cursor `apos`).
+
+        Só os `offset + limite` primeiros são selecionados (seleção parcial)
+        e ordenados; apenas para eles é criado um `ResultadoMatch`.
+        O cursor é a chave (score, posição) do último resultado da página:
+        a próxima página continua dela mesmo que produtores tenham sido
+        inseridos ou removidos no meio-tempo.
+
+        Retorna (resultados, cursor da próxima página ou None, total de
+        produtores que atendem à busca).
+        """
+        with self._lock:
+            posicoes, distancias = self._filtrar(
+                escola_lat, escola_lon, raio_km, apenas_com_dap, categoria, avaliacao_minima, distancias
+            )
+            scores = calcular_score_match_lote(distancias, self.colunas["nota"][posicoes])
+            total = len(posicoes)
+
+            if apos is not None:
+                score_apos, posicao_apos = apos
+                depois = (scores < score_apos) | ((scores == score_apos) & (posicoes > posicao_apos))
+                posicoes, distancias, scores = posicoes[depois], distancias[depois], scores[depois]
+
+            quantidade = None if limite is None else offset + limite
+            ordem = melhores_indices(scores, posicoes, quantidade)[offset:]
+            proxima = None
+            if quantidade is not None and len(scores) > quantidade and len(ordem):
+                ultimo = ordem[-1]
+                proxima = (float(scores[ultimo]), int(posicoes[ultimo]))
+
+            registros = [self._registros[posicao] for posicao in posicoes[ordem].tolist()]
+            distancias = distancias[ordem]
+            scores = scores[ordem]
+
+        resultados = list(map(
+            ResultadoMatch,
+            registros,
+            distancias.tolist(),
+            scores.tolist(),
+            calcular_desconto_proximidade_lote(distancias).tolist()
+        ))
+        return resultados, proxima, total
+
+
+def melhores_indices(scores: np.ndarray, posicoes: np.ndarray, k: Optional[int] = None) -> np.ndarray:
+    """
+    Índices em ordem de score decrescente (empates pela menor posição,
+    p. ex. a do catálogo). Com `k`, apenas os k primeiros: `np.partition`
+    encontra o k-ésimo score em O(n) e só os que o alcançam são ordenados.
+    """
+    if k is not None and k < len(scores):
+        limiar = np.partition(-scores, k - 1)[k - 1]
+        selecionados = np.flatnonzero(-scores <= limiar)
+    else:
+        selecionados = np.arange(len(scores))
+    ordem = selecionados[np.lexsort((posicoes[selecionados], -scores[selecionados]))]
+    return ordem if k is None else ordem[:k]
+
+
+_catalogo: Optional[CatalogoProdutores] = None
+_lock = threading.Lock()
+
+
+def obter_catalogo_produtores() -> CatalogoProdutores:
+    """
+    Retorna o catálogo vetorizado de produtores, criado na primeira chamada
+    e mantido pelas notificações da coleção.
+    """
+    global _catalogo
+    if _catalogo is not None:
+        # Escritas de outros processos chegam pela recarga da coleção
+        repositorio.colecao("produtores").sincronizar()
+    else:
+        with _lock:
+            if _catalogo is None:
+                catalogo = CatalogoProdutores()
+                repositorio.colecao("produtores").observar(catalogo)
+                _catalogo = catalogo
+    return _catalogo
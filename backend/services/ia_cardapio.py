@@ -2,19 +2,42 @@
 Serviço de Inteligência Artificial para sugestões de cardápio.
 Integração com OpenAI GPT para recomendações nutricionais inteligentes.
 """
+import hashlib
 import json
 import logging
+from datetime import datetime
 from typing import List, Dict, Optional
-from openai import OpenAI
-from config import settings
+from services.cache_ia import fim_do_mes, obter_cache_ia
+from services.llm import obter_gateway_llm
+from services.ofertas import normalizar_termo
 
 logger = logging.getLogger(__name__)
 
-# Inicializar cliente OpenAI
-client = OpenAI(api_key=settings.openai_api_key)
 
+def chave_sugestao(
+    produto_atual: str,
+    motivo_troca: str,
+    restricoes: List[str],
+    safra_regional: Dict,
+    contexto_produtos: str
+) -> str:
+    """
+    Chave de cache de uma sugestão: produto, motivo e restrições
+    normalizados, mês(es) da safra e a impressão digital dos produtos e da
+    nutrição que entram no prompt.
+    """
+    impressao = hashlib.sha256(contexto_produtos.encode("utf-8")).hexdigest()
+    partes = [
+        normalizar_termo(produto_atual),
+        normalizar_termo(motivo_troca),
+        sorted({normalizar_termo(r) for r in restricoes}),
+        sorted(safra_regional),
+        impressao,
+    ]
+    return hashlib.sha256(json.dumps(partes, ensure_ascii=False).encode("utf-8")).hexdigest()
 
-def gerar_sugestao_substituicao(
+
+async def gerar_sugestao_substituicao(
     produto_atual: str,
     motivo_troca: str,
     produtos_disponiveis: List[Dict],
@@ -24,6 +47,10 @@ def gerar_sugestao_substituicao(
     """
     Usa IA para sugerir substituição inteligente de alimentos no cardápio.
     
+    Respostas da IA ficam no cache (memória + SQLite) até o fim do mês;
+    a mesma pergunta sobre a mesma safra e os mesmos produtos não volta
+    à API. Sugestões de fallback não são guardadas.
+    
     Args:
         produto_atual: Produto que precisa ser substituído
         motivo_troca: Razão da substituição (ex: baixa aceitação, alto custo)
@@ -41,6 +68,16 @@ def gerar_sugestao_substituicao(
         # Construir lista de produtos disponíveis formatada
         produtos_formatados = _formatar_produtos_disponiveis(produtos_disponiveis, safra_regional)
         
+        # Mesma pergunta, safra e produtos: responder do cache
+        cache = obter_cache_ia()
+        chave = chave_sugestao(
+            produto_atual, motivo_troca, restricoes or [], safra_regional,
+            produtos_formatados + "\n" + info_nutricional
+        )
+        em_cache = cache.obter(chave)
+        if em_cache is not None:
+            return em_cache
+        
         # Construir prompt estruturado
         prompt = _construir_prompt_substituicao(
             produto_atual=produto_atual,
@@ -52,10 +89,10 @@ def gerar_sugestao_substituicao(
         
         logger.info(f"Gerando sugestão IA para substituir: {produto_atual}")
         
-        # Chamar API OpenAI
-        response = client.chat.completions.create(
-            model="gpt-4-turbo-preview",
-            messages=[
+        # Chamar API OpenAI (gateway assíncrono, sem bloquear o event loop)
+        resultado = await obter_gateway_llm().completar_json(
+            modelo="gpt-4-turbo-preview",
+            mensagens=[
                 {
                     "role": "system",
                     "content": (
@@ -71,16 +108,14 @@ def gerar_sugestao_substituicao(
                     "content": prompt
                 }
             ],
-            temperature=0.7,
-            max_tokens=800,
-            response_format={"type": "json_object"}
+            temperatura=0.7,
+            max_tokens=800
         )
         
-        # Parsear resposta
-        resultado = json.loads(response.choices[0].message.content)
-        
         logger.info(f"Sugestão gerada: {resultado.get('produto_sugerido')}")
         
+        cache.gravar(chave, resultado, fim_do_mes(datetime.now()))
+        
         return resultado
         
     except Exception as e:
@@ -4,13 +4,14 @@ Sistema avançado que analisa preferências, desperdício e gera cardápios otim
 """
 import json
 import logging
-from typing import List, Dict, Optional
+from concurrent.futures import wait
+from typing import Any, Awaitable, Callable, List, Dict, Optional, Tuple
 from datetime import datetime, timedelta
-from openai import OpenAI
 from config import settings
+from services.json_incremental import ExtratorArrayJSON
+from services.llm import obter_gateway_llm
 
 logger = logging.getLogger(__name__)
-client = OpenAI(api_key=settings.openai_api_key)
 
 
 def analisar_historico_consumo(registros_consumo: List[Dict]) -> Dict:
@@ -106,12 +107,14 @@ def gerar_cardapio_inteligente(
     escola_id: str,
     periodo_dias: int,
     tipo_refeicao: str,
-    historico_consumo: List[Dict],
+    historico_consumo: Optional[List[Dict]],
     safra_disponivel: List[Dict],
     prioridade_nutricao: int = 7,
     prioridade_aceitacao: int = 3,
     restricoes: Optional[List[str]] = None,
-    orcamento_diario: Optional[float] = None
+    orcamento_diario: Optional[float] = None,
+    analise: Optional[Dict] = None,
+    ao_gerar_prato: Optional[Callable[[Dict], None]] = None
 ) -> Dict:
     """
     Gera cardápio otimizado usando IA baseado em:
@@ -121,10 +124,18 @@ def gerar_cardapio_inteligente(
     - Orçamento disponível
     
     Balanceia entre o que as crianças GOSTAM e o que elas PRECISAM.
+    
+    `analise` (formato de `analisar_historico_consumo`) dispensa o
+    histórico quando já vem pronta do espelho colunar.
+    
+    Com `ao_gerar_prato`, a resposta da IA é lida em streaming e cada
+    prato é entregue ao callback assim que termina de chegar, antes do
+    cardápio completo (os pratos do fallback não passam por ele).
     """
     try:
         # Analisar histórico
-        analise = analisar_historico_consumo(historico_consumo)
+        if analise is None:
+            analise = analisar_historico_consumo(historico_consumo or [])
         
         # Identificar alimentos bem aceitos e rejeitados
         aceitos = sorted(
@@ -228,17 +239,23 @@ RESPONDA EM JSON:
 }}"""
 
         # Chamar GPT-4
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "Você é um nutricionista especialista em alimentação escolar do PNAE."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            response_format={"type": "json_object"}
-        )
-        
-        resultado = json.loads(response.choices[0].message.content)
+        mensagens = [
+            {"role": "system", "content": "Você é um nutricionista especialista em alimentação escolar do PNAE."},
+            {"role": "user", "content": prompt}
+        ]
+        if ao_gerar_prato is None:
+            resultado = obter_gateway_llm().completar_json_sync(modelo="gpt-4o", mensagens=mensagens, temperatura=0.7)
+        else:
+            # Streaming: os pratos vêm primeiro no JSON e saem um a um
+            extrator = ExtratorArrayJSON("pratos")
+            texto = []
+            for fragmento in obter_gateway_llm().transmitir_json_sync(
+                modelo="gpt-4o", mensagens=mensagens, temperatura=0.7
+            ):
+                texto.append(fragmento)
+                for prato in extrator.alimentar(fragmento):
+                    ao_gerar_prato(prato)
+            resultado = json.loads("".join(texto))
         resultado["escola_id"] = escola_id
         resultado["tipo_refeicao"] = tipo_refeicao
         
@@ -252,15 +269,20 @@ RESPONDA EM JSON:
 
 def gerar_dashboard_inteligente(
     escola_id: str,
-    historico_consumo: List[Dict],
-    periodo_dias: int = 30
+    historico_consumo: Optional[List[Dict]],
+    periodo_dias: int = 30,
+    analise: Optional[Dict] = None
 ) -> Dict:
     """
     Gera dashboard com insights inteligentes sobre consumo e preferências.
+    
+    `analise` (formato de `analisar_historico_consumo`) dispensa o
+    histórico quando já vem pronta do espelho colunar.
     """
     try:
         # Analisar dados
-        analise = analisar_historico_consumo(historico_consumo)
+        if analise is None:
+            analise = analisar_historico_consumo(historico_consumo or [])
         
         if analise["total_registros"] == 0:
             return {
@@ -323,8 +345,7 @@ def gerar_dashboard_inteligente(
                 })
         
         # Métricas gerais
-        total_servido = sum(d["desperdicio"].get(a, {}).get("quantidade_total", 0) 
-                           for a in analise["desperdicio"].keys())
+        total_servido = sum(d.get("quantidade_total", 0) for d in analise["desperdicio"].values())
         
         scores_aceitacao = [d["score_aceitacao"] for d in analise["preferencias"].values()]
         indice_aceitacao = (sum(scores_aceitacao) / len(scores_aceitacao) * 10) if scores_aceitacao else 0
@@ -332,9 +353,11 @@ def gerar_dashboard_inteligente(
         desperdicios = [d["percentual"] for d in analise["desperdicio"].values()]
         indice_desperdicio = (sum(desperdicios) / len(desperdicios)) if desperdicios else 0
         
-        # Usar IA para recomendações
-        recomendacoes = _gerar_recomendacoes_ia(analise, top_rejeitados[:5])
-        receitas = _gerar_receitas_criativas_ia(top_rejeitados[:3])
+        # Usar IA para recomendações e receitas (em paralelo, prazo único)
+        insights, degradadas = gerar_insights_paralelo(
+            {"analise": analise, "top_rejeitados": top_rejeitados},
+            settings.dashboard_ia_prazo_s
+        )
         
         economia = len(alertas) * 150  # Estimativa simples
         
@@ -347,9 +370,9 @@ def gerar_dashboard_inteligente(
             "top_alimentos_aceitos": top_aceitos,
             "top_alimentos_rejeitados": top_rejeitados,
             "alertas_desperdicio": alertas,
-            "acoes_recomendadas": recomendacoes,
-            "receitas_sugeridas": receitas,
-            "economia_potencial": economia
+            **insights,
+            "economia_potencial": economia,
+            "secoes_degradadas": degradadas
         }
         
     except Exception as e:
@@ -357,10 +380,9 @@ def gerar_dashboard_inteligente(
         raise
 
 
-def _gerar_recomendacoes_ia(analise: Dict, top_rejeitados: List) -> List[str]:
+async def _gerar_recomendacoes_ia(analise: Dict, top_rejeitados: List) -> List[str]:
     """Gera recomendações usando GPT."""
-    try:
-        prompt = f"""Baseado nesta análise de consumo escolar:
+    prompt = f"""Baseado nesta análise de consumo escolar:
 
 Alimentos mais rejeitados:
 {json.dumps([{
@@ -375,32 +397,29 @@ Gere 5 ações PRÁTICAS E ESPECÍFICAS que a escola pode tomar para:
 
 Responda em JSON: {{"recomendacoes": ["ação 1", "ação 2", ...]}}"""
 
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            response_format={"type": "json_object"}
-        )
-        
-        resultado = json.loads(response.choices[0].message.content)
-        return resultado.get("recomendacoes", [])
-        
-    except Exception as e:
-        logger.warning(f"Erro ao gerar recomendações IA: {e}")
-        return [
-            "Introduzir alimentos rejeitados em receitas mistas",
-            "Realizar oficinas culinárias com as crianças",
-            "Variar métodos de preparo dos alimentos menos aceitos"
-        ]
+    resultado = await obter_gateway_llm().completar_json(
+        modelo="gpt-4o",
+        mensagens=[{"role": "user", "content": prompt}],
+        temperatura=0.7
+    )
+    return resultado.get("recomendacoes", [])
+
 
+def _recomendacoes_padrao() -> List[str]:
+    """Recomendações estáticas quando a IA não responde."""
+    return [
+        "Introduzir alimentos rejeitados em receitas mistas",
+        "Realizar oficinas culinárias com as crianças",
+        "Variar métodos de preparo dos alimentos menos aceitos"
+    ]
 
-def _gerar_receitas_criativas_ia(alimentos_rejeitados: List) -> List[Dict]:
+
+async def _gerar_receitas_criativas_ia(alimentos_rejeitados: List) -> List[Dict]:
     """Gera receitas criativas para alimentos rejeitados usando IA."""
-    try:
-        if not alimentos_rejeitados:
-            return []
-        
-        prompt = f"""Crie receitas CRIATIVAS para disfarçar estes alimentos rejeitados por crianças:
+    if not alimentos_rejeitados:
+        return []
+    
+    prompt = f"""Crie receitas CRIATIVAS para disfarçar estes alimentos rejeitados por crianças:
 
 {json.dumps([item["alimento"] for item in alimentos_rejeitados], ensure_ascii=False)}
 
@@ -421,22 +440,71 @@ Responda em JSON:
   ]
 }}"""
 
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.8,
-            response_format={"type": "json_object"}
-        )
-        
-        resultado = json.loads(response.choices[0].message.content)
-        return resultado.get("receitas", [])
-        
-    except Exception as e:
-        logger.warning(f"Erro ao gerar receitas IA: {e}")
-        return [
-            {"nome": "Bolinho de espinafre com queijo", "alimento_disfarçado": "espinafre", "descricao": "Crianças adoram queijo e não sentem o espinafre"},
-            {"nome": "Farofa crocante com jiló", "alimento_disfarçado": "jiló", "descricao": "Jiló picado muito fino na farofa temperada"}
-        ]
+    resultado = await obter_gateway_llm().completar_json(
+        modelo="gpt-4o",
+        mensagens=[{"role": "user", "content": prompt}],
+        temperatura=0.8
+    )
+    return resultado.get("receitas", [])
+
+
+def _receitas_padrao() -> List[Dict]:
+    """Receitas estáticas quando a IA não responde."""
+    return [
+        {"nome": "Bolinho de espinafre com queijo", "alimento_disfarçado": "espinafre", "descricao": "Crianças adoram queijo e não sentem o espinafre"},
+        {"nome": "Farofa crocante com jiló", "alimento_disfarçado": "jiló", "descricao": "Jiló picado muito fino na farofa temperada"}
+    ]
+
+
+# ==================== INSIGHTS EM PARALELO ====================
+
+# Seção do dashboard -> (gerador assíncrono sobre o contexto, fallback estático).
+# O contexto traz "analise" (formato de `analisar_historico_consumo`) e
+# "top_rejeitados" (itens de `top_alimentos_rejeitados`).
+GERADORES_INSIGHTS: Dict[str, Tuple[Callable[[Dict], Awaitable[Any]], Callable[[], Any]]] = {
+    "acoes_recomendadas": (
+        lambda contexto: _gerar_recomendacoes_ia(contexto["analise"], contexto["top_rejeitados"][:5]),
+        _recomendacoes_padrao
+    ),
+    "receitas_sugeridas": (
+        lambda contexto: _gerar_receitas_criativas_ia(contexto["top_rejeitados"][:3]),
+        _receitas_padrao
+    ),
+}
+
+
+def gerar_insights_paralelo(contexto: Dict, prazo_s: float) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Roda todos os `GERADORES_INSIGHTS` ao mesmo tempo no gateway de LLM,
+    com um prazo único de `prazo_s` segundos para o conjunto.
+
+    Retorna o valor de cada seção e as seções degradadas: as que falharam
+    ou não terminaram no prazo (são canceladas) recebem o fallback estático.
+    """
+    gateway = obter_gateway_llm()
+    futuros = {
+        secao: gateway.agendar(gerador(contexto))
+        for secao, (gerador, _) in GERADORES_INSIGHTS.items()
+    }
+    wait(futuros.values(), timeout=prazo_s)
+    
+    secoes: Dict[str, Any] = {}
+    degradadas: List[str] = []
+    for secao, futuro in futuros.items():
+        if futuro.done() and not futuro.cancelled() and futuro.exception() is None:
+            secoes[secao] = futuro.result()
+            continue
+        if futuro.cancelled():
+            # Cancelada fora daqui (ex: gateway encerrado): exception() levantaria CancelledError
+            logger.warning(f"Geração de '{secao}' com IA foi cancelada; usando sugestões padrão")
+        elif futuro.done():
+            logger.warning(f"Erro ao gerar '{secao}' com IA: {futuro.exception()}")
+        else:
+            futuro.cancel()
+            logger.warning(f"'{secao}' não ficou pronta em {prazo_s}s; usando sugestões padrão")
+        secoes[secao] = GERADORES_INSIGHTS[secao][1]()
+        degradadas.append(secao)
+    return secoes, degradadas
 
 
 def _sugerir_substituicao_simples(alimento: str) -> str:
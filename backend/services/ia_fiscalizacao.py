@@ -1,16 +1,18 @@
 """
 Serviço de IA para Fiscalização e Detecção de Fraudes.
 Analisa notas fiscais automaticamente para identificar irregularidades.
+
+As regras (preço, fornecedor, PNAE, volume) são locais e definem score e
+risco; o parecer contextual do GPT só complementa a justificativa e, no
+upload, é gerado depois pela fila de pareceres (`services.pareceres_fiscais`).
 """
 import json
 import logging
 from typing import List, Dict, Optional
 from datetime import datetime
-from openai import OpenAI
-from config import settings
+from services.llm import obter_gateway_llm
 
 logger = logging.getLogger(__name__)
-client = OpenAI(api_key=settings.openai_api_key)
 
 
 # Base de conhecimento de preços médios (normalmente viria de um banco de dados)
@@ -26,14 +28,20 @@ PRECOS_REFERENCIA = {
     "oleo": {"min": 5.0, "medio": 7.0, "max": 9.0, "unidade": "litro"},
 }
 
+# Status do parecer da IA de uma análise (`status_parecer`)
+PARECER_PENDENTE = "pendente"          # Aguardando a fila de pareceres
+PARECER_CONCLUIDO = "concluido"        # Justificativa do GPT anexada
+PARECER_INDISPONIVEL = "indisponivel"  # IA falhou; fica a justificativa das regras
+PARECER_DISPENSADO = "dispensado"      # Nota sem alertas: nada a explicar
+
 
-def analisar_nota_fiscal_ia(
+def analisar_nota_fiscal_regras(
     nota_fiscal: Dict,
     historico_escola: List[Dict] = None,
     fornecedores_irregulares: List[str] = None
 ) -> Dict:
     """
-    Analisa nota fiscal usando IA para detectar possíveis irregularidades.
+    Analisa nota fiscal com as regras determinísticas (sem chamar a IA).
     
     Sistema de scoring:
     - 100-90: Totalmente conforme
@@ -48,7 +56,8 @@ def analisar_nota_fiscal_ia(
         fornecedores_irregulares: Lista de CNPJs com problemas
     
     Returns:
-        Análise completa com score, alertas e recomendações
+        Análise com score, alertas e justificativa das regras; notas com
+        alertas saem com `status_parecer` pendente, à espera do parecer da IA
     """
     try:
         alertas = []
@@ -88,9 +97,6 @@ def analisar_nota_fiscal_ia(
                 score -= analise_volume["penalizacao"]
             detalhes_analise["volume"] = analise_volume
         
-        # 5. IA Avançada (GPT-4) para análise contextual
-        analise_ia = _analise_contextual_gpt(nota_fiscal, alertas, score)
-        
         # Classificar risco
         score = max(0, min(100, score))  # Garantir 0-100
         
@@ -114,7 +120,8 @@ def analisar_nota_fiscal_ia(
             "analise_preco": detalhes_analise.get("precos", {}),
             "analise_fornecedor": detalhes_analise.get("fornecedor", {}),
             "analise_compatibilidade": detalhes_analise.get("compatibilidade", {}),
-            "justificativa_ia": analise_ia.get("justificativa", "Análise automática concluída"),
+            "justificativa_ia": _justificativa_regras(alertas, score),
+            "status_parecer": PARECER_PENDENTE if alertas else PARECER_DISPENSADO,
             "requer_investigacao": requer_investigacao,
             "data_analise": datetime.now().isoformat()
         }
@@ -137,7 +144,9 @@ def analisar_nota_fiscal_ia(
             "analise_fornecedor": {},
             "analise_compatibilidade": {},
             "justificativa_ia": "Erro na análise automática - requer revisão manual",
-            "requer_investigacao": True
+            "status_parecer": PARECER_DISPENSADO,
+            "requer_investigacao": True,
+            "data_analise": datetime.now().isoformat()
         }
 
 
@@ -344,11 +353,31 @@ def _analisar_volume_suspeito(nota_fiscal: Dict, historico: List[Dict]) -> Dict:
     }
 
 
-def _analise_contextual_gpt(nota_fiscal: Dict, alertas: List[Dict], score: float) -> Dict:
-    """Usa GPT-4 para análise contextual mais sofisticada."""
-    try:
-        # Construir contexto para o GPT
-        contexto = f"""Você é um auditor especialista em fiscalização de recursos públicos do PNAE.
+def _justificativa_regras(alertas: List[Dict], score: float) -> str:
+    """Justificativa da análise enquanto (ou se) não houver parecer da IA."""
+    if not alertas:
+        return "Análise automática concluída sem alertas."
+    return f"Análise automática detectou {len(alertas)} alertas. Score de conformidade: {round(score, 2)}/100."
+
+
+def anexar_parecer(analise: Dict, parecer: Dict) -> Dict:
+    """Alterações que anexam o parecer do GPT a uma análise já gravada."""
+    return {
+        "justificativa_ia": parecer.get("justificativa") or analise.get("justificativa_ia"),
+        "pontos_atencao": parecer.get("pontos_atencao", []),
+        "recomendacao_final": parecer.get("recomendacao_final"),
+        "status_parecer": PARECER_CONCLUIDO,
+        "data_parecer": datetime.now().isoformat()
+    }
+
+
+def gerar_parecer_contextual(nota_fiscal: Dict, alertas: List[Dict], score: float) -> Dict:
+    """
+    Usa GPT-4 para análise contextual mais sofisticada.
+    Propaga as falhas da IA (quem chama decide o fallback).
+    """
+    # Construir contexto para o GPT
+    contexto = f"""Você é um auditor especialista em fiscalização de recursos públicos do PNAE.
 
 Analise esta nota fiscal e forneça um parecer:
 
@@ -375,22 +404,11 @@ Forneça uma justificativa profissional em JSON:
   "recomendacao_final": "O que fazer"
 }}"""
 
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": contexto}],
-            temperature=0.3,
-            response_format={"type": "json_object"}
-        )
-        
-        return json.loads(response.choices[0].message.content)
-        
-    except Exception as e:
-        logger.warning(f"Erro na análise GPT: {e}")
-        return {
-            "justificativa": f"Análise automática detectou {len(alertas)} alertas. Score de conformidade: {score}/100.",
-            "pontos_atencao": ["Revisar manualmente"],
-            "recomendacao_final": "Análise contextual indisponível"
-        }
+    return obter_gateway_llm().completar_json_sync(
+        modelo="gpt-4o",
+        mensagens=[{"role": "user", "content": contexto}],
+        temperatura=0.3
+    )
 
 
 def gerar_dashboard_fiscalizacao_governo(periodo_dias: int = 30) -> Dict:
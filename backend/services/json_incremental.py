@@ -0,0 +1,68 @@
+"""
+Leitura incremental de JSON gerado em streaming pela IA.
+O texto chega em fragmentos; `ExtratorArrayJSON` acompanha strings,
+escapes e profundidade caractere a caractere e devolve cada elemento de
+um array do objeto raiz assim que ele se fecha, sem esperar o documento
+inteiro.
+"""
+import json
+from typing import Any, List, Optional
+
+
+class ExtratorArrayJSON:
+    """
+    Elementos (objetos) do array `chave` do objeto raiz, na ordem em que
+    terminam de chegar. Ex.: com `chave="pratos"`, cada `pratos[i]` sai
+    de `alimentar` no fragmento que contém o seu `}` final.
+    """
+
+    def __init__(self, chave: str):
+        self.chave = chave
+        self._buffer: List[str] = []  # Texto do elemento em andamento
+        self._profundidade = 0
+        self._em_string = False
+        self._escape = False
+        self._string: List[str] = []  # String em andamento no objeto raiz
+        self._ultima_string: Optional[str] = None
+        self._chave_atual: Optional[str] = None
+        self._no_array = False
+
+    def alimentar(self, fragmento: str) -> List[Any]:
+        """Consome um fragmento e retorna os elementos completados nele."""
+        completos = []
+        for caractere in fragmento:
+            if self._buffer:
+                self._buffer.append(caractere)
+
+            if self._em_string:
+                if self._escape:
+                    self._escape = False
+                elif caractere == "\\":
+                    self._escape = True
+                elif caractere == '"':
+                    self._em_string = False
+                    if self._profundidade == 1:
+                        self._ultima_string = "".join(self._string)
+                if self._profundidade == 1 and self._em_string:
+                    self._string.append(caractere)
+                continue
+
+            if caractere == '"':
+                self._em_string = True
+                self._string = []
+            elif caractere == ":" and self._profundidade == 1:
+                self._chave_atual = self._ultima_string
+            elif caractere in "{[":
+                if self._no_array and self._profundidade == 2 and caractere == "{":
+                    self._buffer = [caractere]
+                elif self._profundidade == 1 and caractere == "[" and self._chave_atual == self.chave:
+                    self._no_array = True
+                self._profundidade += 1
+            elif caractere in "}]":
+                self._profundidade -= 1
+                if self._no_array and self._profundidade == 2 and self._buffer:
+                    completos.append(json.loads("".join(self._buffer)))
+                    self._buffer = []
+                elif self._no_array and self._profundidade == 1:
+                    self._no_array = False
+        return completos
@@ -0,0 +1,278 @@
+"""
+Gateway compartilhado para as chamadas de LLM (OpenAI).
+Um único `AsyncOpenAI` com pool de conexões, rodando em um event loop
+próprio (thread daemon): rotas `async def` aguardam a resposta sem travar o
+loop do servidor, e rotas síncronas (executadas no threadpool) bloqueiam só
+a própria thread. Respostas longas podem ser consumidas em streaming.
+Cada modelo tem um semáforo que limita as chamadas
+simultâneas; timeout e novas tentativas (429, 5xx, falhas de conexão) ficam
+a cargo do cliente da OpenAI.
+"""
+import asyncio
+import json
+import logging
+import queue
+import threading
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Tempo máximo (s) para estabelecer a conexão com a API
+TIMEOUT_CONEXAO_S = 10.0
+
+
+class LLMIndisponivel(RuntimeError):
+    """A chamada não pode ser feita (ex.: chave da API não configurada)."""
+
+
+class GatewayLLM:
+    """
+    Chamadas à API da OpenAI com concorrência limitada por modelo.
+
+    O cliente, o pool HTTP e os semáforos pertencem ao loop do gateway e só
+    são tocados nele; os métodos públicos podem ser chamados de qualquer
+    thread ou event loop.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        timeout_s: float = 60.0,
+        tentativas: int = 2,
+        conexoes: int = 20,
+        concorrencia_por_modelo: int = 8
+    ):
+        self.api_key = api_key
+        self.timeout_s = timeout_s
+        self.tentativas = tentativas
+        self.conexoes = conexoes
+        self.concorrencia_por_modelo = concorrencia_por_modelo
+        self._cliente: Optional[AsyncOpenAI] = None
+        self._semaforos: Dict[str, asyncio.Semaphore] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    # ==================== LOOP DO GATEWAY ====================
+
+    def _obter_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="gateway-llm", daemon=True)
+                thread.start()
+                self._loop, self._thread = loop, thread
+            return self._loop
+
+    def agendar(self, corrotina):
+        """
+        Agenda a corrotina no loop do gateway e retorna um
+        `concurrent.futures.Future` (cancelar o futuro cancela a chamada).
+        """
+        return asyncio.run_coroutine_threadsafe(corrotina, self._obter_loop())
+
+    def _no_loop_do_gateway(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def _obter_cliente(self) -> AsyncOpenAI:
+        if self._cliente is None:
+            timeout = httpx.Timeout(self.timeout_s, connect=TIMEOUT_CONEXAO_S)
+            self._cliente = AsyncOpenAI(
+                api_key=self.api_key,
+                timeout=timeout,
+                max_retries=self.tentativas,
+                http_client=DefaultAsyncHttpxClient(
+                    timeout=timeout,
+                    limits=httpx.Limits(
+                        max_connections=self.conexoes,
+                        max_keepalive_connections=self.conexoes
+                    )
+                )
+            )
+        return self._cliente
+
+    def _semaforo(self, modelo: str) -> asyncio.Semaphore:
+        semaforo = self._semaforos.get(modelo)
+        if semaforo is None:
+            semaforo = self._semaforos[modelo] = asyncio.Semaphore(self.concorrencia_por_modelo)
+        return semaforo
+
+    # ==================== CHAMADAS ====================
+
+    async def _completar_json(
+        self,
+        modelo: str,
+        mensagens: List[Dict[str, str]],
+        temperatura: float,
+        max_tokens: Optional[int]
+    ) -> Dict[str, Any]:
+        if not self.api_key:
+            raise LLMIndisponivel("OPENAI_API_KEY não configurada")
+
+        parametros: Dict[str, Any] = {}
+        if max_tokens is not None:
+            parametros["max_tokens"] = max_tokens
+
+        async with self._semaforo(modelo):
+            response = await self._obter_cliente().chat.completions.create(
+                model=modelo,
+                messages=mensagens,
+                temperature=temperatura,
+                response_format={"type": "json_object"},
+                **parametros
+            )
+        return json.loads(response.choices[0].message.content)
+
+    async def completar_json(
+        self,
+        modelo: str,
+        mensagens: List[Dict[str, str]],
+        temperatura: float = 0.7,
+        max_tokens: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Chat completion em modo JSON, já decodificado (para `async def`)."""
+        corrotina = self._completar_json(modelo, mensagens, temperatura, max_tokens)
+        if self._no_loop_do_gateway():
+            return await corrotina
+        return await asyncio.wrap_future(self.agendar(corrotina))
+
+    def completar_json_sync(
+        self,
+        modelo: str,
+        mensagens: List[Dict[str, str]],
+        temperatura: float = 0.7,
+        max_tokens: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Mesma chamada de `completar_json`, bloqueando a thread atual. Para
+        código síncrono (rotas `def`, workers); nunca dentro de um event loop.
+        """
+        if self._no_loop_do_gateway():
+            raise RuntimeError("Chamada síncrona ao gateway de dentro do próprio loop")
+        futuro = self.agendar(self._completar_json(modelo, mensagens, temperatura, max_tokens))
+        return futuro.result()
+
+    async def _transmitir_json(
+        self,
+        modelo: str,
+        mensagens: List[Dict[str, str]],
+        temperatura: float,
+        max_tokens: Optional[int]
+    ) -> AsyncIterator[str]:
+        if not self.api_key:
+            raise LLMIndisponivel("OPENAI_API_KEY não configurada")
+
+        parametros: Dict[str, Any] = {}
+        if max_tokens is not None:
+            parametros["max_tokens"] = max_tokens
+
+        async with self._semaforo(modelo):
+            stream = await self._obter_cliente().chat.completions.create(
+                model=modelo,
+                messages=mensagens,
+                temperature=temperatura,
+                response_format={"type": "json_object"},
+                stream=True,
+                **parametros
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    def transmitir_json_sync(
+        self,
+        modelo: str,
+        mensagens: List[Dict[str, str]],
+        temperatura: float = 0.7,
+        max_tokens: Optional[int] = None
+    ) -> Iterator[str]:
+        """
+        Chat completion em modo JSON entregue em fragmentos de texto, à
+        medida que os tokens chegam (o JSON só é válido ao juntar todos).
+        Bloqueia a thread atual entre fragmentos; parar de consumir cancela
+        a chamada.
+        """
+        if self._no_loop_do_gateway():
+            raise RuntimeError("Chamada síncrona ao gateway de dentro do próprio loop")
+
+        fragmentos: "queue.Queue[Any]" = queue.Queue()
+        fim = object()
+
+        async def produzir():
+            try:
+                async for fragmento in self._transmitir_json(modelo, mensagens, temperatura, max_tokens):
+                    fragmentos.put(fragmento)
+            except BaseException as e:
+                fragmentos.put(e)
+                raise
+            fragmentos.put(fim)
+
+        futuro = self.agendar(produzir())
+        try:
+            while True:
+                item = fragmentos.get()
+                if item is fim:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            futuro.cancel()
+
+    # ==================== ENCERRAMENTO ====================
+
+    async def _fechar_cliente(self):
+        if self._cliente is not None:
+            await self._cliente.close()
+            self._cliente = None
+
+    def fechar(self):
+        """Fecha o pool de conexões e encerra o loop do gateway."""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._fechar_cliente(), loop).result(timeout=TIMEOUT_CONEXAO_S)
+        except Exception as e:
+            logger.warning(f"Erro ao fechar o cliente da OpenAI: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=TIMEOUT_CONEXAO_S)
+        loop.close()
+        self._cliente = None
+        self._semaforos.clear()
+
+
+_gateway: Optional[GatewayLLM] = None
+_lock = threading.Lock()
+
+
+def obter_gateway_llm() -> GatewayLLM:
+    """Retorna o gateway de LLM, criado na primeira chamada."""
+    global _gateway
+    if _gateway is None:
+        with _lock:
+            if _gateway is None:
+                _gateway = GatewayLLM(
+                    api_key=settings.openai_api_key,
+                    timeout_s=settings.llm_timeout_s,
+                    tentativas=settings.llm_tentativas,
+                    conexoes=settings.llm_conexoes,
+                    concorrencia_por_modelo=settings.llm_concorrencia_por_modelo
+                )
+    return _gateway
+
+
+def fechar_gateway_llm():
+    """Encerra o gateway (shutdown da aplicação)."""
+    global _gateway
+    with _lock:
+        gateway, _gateway = _gateway, None
+    if gateway is not None:
+        gateway.fechar()
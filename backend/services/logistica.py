@@ -0,0 +1,184 @@
+"""
+Consolidação de entregas dos produtores.
+Pedidos com entrega ainda não realizados são agrupados por produtor e data
+de entrega; cada grupo vira uma rota com várias paradas (uma por escola),
+saindo e voltando à propriedade: vizinho mais próximo para a rota inicial
+e 2-opt para melhorá-la, sobre as distâncias de Haversine.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from storage import repositorio
+from services.geolocation import haversine_lote
+
+# Pedidos que ainda vão sair para entrega
+STATUS_A_ENTREGAR = ("pendente", "confirmado")
+
+# Melhora mínima (km) para aceitar uma troca do 2-opt
+TOLERANCIA_2OPT_KM = 1e-9
+
+# Limite de passadas do 2-opt por rota
+MAX_PASSADAS_2OPT = 50
+
+
+def matriz_distancias(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Distâncias de Haversine (km) entre todos os pares de pontos."""
+    if not len(lats):
+        return np.zeros((0, 0))
+    lats_rad = np.radians(lats)
+    lons_rad = np.radians(lons)
+    cos_lats = np.cos(lats_rad)
+    return np.vstack([
+        haversine_lote(lat, lon, lats_rad, lons_rad, cos_lats)
+        for lat, lon in zip(lats.tolist(), lons.tolist())
+    ])
+
+
+def rota_vizinho_mais_proximo(distancias: np.ndarray) -> List[int]:
+    """
+    Rota fechada a partir do ponto 0 (a propriedade): sempre segue para a
+    parada ainda não visitada mais próxima.
+    """
+    total = len(distancias)
+    visitado = np.zeros(total, dtype=np.bool_)
+    visitado[0] = True
+    rota = [0]
+    atual = 0
+    for _ in range(total - 1):
+        atual = int(np.argmin(np.where(visitado, np.inf, distancias[atual])))
+        visitado[atual] = True
+        rota.append(atual)
+    return rota + [0]
+
+
+def dois_opt(rota: List[int], distancias: np.ndarray) -> List[int]:
+    """
+    Melhora uma rota fechada invertendo trechos enquanto isso encurta o
+    percurso (2-opt). Para cada aresta de saída, todas as trocas possíveis
+    são avaliadas de uma vez e a melhor é aplicada.
+    """
+    rota = np.array(rota)
+    for _ in range(MAX_PASSADAS_2OPT):
+        melhorou = False
+        for i in range(1, len(rota) - 2):
+            j = np.arange(i + 1, len(rota) - 1)
+            a, b = rota[i - 1], rota[i]
+            c, d = rota[j], rota[j + 1]
+            ganho = distancias[a, c] + distancias[b, d] - distancias[a, b] - distancias[c, d]
+            melhor = int(np.argmin(ganho))
+            if ganho[melhor] < -TOLERANCIA_2OPT_KM:
+                fim = int(j[melhor])
+                rota[i:fim + 1] = rota[i:fim + 1][::-1]
+                melhorou = True
+        if not melhorou:
+            break
+    return rota.tolist()
+
+
+def planejar_rota(
+    origem: Tuple[float, float],
+    paradas: List[Tuple[float, float]]
+) -> Tuple[List[int], List[float], List[float]]:
+    """
+    Rota saindo e voltando à `origem`. Retorna a ordem de visita (índices
+    em `paradas`), a distância de cada trecho (o último é a volta) e a
+    distância da origem a cada parada.
+    """
+    lats = np.array([origem[0]] + [p[0] for p in paradas], dtype=np.float64)
+    lons = np.array([origem[1]] + [p[1] for p in paradas], dtype=np.float64)
+    distancias = matriz_distancias(lats, lons)
+    rota = dois_opt(rota_vizinho_mais_proximo(distancias), distancias)
+    trechos = distancias[rota[:-1], rota[1:]].tolist()
+    return [ponto - 1 for ponto in rota[1:-1]], trechos, distancias[0, 1:].tolist()
+
+
+def agrupar_entregas(
+    data_inicio: Optional[str] = None,
+    data_fim: Optional[str] = None,
+    produtor_id: Optional[str] = None
+) -> Dict[Tuple[str, str], List[dict]]:
+    """Pedidos com entrega a realizar, agrupados por (produtor, data de entrega)."""
+    pedidos = repositorio.colecao("pedidos")
+    intervalo = ("data_entrega_desejada", data_inicio, data_fim) if data_inicio or data_fim else None
+    grupos: Dict[Tuple[str, str], List[dict]] = {}
+    for status in STATUS_A_ENTREGAR:
+        filtros = {"status": status}
+        if produtor_id:
+            filtros["produtor_id"] = produtor_id
+        for pedido in pedidos.consultar(filtros, intervalo=intervalo):
+            if pedido.get("tipo_logistica") != "entrega":
+                continue
+            chave = (pedido["produtor_id"], pedido["data_entrega_desejada"])
+            grupos.setdefault(chave, []).append(pedido)
+    return grupos
+
+
+def consolidar_entregas(
+    data_inicio: Optional[str] = None,
+    data_fim: Optional[str] = None,
+    produtor_id: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Rotas consolidadas de entrega por produtor e data.
+
+    Cada rota traz as paradas na ordem de visita (pedidos da mesma escola
+    no mesmo dia viram uma única parada), a distância total do circuito e
+    a distância das viagens individuais (ida e volta por pedido) que ele
+    substitui. Pedidos de produtor ou escola sem localização cadastrada
+    ficam de fora.
+    """
+    produtores = repositorio.colecao("produtores")
+    escolas = repositorio.colecao("escolas")
+    rotas = []
+
+    for (pedido_produtor, data), pedidos in sorted(agrupar_entregas(data_inicio, data_fim, produtor_id).items()):
+        produtor = produtores.obter(pedido_produtor)
+        if not produtor or not produtor.get("localizacao"):
+            continue
+        origem = (produtor["localizacao"]["latitude"], produtor["localizacao"]["longitude"])
+
+        # Uma parada por escola, na ordem do primeiro pedido
+        paradas: Dict[str, Dict[str, Any]] = {}
+        for pedido in pedidos:
+            parada = paradas.get(pedido["escola_id"])
+            if parada is None:
+                escola = escolas.obter(pedido["escola_id"])
+                if not escola or not escola.get("localizacao"):
+                    continue
+                parada = paradas[pedido["escola_id"]] = {
+                    "escola_id": escola["id"],
+                    "escola_nome": escola.get("nome", "Desconhecida"),
+                    "coordenadas": (escola["localizacao"]["latitude"], escola["localizacao"]["longitude"]),
+                    "pedido_ids": [],
+                }
+            parada["pedido_ids"].append(pedido["id"])
+        if not paradas:
+            continue
+
+        lista = list(paradas.values())
+        ordem, trechos, ida = planejar_rota(origem, [p["coordenadas"] for p in lista])
+        individuais = sum(2 * ida[i] * len(p["pedido_ids"]) for i, p in enumerate(lista))
+        total = sum(trechos)
+
+        rotas.append({
+            "produtor_id": produtor["id"],
+            "produtor_nome": produtor.get("nome", "Desconhecido"),
+            "data_entrega": data,
+            "numero_pedidos": sum(len(p["pedido_ids"]) for p in lista),
+            "paradas": [
+                {
+                    "ordem": posicao,
+                    "escola_id": lista[i]["escola_id"],
+                    "escola_nome": lista[i]["escola_nome"],
+                    "pedido_ids": lista[i]["pedido_ids"],
+                    "distancia_trecho_km": round(trechos[posicao - 1], 2),
+                }
+                for posicao, i in enumerate(ordem, 1)
+            ],
+            "distancia_retorno_km": round(trechos[-1], 2),
+            "distancia_total_km": round(total, 2),
+            "distancia_viagens_individuais_km": round(individuais, 2),
+            "economia_km": round(individuais - total, 2),
+        })
+    return rotas
@@ -0,0 +1,551 @@
+"""
+Matriz escola × produtor de distâncias, persistida entre reinícios.
+Cada linha guarda as distâncias (em centésimos de km, exatamente as
+arredondadas por `haversine_distance`) de uma escola a todos os produtores
+do `CatalogoProdutores`. Scores e descontos saem dessas distâncias e da
+nota atual do produtor, então só mudanças de localização exigem recálculo.
+"""
+import logging
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+from storage import Observador, repositorio
+from services.consumo_colunar import Colunas
+from services.geolocation import (
+    CatalogoProdutores,
+    ResultadoMatch,
+    calcular_desconto_proximidade_lote,
+    calcular_score_match_lote,
+    haversine_lote,
+    obter_catalogo_produtores,
+)
+
+logger = logging.getLogger(__name__)
+
+# Arquivo da matriz persistida (ao lado das coleções)
+ARQUIVO_MATRIZ = "matriz_proximidade.npz"
+
+# Pares escola × produtor processados por faixa no planejamento em lote
+PARES_POR_FAIXA = 1_000_000
+
+# Chave de ranking das posições fora do raio (sempre por último)
+FORA_DO_RAIO = np.iinfo(np.int64).max
+
+
+class MatrizProximidade:
+    """
+    Distâncias de cada escola a cada produtor do catálogo.
+
+    - Escola cadastrada ou relocada: uma linha calculada em lote
+    - Produtor cadastrado ou relocado: uma coluna calculada em lote
+    - Na carga, linhas e colunas salvas cujas coordenadas não mudaram são
+      reaproveitadas; só o restante é calculado
+    """
+
+    def __init__(self, catalogo: CatalogoProdutores):
+        self.catalogo = catalogo
+        self._lock = threading.RLock()
+        self._salva: Optional[Dict[str, Any]] = None
+        self._mapa_colunas_salvas: Optional[np.ndarray] = None
+        self.alterada = False
+        self.limpar_escolas()
+        self.limpar_produtores()
+
+    # ==================== ESCOLAS (LINHAS) ====================
+
+    def limpar_escolas(self):
+        with self._lock:
+            self.escolas = Colunas({
+                "lat": np.float64,
+                "lon": np.float64,
+                "lat_rad": np.float64,
+                "lon_rad": np.float64,
+                "cos_lat": np.float64,
+                "ativo": np.bool_,
+            })
+            self._linhas: Dict[str, int] = {}
+            self._ids_escolas: List[str] = []
+            self._distancias = np.zeros((0, 0), dtype=np.int32)
+
+    def _garantir_capacidade(self, linhas: int, colunas: int):
+        """Cresce a matriz (dobrando) para comportar linhas × colunas."""
+        atual_linhas, atual_colunas = self._distancias.shape
+        if linhas <= atual_linhas and colunas <= atual_colunas:
+            return
+        nova = np.zeros(
+            (max(linhas, 2 * atual_linhas, 16), max(colunas, 2 * atual_colunas, 64)), dtype=np.int32
+        )
+        nova[:atual_linhas, :atual_colunas] = self._distancias
+        self._distancias = nova
+
+    def definir_escola(self, escola: dict):
+        """Cadastra ou relocaliza uma escola e (re)calcula sua linha."""
+        lat = escola["localizacao"]["latitude"]
+        lon = escola["localizacao"]["longitude"]
+        lat_rad = math.radians(lat)
+        valores = {
+            "lat": lat,
+            "lon": lon,
+            "lat_rad": lat_rad,
+            "lon_rad": math.radians(lon),
+            "cos_lat": math.cos(lat_rad),
+            "ativo": True,
+        }
+        with self._lock, self.catalogo._lock:
+            linha = self._linhas.get(escola["id"])
+            if linha is None:
+                linha = self.escolas.anexar({nome: [valor] for nome, valor in valores.items()})
+                self._linhas[escola["id"]] = linha
+                self._ids_escolas.append(escola["id"])
+            else:
+                mesmo_lugar = (self.escolas["lat"][linha], self.escolas["lon"][linha]) == (lat, lon)
+                self.escolas.arrays["ativo"][linha] = True
+                if mesmo_lugar:
+                    # Linha continua válida (as colunas novas já foram preenchidas)
+                    return
+                for nome, valor in valores.items():
+                    self.escolas.arrays[nome][linha] = valor
+
+            total = self.catalogo.colunas.tamanho
+            self._garantir_capacidade(linha + 1, total)
+            self._distancias[linha, :total] = self._calcular_linha(escola["id"], lat, lon, total)
+
+    def remover_escola(self, escola: dict):
+        with self._lock:
+            linha = self._linhas.get(escola.get("id"))
+            if linha is not None:
+                self.escolas.arrays["ativo"][linha] = False
+
+    def _calcular_linha(self, escola_id: str, lat: float, lon: float, total: int) -> np.ndarray:
+        """Centésimos de km da escola a cada posição do catálogo."""
+        colunas = self.catalogo.colunas
+        linha = np.zeros(total, dtype=np.int32)
+        faltam = np.arange(total)
+
+        salva = self._linha_salva(escola_id, lat, lon)
+        if salva is not None:
+            mapa = self._colunas_salvas()[:total]
+            reaproveitadas = mapa >= 0
+            linha[reaproveitadas] = salva[mapa[reaproveitadas]]
+            faltam = np.flatnonzero(~reaproveitadas)
+
+        if len(faltam):
+            distancias = haversine_lote(
+                lat, lon, colunas["lat_rad"][faltam], colunas["lon_rad"][faltam], colunas["cos_lat"][faltam]
+            )
+            linha[faltam] = _centesimos(distancias)
+            self.alterada = True
+        return linha
+
+    # ==================== PRODUTORES (COLUNAS) ====================
+
+    def limpar_produtores(self):
+        with self._lock:
+            self._coords_colunas: Dict[int, tuple] = {}
+
+    def definir_produtor(self, produtor: dict):
+        """(Re)calcula a coluna de um produtor já posicionado no catálogo."""
+        lat = produtor["localizacao"]["latitude"]
+        lon = produtor["localizacao"]["longitude"]
+        with self._lock, self.catalogo._lock:
+            posicao = self.catalogo.posicao(produtor.get("id"))
+            if posicao is None or self._coords_colunas.get(posicao) == (lat, lon):
+                # Atualização sem mudança de lugar: a coluna continua válida
+                return
+            self._coords_colunas[posicao] = (lat, lon)
+            total_linhas = self.escolas.tamanho
+            self._garantir_capacidade(total_linhas, posicao + 1)
+            if not total_linhas:
+                return
+
+            escolas = self.escolas
+            distancias = haversine_lote(lat, lon, escolas["lat_rad"], escolas["lon_rad"], escolas["cos_lat"])
+            self._distancias[:total_linhas, posicao] = _centesimos(distancias)
+            self.alterada = True
+
+    # ==================== CONSULTA ====================
+
+    def linha(self, escola_id: str) -> Optional[np.ndarray]:
+        """Distâncias (km) da escola a cada posição do catálogo, ou None."""
+        with self._lock, self.catalogo._lock:
+            linha = self._linhas.get(escola_id)
+            if linha is None or not self.escolas["ativo"][linha]:
+                return None
+            return self._distancias[linha, :self.catalogo.colunas.tamanho] / 100.0
+
+    def resumo_rede(self, raio_km: float) -> List[Dict[str, Any]]:
+        """
+        Para cada escola ativa: produtores ativos no raio, quantos têm DAP e
+        a distância do mais próximo (planejamento da secretaria).
+        """
+        with self._lock, self.catalogo._lock:
+            total = self.catalogo.colunas.tamanho
+            linhas = np.flatnonzero(self.escolas["ativo"])
+            ativos = self.catalogo.colunas["ativo"]
+            dap = self.catalogo.colunas["dap"]
+            distancias = self._distancias[linhas, :total]
+
+            no_raio = (distancias / 100.0 <= raio_km) & ativos
+            quantidade = no_raio.sum(axis=1)
+            quantidade_dap = (no_raio & dap).sum(axis=1)
+            if ativos.any():
+                mais_proximo = np.where(ativos, distancias, np.iinfo(np.int32).max).min(axis=1)
+            else:
+                mais_proximo = np.full(len(linhas), -1)
+            ids = [self._ids_escolas[linha] for linha in linhas.tolist()]
+
+        return [
+            {
+                "escola_id": escola_id,
+                "produtores_no_raio": int(quantidade[i]),
+                "produtores_dap_no_raio": int(quantidade_dap[i]),
+                "distancia_mais_proxima_km": float(mais_proximo[i]) / 100 if mais_proximo[i] >= 0 else None,
+            }
+            for i, escola_id in enumerate(ids)
+        ]
+
+    def melhores_por_escola(
+        self,
+        escola_ids: Optional[List[str]],
+        raio_km: float,
+        top_k: int,
+        apenas_com_dap: bool = False,
+        categoria: Optional[str] = None,
+        avaliacao_minima: float = 0.0
+    ) -> List[Dict[str, Any]]:
+        """
+        Os `top_k` melhores produtores de cada escola (todas as ativas se
+        `escola_ids` for None), no mesmo ranking da busca individual, e
+        quantos produtores atendem à busca no raio. Escolas desconhecidas
+        são omitidas.
+
+        O bloco escolas × produtores elegíveis sai da matriz e é ranqueado
+        em faixas de linhas (ver `_processar_faixas`).
+        """
+        with self._lock, self.catalogo._lock:
+            if escola_ids is None:
+                linhas = np.flatnonzero(self.escolas["ativo"])
+            else:
+                linhas = np.array([
+                    linha for linha in map(self._linhas.get, escola_ids)
+                    if linha is not None and self.escolas["ativo"][linha]
+                ], dtype=np.int64)
+
+            colunas = self.catalogo.colunas
+            elegiveis = colunas["ativo"].copy()
+            if apenas_com_dap:
+                elegiveis &= colunas["dap"]
+            if categoria:
+                codigo = self.catalogo.categorias.codigos.get(categoria)
+                if codigo is None:
+                    elegiveis[:] = False
+                else:
+                    elegiveis &= (colunas["categorias"] & (1 << codigo)) != 0
+            if avaliacao_minima:
+                elegiveis &= colunas["nota"] >= avaliacao_minima
+
+            posicoes = np.flatnonzero(elegiveis)
+            distancias = self._distancias[np.ix_(linhas, posicoes)]
+            notas = colunas["nota"][posicoes]
+            ids = [self._ids_escolas[linha] for linha in linhas.tolist()]
+            registros = [self.catalogo.registro(posicao) for posicao in posicoes.tolist()]
+
+        ranqueadas = _processar_faixas(distancias, lambda faixa: _ranquear_faixa(faixa, notas, raio_km, top_k))
+
+        resultado = []
+        escolas = iter(ids)
+        for indices, distancias_km, scores, no_raio in ranqueadas:
+            descontos = calcular_desconto_proximidade_lote(distancias_km)
+            for i in range(len(indices)):
+                validos = indices[i] >= 0
+                resultado.append({
+                    "escola_id": next(escolas),
+                    "produtores_no_raio": int(no_raio[i]),
+                    "resultados": list(map(
+                        ResultadoMatch,
+                        [registros[j] for j in indices[i][validos].tolist()],
+                        distancias_km[i][validos].tolist(),
+                        scores[i][validos].tolist(),
+                        descontos[i][validos].tolist()
+                    )),
+                })
+        return resultado
+
+    def cobertura(self, categorias: List[str]) -> List[Dict[str, Any]]:
+        """
+        Para cada escola ativa e cada categoria: o produtor ativo com DAP
+        mais próximo que oferece a categoria e a distância até ele (None se
+        nenhum). É o vizinho mais próximo de todas as escolas de uma vez,
+        por mínimos mascarados sobre as linhas da matriz.
+        """
+        with self._lock, self.catalogo._lock:
+            linhas = np.flatnonzero(self.escolas["ativo"])
+            colunas = self.catalogo.colunas
+            posicoes = np.flatnonzero(colunas["ativo"] & colunas["dap"])
+            distancias = self._distancias[np.ix_(linhas, posicoes)]
+
+            categorias_produtores = colunas["categorias"][posicoes]
+            mascaras = np.zeros((len(categorias), len(posicoes)), dtype=np.bool_)
+            for i, categoria in enumerate(categorias):
+                codigo = self.catalogo.categorias.codigos.get(categoria)
+                if codigo is not None:
+                    mascaras[i] = (categorias_produtores & (1 << codigo)) != 0
+
+            ids = [self._ids_escolas[linha] for linha in linhas.tolist()]
+            registros = [self.catalogo.registro(posicao) for posicao in posicoes.tolist()]
+
+        faixas = _processar_faixas(distancias, lambda faixa: _mais_proximos_faixa(faixa, mascaras))
+
+        resultado = []
+        escolas = iter(ids)
+        for indices, menores in faixas:
+            for linha_indices, linha_menores in zip(indices.tolist(), menores.tolist()):
+                resultado.append({
+                    "escola_id": next(escolas),
+                    "categorias": {
+                        categoria: (registros[j], d / 100) if j >= 0 else (None, None)
+                        for categoria, j, d in zip(categorias, linha_indices, linha_menores)
+                    },
+                })
+        return resultado
+
+    # ==================== PERSISTÊNCIA ====================
+
+    def carregar(self, arquivo: Path):
+        """Lê a matriz salva; ela é consultada só durante a carga inicial."""
+        try:
+            with np.load(arquivo, allow_pickle=False) as dados:
+                self._salva = {nome: dados[nome] for nome in dados.files}
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Matriz de proximidade salva ignorada: {e}")
+            return
+        self._salva["linhas"] = {
+            escola_id: linha for linha, escola_id in enumerate(self._salva["escola_ids"].tolist())
+        }
+
+    def _linha_salva(self, escola_id: str, lat: float, lon: float) -> Optional[np.ndarray]:
+        """Linha salva da escola, se ela não mudou de lugar."""
+        if self._salva is None:
+            return None
+        linha = self._salva["linhas"].get(escola_id)
+        if linha is None or tuple(self._salva["escola_coords"][linha].tolist()) != (lat, lon):
+            return None
+        return self._salva["distancias"][linha]
+
+    def _colunas_salvas(self) -> np.ndarray:
+        """Para cada posição do catálogo, a coluna salva equivalente (ou -1)."""
+        if self._mapa_colunas_salvas is None:
+            salvas = {
+                produtor_id: coluna
+                for coluna, produtor_id in enumerate(self._salva["produtor_ids"].tolist())
+            }
+            coords = self._salva["produtor_coords"]
+            colunas = self.catalogo.colunas
+            mapa = np.full(colunas.tamanho, -1, dtype=np.int64)
+            for posicao in range(colunas.tamanho):
+                produtor = self.catalogo.registro(posicao)
+                coluna = salvas.get(produtor["id"]) if produtor is not None else None
+                if coluna is not None and coords[coluna, 0] == colunas["lat"][posicao] \
+                        and coords[coluna, 1] == colunas["lon"][posicao]:
+                    mapa[posicao] = coluna
+            self._mapa_colunas_salvas = mapa
+        return self._mapa_colunas_salvas
+
+    def concluir_carga(self):
+        """Descarta a matriz lida do disco (já incorporada)."""
+        self._salva = None
+        self._mapa_colunas_salvas = None
+
+    def salvar(self, arquivo: Path):
+        """Grava a matriz atual (arquivo temporário + os.replace)."""
+        with self._lock, self.catalogo._lock:
+            total = self.catalogo.colunas.tamanho
+            linhas = self.escolas.tamanho
+            produtor_ids = [
+                (registro or {}).get("id", "")
+                for registro in map(self.catalogo.registro, range(total))
+            ]
+            dados = {
+                "escola_ids": np.array(self._ids_escolas, dtype=str),
+                "escola_coords": np.column_stack([self.escolas["lat"], self.escolas["lon"]]),
+                "produtor_ids": np.array(produtor_ids, dtype=str),
+                "produtor_coords": np.column_stack([self.catalogo.colunas["lat"], self.catalogo.colunas["lon"]]),
+                "distancias": self._distancias[:linhas, :total].copy(),
+            }
+            self.alterada = False
+
+        temporario = arquivo.with_name(f"{arquivo.stem}.{os.getpid()}.tmp.npz")
+        np.savez(temporario, **dados)
+        os.replace(temporario, arquivo)
+
+
+def _centesimos(distancias: np.ndarray) -> np.ndarray:
+    """Distâncias arredondadas (2 casas) como inteiros exatos de centésimos."""
+    return np.rint(distancias * 100).astype(np.int32)
+
+
+def _ranquear_faixa(
+    distancias: np.ndarray,
+    notas: np.ndarray,
+    raio_km: float,
+    top_k: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Ranking vetorizado de uma faixa de escolas (linhas, em centésimos de
+    km) sobre os mesmos produtores (colunas).
+
+    A chave de cada par é o score (4 casas, como inteiro) decrescente com
+    empate pela coluna, única por linha: a seleção parcial por linha
+    (`np.argpartition`) dá exatamente os k primeiros da busca individual.
+
+    Retorna, por linha: colunas dos k melhores em ordem (-1 onde faltam
+    produtores no raio), suas distâncias em km e scores, e quantos
+    produtores estão no raio.
+    """
+    linhas, total = distancias.shape
+    k = min(top_k, total)
+    if not k:
+        vazio = np.zeros((linhas, 0))
+        return vazio.astype(np.int64), vazio, vazio, np.zeros(linhas, dtype=np.int64)
+
+    km = distancias / 100.0
+    no_raio = km <= raio_km
+    scores = calcular_score_match_lote(km, notas)
+    chaves = np.where(
+        no_raio,
+        (-np.rint(scores * 10000).astype(np.int64) << 32) + np.arange(total),
+        FORA_DO_RAIO
+    )
+
+    if k < total:
+        indices = np.argpartition(chaves, k - 1, axis=1)[:, :k]
+    else:
+        indices = np.broadcast_to(np.arange(total), (linhas, total))
+    indices = np.take_along_axis(indices, np.argsort(np.take_along_axis(chaves, indices, 1), axis=1), 1)
+    indices = np.where(np.take_along_axis(chaves, indices, 1) == FORA_DO_RAIO, -1, indices)
+
+    return (
+        indices,
+        np.take_along_axis(km, indices, 1),
+        np.take_along_axis(scores, indices, 1),
+        no_raio.sum(axis=1),
+    )
+
+
+def _mais_proximos_faixa(distancias: np.ndarray, mascaras: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Para cada linha (escola) e cada máscara de colunas (categoria): coluna
+    do produtor mais próximo (-1 se a máscara é vazia; empates pela
+    coluna) e sua distância em centésimos de km.
+    """
+    linhas = distancias.shape[0]
+    indices = np.full((linhas, len(mascaras)), -1, dtype=np.int64)
+    menores = np.zeros((linhas, len(mascaras)), dtype=np.int64)
+    for i, mascara in enumerate(mascaras):
+        if not mascara.any():
+            continue
+        candidatas = np.flatnonzero(mascara)
+        mais_proximo = distancias[:, candidatas].argmin(axis=1)
+        indices[:, i] = candidatas[mais_proximo]
+        menores[:, i] = distancias[np.arange(linhas), indices[:, i]]
+    return indices, menores
+
+
+def _processar_faixas(distancias: np.ndarray, funcao: Callable[[np.ndarray], Any]) -> List[Any]:
+    """
+    Aplica `funcao` a faixas de linhas do bloco escolas × produtores (de
+    até `PARES_POR_FAIXA` pares cada), em ordem. Blocos grandes dividem as
+    faixas entre threads: as operações NumPy liberam o GIL e as faixas
+    são fatias do mesmo array, sem cópia para outros processos.
+    """
+    linhas, colunas = distancias.shape
+    passo = max(1, PARES_POR_FAIXA // max(1, colunas))
+    faixas = [distancias[inicio:inicio + passo] for inicio in range(0, linhas, passo)]
+    paralelo = (
+        len(faixas) > 1
+        and settings.planejamento_threads > 1
+        and distancias.size >= settings.planejamento_pares_paralelo
+    )
+    if not paralelo:
+        return [funcao(faixa) for faixa in faixas]
+    with ThreadPoolExecutor(max_workers=min(settings.planejamento_threads, len(faixas))) as executor:
+        return list(executor.map(funcao, faixas))
+
+
+class _ObservadorEscolas(Observador):
+    def __init__(self, matriz: MatrizProximidade):
+        self.matriz = matriz
+
+    def limpar(self):
+        self.matriz.limpar_escolas()
+
+    def adicionar(self, registro: dict):
+        self.matriz.definir_escola(registro)
+
+    def remover(self, registro: dict):
+        self.matriz.remover_escola(registro)
+
+
+class _ObservadorProdutores(Observador):
+    """Registrado depois do catálogo: a posição do produtor já existe."""
+
+    def __init__(self, matriz: MatrizProximidade):
+        self.matriz = matriz
+
+    def limpar(self):
+        self.matriz.limpar_produtores()
+
+    def adicionar(self, registro: dict):
+        self.matriz.definir_produtor(registro)
+
+
+_matriz: Optional[MatrizProximidade] = None
+_lock = threading.Lock()
+
+
+def _arquivo_matriz() -> Path:
+    return repositorio.data_dir / ARQUIVO_MATRIZ
+
+
+def obter_matriz_proximidade() -> MatrizProximidade:
+    """
+    Retorna a matriz escola × produtor, montada na primeira chamada (a
+    partir do arquivo salvo, quando ainda válido) e mantida pelas
+    notificações das coleções de escolas e produtores.
+    """
+    global _matriz
+    if _matriz is not None:
+        # Escritas de outros processos chegam pela recarga das coleções
+        obter_catalogo_produtores()
+        repositorio.colecao("escolas").sincronizar()
+    else:
+        with _lock:
+            if _matriz is None:
+                matriz = MatrizProximidade(obter_catalogo_produtores())
+                matriz.carregar(_arquivo_matriz())
+                repositorio.colecao("produtores").observar(_ObservadorProdutores(matriz))
+                repositorio.colecao("escolas").observar(_ObservadorEscolas(matriz))
+                matriz.concluir_carga()
+                salvar_matriz_proximidade(matriz)
+                _matriz = matriz
+    return _matriz
+
+
+def salvar_matriz_proximidade(matriz: Optional[MatrizProximidade] = None):
+    """Persiste a matriz se ela mudou desde a última gravação."""
+    matriz = matriz or _matriz
+    if matriz is None or not matriz.alterada:
+        return
+    try:
+        matriz.salvar(_arquivo_matriz())
+    except OSError as e:
+        logger.warning(f"Matriz de proximidade não salva: {e}")
@@ -0,0 +1,214 @@
+"""
+Índice invertido das ofertas de produtos dos agricultores.
+Cada produto de cada produtor vira uma oferta (produtor, preço em
+centavos, unidade) indexada pelo nome normalizado do produto; as ofertas
+de um mesmo produto ficam em uma `GradeEspacial` própria. Uma busca por
+"Abóbora" visita só as ofertas de abóbora nas células que tocam o raio,
+sem percorrer o catálogo inteiro.
+"""
+import threading
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from storage import Observador, repositorio
+from services.consumo_colunar import Colunas, Dicionario
+from services.geolocation import (
+    CatalogoProdutores,
+    GradeEspacial,
+    aplicar_desconto_centavos_lote,
+    caixa_envolvente,
+    calcular_desconto_proximidade_lote,
+    calcular_score_match_lote,
+    haversine_lote,
+    melhores_indices,
+    obter_catalogo_produtores,
+)
+
+
+def normalizar_termo(texto: str) -> str:
+    """Nome de produto para o índice: minúsculo, sem acentos e espaços extras."""
+    decomposto = unicodedata.normalize("NFKD", str(texto))
+    sem_acentos = "".join(c for c in decomposto if not unicodedata.combining(c))
+    return " ".join(sem_acentos.casefold().split())
+
+
+class IndiceOfertas:
+    """
+    Ofertas em colunas NumPy (produtor, produto, categoria, preço em
+    centavos e ativo) e, por termo, uma grade espacial das ofertas.
+
+    Coordenadas, nota e DAP vêm do `CatalogoProdutores` pela posição do
+    produtor. Ofertas de um produtor alterado ficam inativas e as novas são
+    anexadas, como no espelho colunar de consumo.
+    """
+
+    def __init__(self, catalogo: CatalogoProdutores):
+        self.catalogo = catalogo
+        self._lock = threading.RLock()
+        self.limpar()
+
+    def limpar(self):
+        with self._lock:
+            self.termos = Dicionario()
+            self.categorias = Dicionario()
+            self.ofertas = Colunas({
+                "posicao": np.int64,
+                "indice": np.int32,
+                "termo": np.int32,
+                "categoria": np.int32,
+                "preco_centavos": np.int64,
+                "ativo": np.bool_,
+            })
+            self._grades: Dict[int, GradeEspacial] = {}
+            self._ofertas_produtor: Dict[str, Tuple[int, int]] = {}
+
+    def adicionar(self, produtor: dict):
+        produtos = produtor.get("produtos") or []
+        with self._lock, self.catalogo._lock:
+            posicao = self.catalogo.posicao(produtor.get("id"))
+            if posicao is None or not produtos:
+                return
+            termos = [self.termos.codificar(normalizar_termo(p.get("nome", ""))) for p in produtos]
+            n = len(produtos)
+            inicio = self.ofertas.anexar({
+                "posicao": [posicao] * n,
+                "indice": list(range(n)),
+                "termo": termos,
+                "categoria": [self.categorias.codificar(p.get("categoria")) for p in produtos],
+                "preco_centavos": [round(float(p.get("preco_unitario", 0)) * 100) for p in produtos],
+                "ativo": [True] * n,
+            })
+            self._ofertas_produtor[produtor.get("id")] = (inicio, inicio + n)
+
+            lat = produtor["localizacao"]["latitude"]
+            lon = produtor["localizacao"]["longitude"]
+            for linha, termo in enumerate(termos, inicio):
+                self._grades.setdefault(termo, GradeEspacial()).inserir(linha, lat, lon)
+
+    def remover(self, produtor: dict):
+        with self._lock:
+            faixa = self._ofertas_produtor.pop(produtor.get("id"), None)
+            if faixa is None:
+                return
+            self.ofertas.arrays["ativo"][faixa[0]:faixa[1]] = False
+            termos = self.ofertas["termo"][faixa[0]:faixa[1]].tolist()
+            for linha, termo in enumerate(termos, faixa[0]):
+                self._grades[termo].remover(linha)
+
+    # ==================== BUSCA ====================
+
+    def buscar(
+        self,
+        produto: str,
+        escola_lat: float,
+        escola_lon: float,
+        raio_km: float,
+        top_k: int = 10,
+        ordenar_por: str = "preco",
+        categoria: Optional[str] = None,
+        apenas_com_dap: bool = False,
+        avaliacao_minima: float = 0.0
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        As `top_k` melhores ofertas do produto dentro do raio e o total de
+        ofertas encontradas.
+
+        - `ordenar_por="preco"`: menor preço com desconto por proximidade
+          (empate pela menor distância)
+        - `ordenar_por="score"`: maior score de match do produtor, como em
+          `/agricultores/buscar`
+        """
+        codigo = self.termos.codigos.get(normalizar_termo(produto))
+        if codigo is None:
+            return [], 0
+
+        caixa = caixa_envolvente(escola_lat, escola_lon, raio_km)
+        with self._lock, self.catalogo._lock:
+            grade = self._grades[codigo]
+            linhas = grade.posicoes() if caixa is None else grade.candidatos(caixa)
+            if categoria:
+                codigo_categoria = self.categorias.codigos.get(categoria)
+                linhas = linhas[self.ofertas["categoria"][linhas] == codigo_categoria]
+
+            colunas = self.catalogo.colunas
+            posicoes = self.ofertas["posicao"][linhas]
+            distancias = haversine_lote(
+                escola_lat, escola_lon,
+                colunas["lat_rad"][posicoes], colunas["lon_rad"][posicoes], colunas["cos_lat"][posicoes]
+            )
+            mascara = distancias <= raio_km
+            if apenas_com_dap:
+                mascara &= colunas["dap"][posicoes]
+            if avaliacao_minima:
+                mascara &= colunas["nota"][posicoes] >= avaliacao_minima
+
+            linhas, posicoes, distancias = linhas[mascara], posicoes[mascara], distancias[mascara]
+            scores = calcular_score_match_lote(distancias, colunas["nota"][posicoes])
+            descontos = calcular_desconto_proximidade_lote(distancias)
+            precos = aplicar_desconto_centavos_lote(self.ofertas["preco_centavos"][linhas], descontos)
+
+            if ordenar_por == "score":
+                ordem = melhores_indices(scores, linhas, top_k)
+            else:
+                # Preço e distância (centésimos de km) em uma única chave inteira
+                chaves = precos * (1 << 22) + np.rint(distancias * 100).astype(np.int64)
+                ordem = melhores_indices(-chaves.astype(np.float64), linhas, top_k)
+
+            resultados = []
+            for i in ordem.tolist():
+                registro = self.catalogo.registro(int(posicoes[i]))
+                item = registro["produtos"][int(self.ofertas["indice"][linhas[i]])]
+                resultados.append({
+                    "produtor_id": registro["id"],
+                    "produtor_nome": registro["nome"],
+                    "possui_dap": registro.get("possui_dap", False),
+                    "produto_nome": item["nome"],
+                    "categoria": item["categoria"],
+                    "unidade": item["unidade"],
+                    "preco_unitario": float(item["preco_unitario"]),
+                    "preco_com_desconto": int(precos[i]) / 100,
+                    "desconto_proximidade": float(descontos[i]),
+                    "distancia_km": float(distancias[i]),
+                    "score_match": float(scores[i]),
+                })
+        return resultados, len(linhas)
+
+
+class _ObservadorProdutores(Observador):
+    """Registrado depois do catálogo: a posição do produtor já existe."""
+
+    def __init__(self, indice: IndiceOfertas):
+        self.indice = indice
+
+    def limpar(self):
+        self.indice.limpar()
+
+    def adicionar(self, registro: dict):
+        self.indice.adicionar(registro)
+
+    def remover(self, registro: dict):
+        self.indice.remover(registro)
+
+
+_indice: Optional[IndiceOfertas] = None
+_lock = threading.Lock()
+
+
+def obter_indice_ofertas() -> IndiceOfertas:
+    """
+    Retorna o índice de ofertas, criado na primeira chamada e mantido pelas
+    notificações da coleção de produtores.
+    """
+    global _indice
+    if _indice is not None:
+        # Escritas de outros processos chegam pela recarga da coleção
+        obter_catalogo_produtores()
+    else:
+        with _lock:
+            if _indice is None:
+                indice = IndiceOfertas(obter_catalogo_produtores())
+                repositorio.colecao("produtores").observar(_ObservadorProdutores(indice))
+                _indice = indice
+    return _indice
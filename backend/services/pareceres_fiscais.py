@@ -0,0 +1,155 @@
+"""
+Fila de pareceres da IA para as análises de notas fiscais.
+O upload grava a análise das regras (score, risco e status já definidos) e
+só enfileira o id; workers em segundo plano pedem o parecer contextual ao
+GPT e o anexam à análise gravada. O status fica na própria análise
+(`status_parecer`), então pareceres pendentes sobrevivem a reinícios; a
+posse (`PosseRegistros`) garante que só um worker, de um só processo, gera
+cada parecer.
+"""
+import logging
+import queue
+import threading
+from typing import List, Optional
+
+from config import settings
+from storage import repositorio
+from services.ia_fiscalizacao import (
+    PARECER_INDISPONIVEL,
+    PARECER_PENDENTE,
+    anexar_parecer,
+    gerar_parecer_contextual
+)
+from services.posse_registros import PosseRegistros
+
+logger = logging.getLogger(__name__)
+
+COLECAO_ANALISES = "analises_fiscalizacao"
+
+
+class FilaPareceres:
+    """
+    Workers (threads) que consomem ids de análises de uma fila em memória.
+
+    No início, as análises com parecer pendente e livres (sem dono ou com a
+    posse vencida) voltam para a fila; a vigia renova as posses deste
+    processo e retoma as que venceram em outros. Uma falha da IA marca o parecer como indisponível e mantém a justificativa
+    das regras; a análise nunca fica sem justificativa.
+    """
+
+    def __init__(self, workers: int = 2, posse_expiracao_s: float = 120):
+        self.workers = workers
+        self._posse = PosseRegistros(COLECAO_ANALISES, posse_expiracao_s)
+        self._fila: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._parada = threading.Event()
+
+    # ==================== CICLO DE VIDA ====================
+
+    def iniciar(self):
+        """Retoma os pareceres pendentes livres e sobe os workers e a vigia."""
+        pendentes = [
+            analise
+            for analise in repositorio.colecao(COLECAO_ANALISES).filtrar(status_parecer=PARECER_PENDENTE)
+            if self._posse.livre(analise)
+        ]
+        for analise in sorted(pendentes, key=lambda analise: analise["data_analise"]):
+            self._fila.put(analise["id"])
+        if pendentes:
+            logger.info(f"🔍 {len(pendentes)} pareceres fiscais retomados")
+
+        for numero in range(self.workers):
+            thread = threading.Thread(target=self._executar, name=f"parecer-{numero}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        threading.Thread(target=self._vigiar, name="parecer-vigia", daemon=True).start()
+
+    def parar(self):
+        """Sinaliza o fim aos workers (pendentes são retomados no próximo início)."""
+        self._parada.set()
+        for _ in self._threads:
+            self._fila.put(None)
+        self._threads = []
+
+    def _vigiar(self):
+        """Renova as posses deste processo e retoma pareceres de processos que pararam no meio."""
+        while not self._parada.wait(self._posse.expiracao_s / 3):
+            try:
+                self._posse.renovar()
+                for analise in repositorio.colecao(COLECAO_ANALISES).filtrar(status_parecer=PARECER_PENDENTE):
+                    if self._posse.vencida(analise):
+                        self._fila.put(analise["id"])
+            except Exception as e:
+                logger.error(f"❌ Erro na vigia da fila de pareceres: {e}", exc_info=True)
+
+    def submeter(self, analise_id: str):
+        """Coloca na fila a análise (já gravada com parecer pendente)."""
+        self._fila.put(analise_id)
+
+    # ==================== WORKERS ====================
+
+    def _executar(self):
+        while True:
+            analise_id = self._fila.get()
+            if analise_id is None:
+                return
+            try:
+                self._processar(analise_id)
+            except Exception as e:
+                logger.error(f"❌ Erro inesperado no parecer da análise {analise_id}: {e}", exc_info=True)
+
+    def _processar(self, analise_id: str):
+        analise = repositorio.colecao(COLECAO_ANALISES).obter(analise_id)
+        if analise is None or analise.get("status_parecer") != PARECER_PENDENTE:
+            return
+
+        # Só um worker (de qualquer processo) ganha a reivindicação
+        analise = self._posse.reivindicar(analise, {"status_parecer": PARECER_PENDENTE}, {})
+        if analise is None:
+            return
+        try:
+            self._gerar(analise)
+        finally:
+            self._posse.soltar(analise_id)
+
+    def _gerar(self, analise: dict):
+        analise_id = analise["id"]
+        nota = repositorio.colecao("notas_fiscais").obter(analise["nota_fiscal_id"]) or {}
+        try:
+            parecer = gerar_parecer_contextual(
+                {**nota, "escola_id": analise["escola_id"]},
+                analise["alertas"],
+                analise["conformidade_score"]
+            )
+        except Exception as e:
+            logger.warning(f"Erro na análise GPT da análise {analise_id}: {e}")
+            self._posse.atualizar(analise_id, {"status_parecer": PARECER_INDISPONIVEL})
+            return
+
+        self._posse.atualizar(analise_id, anexar_parecer(analise, parecer))
+        logger.info(f"✅ Parecer da IA anexado à análise {analise_id}")
+
+
+_fila: Optional[FilaPareceres] = None
+_lock = threading.Lock()
+
+
+def obter_fila_pareceres() -> FilaPareceres:
+    """Retorna a fila de pareceres, iniciada (workers e pendentes retomados) na primeira chamada."""
+    global _fila
+    if _fila is None:
+        with _lock:
+            if _fila is None:
+                fila = FilaPareceres(settings.parecer_fiscal_workers, settings.filas_posse_expiracao_s)
+                fila.iniciar()
+                _fila = fila
+    return _fila
+
+
+def parar_fila_pareceres():
+    """Para os workers da fila (shutdown da aplicação)."""
+    global _fila
+    with _lock:
+        fila, _fila = _fila, None
+    if fila is not None:
+        fila.parar()
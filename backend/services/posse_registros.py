@@ -0,0 +1,88 @@
+"""
+Posse de registros processados por filas em segundo plano.
+Vários processos da aplicação retomam e consomem as mesmas coleções: antes
+de trabalhar em um registro, o worker o reivindica com uma atualização
+condicional do escritor (compare-and-set), gravando o dono e o prazo da
+posse. Enquanto trabalha, o processo renova o prazo; um registro cujo prazo
+venceu (processo encerrado no meio) pode ser reivindicado por outro.
+"""
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional, Set
+
+from storage import repositorio
+
+CAMPO_DONO = "dono"
+CAMPO_EXPIRACAO = "dono_expira_em"
+
+
+class PosseRegistros:
+    """Reivindicação, renovação e liberação de registros de uma coleção por este processo."""
+
+    def __init__(self, colecao: str, expiracao_s: float):
+        self.colecao = colecao
+        self.expiracao_s = expiracao_s
+        # Único por processo: um reinício não herda as posses da execução anterior
+        self.dono = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._em_andamento: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def _expiracao(self) -> str:
+        return (datetime.now() + timedelta(seconds=self.expiracao_s)).isoformat()
+
+    @staticmethod
+    def vencida(registro: dict) -> bool:
+        """O registro tem dono, mas o prazo da posse já passou."""
+        expira_em = registro.get(CAMPO_EXPIRACAO)
+        return (
+            registro.get(CAMPO_DONO) is not None
+            and (expira_em is None or datetime.fromisoformat(expira_em) < datetime.now())
+        )
+
+    def livre(self, registro: dict) -> bool:
+        """Ninguém detém o registro (sem dono ou posse vencida)."""
+        return registro.get(CAMPO_DONO) is None or self.vencida(registro)
+
+    def reivindicar(self, registro: dict, condicoes: dict, alteracoes: dict) -> Optional[dict]:
+        """
+        Toma posse do registro aplicando `alteracoes`, desde que ele ainda
+        satisfaça `condicoes` e continue com o dono lido em `registro`.
+        Retorna o registro atualizado ou None se outro worker o reivindicou.
+        """
+        if not self.livre(registro):
+            return None
+        atualizado = repositorio.escritor(self.colecao).atualizar(
+            registro["id"],
+            {**alteracoes, CAMPO_DONO: self.dono, CAMPO_EXPIRACAO: self._expiracao()},
+            {
+                **condicoes,
+                CAMPO_DONO: registro.get(CAMPO_DONO),
+                CAMPO_EXPIRACAO: registro.get(CAMPO_EXPIRACAO),
+            }
+        )
+        if atualizado is not None:
+            with self._lock:
+                self._em_andamento.add(registro["id"])
+        return atualizado
+
+    def atualizar(self, registro_id: str, alteracoes: dict) -> Optional[dict]:
+        """Atualiza o registro só se a posse ainda é deste processo (None se a perdeu)."""
+        return repositorio.escritor(self.colecao).atualizar(
+            registro_id, alteracoes, {CAMPO_DONO: self.dono}
+        )
+
+    def soltar(self, registro_id: str):
+        """Para de renovar a posse (o registro chegou a um estado final ou o worker falhou)."""
+        with self._lock:
+            self._em_andamento.discard(registro_id)
+
+    def renovar(self):
+        """Estende o prazo das posses em andamento; as perdidas deixam de ser renovadas."""
+        with self._lock:
+            em_andamento = list(self._em_andamento)
+        for registro_id in em_andamento:
+            if self.atualizar(registro_id, {CAMPO_EXPIRACAO: self._expiracao()}) is None:
+                self.soltar(registro_id)
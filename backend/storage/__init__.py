@@ -0,0 +1,20 @@
+"""
+Inicialização do pacote storage.
+"""
+from .colecao import Colecao, ColecaoJSON, Observador, RegistroDuplicado
+from .escrita import EscritorColecao
+from .journal import ColecaoJournal
+from .sqlite import ColecaoSQLite
+from .repositorio import Repositorio, repositorio
+
+__all__ = [
+    "Colecao",
+    "ColecaoJSON",
+    "ColecaoJournal",
+    "ColecaoSQLite",
+    "EscritorColecao",
+    "Observador",
+    "RegistroDuplicado",
+    "Repositorio",
+    "repositorio",
+]
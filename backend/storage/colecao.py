@@ -0,0 +1,814 @@
+"""
+Coleção de registros em memória com índices hash.
+Base de todas as coleções do repositório: carga do arquivo JSON (ou do
+snapshot binário equivalente), invalidação por assinatura do arquivo e
+índices por campo.
+"""
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from config import settings
+from .snapshot import RegistrosSnapshot, SnapshotBinario, abrir_snapshot, gravar_snapshot
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+# Campos indexados em todas as coleções (quando presentes nos registros)
+CAMPOS_INDEXADOS = ("id", "escola_id", "produtor_id", "status")
+
+# Formato (prefixo, dígitos) dos ids sequenciais gerados na inserção de
+# registros sem id
+FORMATOS_ID = {
+    "pedidos": ("PED", 6),
+    "avaliacoes": ("AV", 6),
+    "consumo_diario": ("REG", 4),
+    "notas_fiscais": ("NF", 5),
+    "jobs_cardapio": ("JOB", 6),
+    "analises_fiscalizacao": ("ANL", 6),
+}
+
+
+def _json_default(valor: Any):
+    """Converte tipos não nativos do JSON (ex: Decimal dos schemas)."""
+    if isinstance(valor, Decimal):
+        return float(valor)
+    raise TypeError(f"Object of type {valor.__class__.__name__} is not JSON serializable")
+
+
+@contextmanager
+def bloqueio_arquivo(caminho: Path):
+    """
+    Lock exclusivo entre processos sobre `caminho` (flock; no Windows,
+    msvcrt.locking no primeiro byte). Bloqueia até obter o lock.
+    """
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    with open(caminho, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+# Filtro de intervalo: (campo, mínimo, máximo), limites inclusivos e opcionais
+Intervalo = Tuple[str, Any, Any]
+
+# Chave de paginação: (valor do campo de ordenação, posição de inserção)
+ChavePagina = Tuple[Any, int]
+
+
+class RegistroDuplicado(ValueError):
+    """Já existe um registro com os mesmos valores em um índice único."""
+
+    def __init__(self, colecao: str, campos: Tuple[str, ...], valores: Tuple[Any, ...]):
+        self.campos = campos
+        self.valores = valores
+        super().__init__(
+            f"Registro duplicado em '{colecao}': "
+            + ", ".join(f"{campo}={valor}" for campo, valor in zip(campos, valores))
+        )
+
+
+def _chave_ordenacao(valor: Any) -> Tuple:
+    """
+    Chave total para ordenar um campo com tipos misturados, na mesma ordem
+    do SQLite: ausente/None < números < textos < demais valores.
+    """
+    if valor is None:
+        return (0,)
+    if isinstance(valor, (int, float, Decimal)):
+        return (1, valor)
+    if isinstance(valor, str):
+        return (2, valor)
+    return (3, str(valor))
+
+
+def _satisfaz(registro: dict, condicoes: Optional[Dict[str, Any]]) -> bool:
+    """Verifica se o registro tem os valores das condições de uma atualização."""
+    return not condicoes or all(registro.get(campo) == valor for campo, valor in condicoes.items())
+
+
+def _no_intervalo(registro: dict, intervalo: Optional[Intervalo]) -> bool:
+    """Verifica se o campo do registro está dentro do intervalo."""
+    if intervalo is None:
+        return True
+    campo, minimo, maximo = intervalo
+    valor = registro.get(campo)
+    if valor is None:
+        return False
+    if minimo is not None and valor < minimo:
+        return False
+    if maximo is not None and valor > maximo:
+        return False
+    return True
+
+
+class Observador:
+    """
+    Recebe as mudanças de uma coleção para manter estruturas derivadas
+    (agregados, índices auxiliares) sem reler a coleção inteira.
+
+    `limpar` antecede uma recarga completa; uma atualização chega como
+    `remover(antigo)` seguido de `adicionar(novo)`.
+    """
+
+    def limpar(self):
+        pass
+
+    def adicionar(self, registro: dict):
+        pass
+
+    def remover(self, registro: dict):
+        pass
+
+
+class Colecao:
+    """
+    Interface comum das coleções do repositório.
+
+    As implementações fornecem `consultar`, `obter`, `contar`, `inserir`,
+    `atualizar` e `aplicar_lote`; os atalhos de leitura são derivados de `consultar`.
+    """
+
+    nome: str
+    _observadores: List[Observador]
+    # Combinações de campos que não podem se repetir entre registros
+    indices_unicos: Tuple[Tuple[str, ...], ...] = ()
+
+    def observar(self, observador: Observador, atuais: bool = True):
+        """
+        Registra um observador e o alimenta com os registros atuais (exceto
+        com `atuais=False`). A partir daí ele recebe todas as mudanças
+        aplicadas à coleção.
+        """
+        if atuais:
+            observador.limpar()
+            for registro in self.consultar():
+                observador.adicionar(registro)
+        self._observadores.append(observador)
+
+    def sincronizar(self):
+        """Incorpora mudanças feitas por outros processos (se houver)."""
+
+    def _notificar_limpeza(self):
+        for observador in self._observadores:
+            observador.limpar()
+
+    def _notificar_adicao(self, registro: dict):
+        for observador in self._observadores:
+            observador.adicionar(registro)
+
+    def _notificar_remocao(self, registro: dict):
+        for observador in self._observadores:
+            observador.remover(registro)
+
+    def dados(self) -> Any:
+        """Retorna o conteúdo bruto da coleção."""
+        return self.todos()
+
+    def consultar(
+        self,
+        filtros: Optional[Dict[str, Any]] = None,
+        intervalo: Optional[Intervalo] = None,
+        ordenar_por: Optional[str] = None,
+        decrescente: bool = False
+    ) -> Iterator[dict]:
+        """
+        Itera sobre os registros que satisfazem filtros de igualdade e,
+        opcionalmente, um intervalo em um campo, na ordem pedida
+        (padrão: ordem de inserção).
+        """
+        raise NotImplementedError
+
+    def obter(self, registro_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def obter_por_chave(self, campos: Tuple[str, ...], valores: Tuple[Any, ...]) -> Optional[dict]:
+        """Busca o registro com os valores dados em um índice único."""
+        return next(self.consultar(dict(zip(campos, valores))), None)
+
+    def contar(self, intervalo: Optional[Intervalo] = None, **filtros) -> int:
+        raise NotImplementedError
+
+    def pagina(
+        self,
+        filtros: Optional[Dict[str, Any]] = None,
+        intervalo: Optional[Intervalo] = None,
+        ordenar_por: Optional[str] = None,
+        decrescente: bool = False,
+        apos: Optional[ChavePagina] = None,
+        limite: Optional[int] = None
+    ) -> Tuple[List[dict], Optional[ChavePagina]]:
+        """
+        Paginação por chave (keyset): retorna até `limite` registros da
+        consulta que vêm depois de `apos`, e a chave do último registro
+        quando ainda há registros seguintes (None na última página).
+        A ordem é a de `consultar`, com empate resolvido pela inserção.
+        """
+        raise NotImplementedError
+
+    def blocos(
+        self,
+        filtros: Optional[Dict[str, Any]] = None,
+        intervalo: Optional[Intervalo] = None,
+        ordenar_por: Optional[str] = None,
+        decrescente: bool = False,
+        apos: Optional[ChavePagina] = None,
+        tamanho: int = 500
+    ) -> Iterator[List[dict]]:
+        """
+        Percorre a consulta (a partir de `apos`) em listas de até `tamanho`
+        registros, na ordem de `pagina`. Padrão: uma página por bloco.
+        """
+        while True:
+            registros, apos = self.pagina(
+                filtros, intervalo, ordenar_por, decrescente, apos=apos, limite=tamanho
+            )
+            yield registros
+            if apos is None:
+                return
+
+    def inserir(self, registro: dict) -> dict:
+        raise NotImplementedError
+
+    def atualizar(self, registro_id: str, alteracoes: dict) -> Optional[dict]:
+        raise NotImplementedError
+
+    def aplicar_lote(self, operacoes: List[dict]) -> List[Optional[dict]]:
+        """
+        Aplica várias inserções/atualizações em um único commit. Inserções
+        sem id recebem o próximo id sequencial da coleção (`FORMATOS_ID`).
+        """
+        raise NotImplementedError
+
+    def todos(self) -> List[dict]:
+        """Retorna todos os registros na ordem de inserção."""
+        return list(self.consultar())
+
+    def iterar(self, **filtros) -> Iterator[dict]:
+        """Itera sobre os registros que satisfazem os filtros de igualdade."""
+        return self.consultar(filtros)
+
+    def filtrar(self, **filtros) -> List[dict]:
+        """Lista os registros que satisfazem os filtros de igualdade."""
+        return list(self.consultar(filtros))
+
+
+class ColecaoJSON(Colecao):
+    """
+    Coleção de registros carregada de um arquivo JSON.
+
+    Mantém os registros em memória com índices hash por campo. Antes de cada
+    acesso verifica a assinatura do arquivo (inode, mtime, tamanho) e recarrega
+    se ele foi alterado externamente.
+
+    Listas de registros ganham um snapshot binário (`<nome>.snap`, ver
+    `storage.snapshot`) a cada gravação do JSON; enquanto ele corresponder
+    ao JSON, a carga só mapeia o arquivo e lê os índices prontos.
+
+    Os registros retornados são compartilhados entre requisições:
+    não devem ser modificados diretamente, use `atualizar`.
+    """
+
+    def __init__(
+        self,
+        nome: str,
+        arquivo: Path,
+        campos_indexados: Tuple[str, ...] = CAMPOS_INDEXADOS,
+        indices_unicos: Tuple[Tuple[str, ...], ...] = ()
+    ):
+        self.nome = nome
+        self.arquivo = arquivo
+        self.arquivo_snapshot = arquivo.with_suffix(".snap")
+        self.arquivo_bloqueio = arquivo.with_suffix(".lock")
+        self.campos_indexados = campos_indexados
+        self.indices_unicos = indices_unicos
+        self.formato_id: Optional[Tuple[str, int]] = FORMATOS_ID.get(nome)
+        self._lock = threading.RLock()
+        self._assinatura: Optional[Tuple[int, int, int]] = None
+        self._carregado = False
+        self._dados: Any = []
+        self._por_id: Dict[str, int] = {}
+        self._indices: Dict[str, Dict[Any, List[int]]] = {}
+        self._unicos: Dict[Tuple[str, ...], Dict[Tuple[Any, ...], int]] = {}
+        # Maior sequência entre os ids carregados (acompanha o índice de id)
+        self._maior_sequencia = 0
+        self._observadores: List[Observador] = []
+        # Profundidade do lock entre processos já obtido por esta thread
+        self._bloqueios = 0
+
+    def sincronizar(self):
+        self._garantir_atualizado()
+
+    def observar(self, observador: Observador, atuais: bool = True):
+        self._garantir_atualizado()
+        with self._lock:
+            super().observar(observador, atuais)
+
+    # ==================== CARGA E INVALIDAÇÃO ====================
+
+    def _assinatura_arquivo(self) -> Optional[Tuple[int, int, int]]:
+        """Retorna (inode, mtime, tamanho) do arquivo ou None se não existir."""
+        try:
+            st = os.stat(self.arquivo)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _garantir_atualizado(self):
+        """Recarrega a coleção se o arquivo mudou desde a última carga."""
+        assinatura = self._assinatura_arquivo()
+        if self._carregado and assinatura == self._assinatura:
+            return
+        with self._lock:
+            assinatura = self._assinatura_arquivo()
+            if self._carregado and assinatura == self._assinatura:
+                return
+            self._carregar(assinatura)
+
+    @contextmanager
+    def _escrita_exclusiva(self):
+        """
+        Seção de escrita: lock da coleção + lock do arquivo entre processos,
+        com a coleção sincronizada com o disco ao entrar. Reentrante na
+        mesma thread (ex: compactação disparada dentro de um lote).
+        """
+        with self._lock:
+            if self._bloqueios:
+                self._bloqueios += 1
+                try:
+                    yield
+                finally:
+                    self._bloqueios -= 1
+                return
+
+            with bloqueio_arquivo(self.arquivo_bloqueio):
+                self._bloqueios = 1
+                try:
+                    self._garantir_atualizado()
+                    yield
+                finally:
+                    self._bloqueios = 0
+
+    def _carregar(self, assinatura: Optional[Tuple[int, int, int]]):
+        """Lê o arquivo (ou o snapshot binário, se válido) e reconstrói os índices."""
+        snapshot = self._abrir_snapshot(assinatura)
+        if snapshot is not None:
+            self._dados = RegistrosSnapshot(snapshot)
+            self._carregar_indices(snapshot)
+        else:
+            if assinatura is None:
+                dados: Any = []
+            else:
+                with open(self.arquivo, "r", encoding="utf-8") as f:
+                    dados = json.load(f)
+            self._dados = dados
+            self._reconstruir_indices()
+            if assinatura is not None:
+                self._gravar_snapshot(assinatura)
+
+        self._assinatura = assinatura
+        self._carregado = True
+        origem = "snapshot" if snapshot is not None else "JSON"
+        logger.debug(f"Coleção '{self.nome}' carregada do {origem} ({len(self._dados)} registros)")
+
+    def _abrir_snapshot(self, assinatura: Optional[Tuple[int, int, int]]) -> Optional[SnapshotBinario]:
+        if assinatura is None or not settings.snapshot_binario:
+            return None
+        campos = [campo for campo in self.campos_indexados if campo != "id"]
+        return abrir_snapshot(self.arquivo_snapshot, assinatura, campos, self.indices_unicos)
+
+    def _carregar_indices(self, snapshot: SnapshotBinario):
+        """Índices lidos prontos do snapshot (sem decodificar os registros)."""
+        self._por_id = snapshot.por_id()
+        self._indices = {
+            campo: snapshot.indice(campo) for campo in self.campos_indexados if campo != "id"
+        }
+        self._unicos = dict(zip(self.indices_unicos, snapshot.unicos()))
+        self._maior_sequencia = 0
+        for registro_id in self._por_id:
+            self._registrar_sequencia(registro_id)
+        self._notificar_limpeza()
+
+        # Observadores precisam dos registros: só então eles são decodificados
+        if self._observadores:
+            for registro in self._dados:
+                self._notificar_adicao(registro)
+
+    def _gravar_snapshot(self, assinatura: Optional[Tuple[int, int, int]] = None):
+        """
+        Grava o snapshot binário correspondente ao JSON com a `assinatura`
+        dada (padrão: a atual do arquivo). Falhas apenas desativam o atalho.
+        """
+        if not settings.snapshot_binario or not isinstance(self._dados, (list, RegistrosSnapshot)):
+            return
+        if isinstance(self._dados, RegistrosSnapshot):
+            # O arquivo mapeado será substituído (no Windows, só depois de fechado)
+            self._dados = self._dados.desmapear()
+        if assinatura is None:
+            assinatura = ColecaoJSON._assinatura_arquivo(self)
+            if assinatura is None:
+                return
+        try:
+            gravar_snapshot(self.arquivo_snapshot, assinatura, self._dados, self._indices, self._unicos)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Snapshot binário de '{self.nome}' não gravado: {e}")
+
+    def _conteudo_json(self) -> Any:
+        """Conteúdo a gravar no arquivo JSON."""
+        if isinstance(self._dados, RegistrosSnapshot):
+            return list(self._dados)
+        return self._dados
+
+    def _reconstruir_indices(self):
+        """Reconstrói todos os índices a partir dos registros atuais."""
+        self._por_id = {}
+        self._indices = {campo: {} for campo in self.campos_indexados if campo != "id"}
+        self._unicos = {campos: {} for campos in self.indices_unicos}
+        self._maior_sequencia = 0
+        self._notificar_limpeza()
+
+        if not isinstance(self._dados, list):
+            return
+
+        for posicao, registro in enumerate(self._dados):
+            self._indexar(posicao, registro)
+
+    def _indexar(self, posicao: int, registro: dict):
+        """Adiciona um registro aos índices (e notifica os observadores)."""
+        self._notificar_adicao(registro)
+        registro_id = registro.get("id")
+        if registro_id is not None:
+            self._por_id[registro_id] = posicao
+            self._registrar_sequencia(registro_id)
+
+        for campo, indice in self._indices.items():
+            valor = registro.get(campo)
+            if valor is not None:
+                indice.setdefault(valor, []).append(posicao)
+
+        # Índices únicos: a unicidade é verificada na escrita (aplicar_lote);
+        # aqui apenas se registra a chave (dados antigos podem ter repetições)
+        for campos, indice in self._unicos.items():
+            indice[tuple(registro.get(campo) for campo in campos)] = posicao
+
+    def _registrar_sequencia(self, registro_id: Any):
+        """Atualiza a maior sequência com um id no formato da coleção."""
+        if self.formato_id is None or not isinstance(registro_id, str):
+            return
+        prefixo = self.formato_id[0]
+        sufixo = registro_id[len(prefixo):]
+        if registro_id.startswith(prefixo) and sufixo.isdigit():
+            self._maior_sequencia = max(self._maior_sequencia, int(sufixo))
+
+    def _desindexar(self, posicao: int, registro: dict):
+        """Remove um registro dos índices, exceto o de id (e notifica os observadores)."""
+        self._notificar_remocao(registro)
+        for campo, indice in self._indices.items():
+            valor = registro.get(campo)
+            if valor is None:
+                continue
+            posicoes = indice.get(valor, [])
+            if posicao in posicoes:
+                posicoes.remove(posicao)
+            if not posicoes:
+                indice.pop(valor, None)
+
+        for campos, indice in self._unicos.items():
+            chave = tuple(registro.get(campo) for campo in campos)
+            if indice.get(chave) == posicao:
+                del indice[chave]
+
+    def _persistir(self):
+        """Grava a coleção inteira no arquivo JSON."""
+        self.arquivo.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.arquivo, "w", encoding="utf-8") as f:
+            json.dump(self._conteudo_json(), f, ensure_ascii=False, indent=2, default=_json_default)
+        self._assinatura = self._assinatura_arquivo()
+        self._gravar_snapshot()
+
+    # ==================== LEITURA ====================
+
+    def dados(self) -> Any:
+        """Retorna o conteúdo bruto do arquivo (lista ou dicionário)."""
+        self._garantir_atualizado()
+        return self._dados
+
+    def todos(self) -> List[dict]:
+        """Retorna todos os registros na ordem do arquivo."""
+        self._garantir_atualizado()
+        return list(self._dados)
+
+    def obter(self, registro_id: str) -> Optional[dict]:
+        """Busca um registro pelo id em O(1)."""
+        self._garantir_atualizado()
+        with self._lock:
+            posicao = self._por_id.get(registro_id)
+            return self._dados[posicao] if posicao is not None else None
+
+    def obter_por_chave(self, campos: Tuple[str, ...], valores: Tuple[Any, ...]) -> Optional[dict]:
+        """Busca em O(1) quando `campos` é um índice único da coleção."""
+        if campos not in self._unicos:
+            return super().obter_por_chave(campos, valores)
+        self._garantir_atualizado()
+        with self._lock:
+            posicao = self._unicos[campos].get(tuple(valores))
+            return self._dados[posicao] if posicao is not None else None
+
+    def _posicoes(self, filtros: Dict[str, Any]) -> Optional[List[int]]:
+        """
+        Resolve as posições candidatas usando os índices disponíveis.
+        Retorna None quando nenhum filtro é indexado (varredura completa).
+        """
+        candidatas: Optional[List[int]] = None
+        for campo, valor in filtros.items():
+            if campo == "id":
+                posicao = self._por_id.get(valor)
+                posicoes = [posicao] if posicao is not None else []
+            elif campo in self._indices:
+                posicoes = self._indices[campo].get(valor, [])
+            else:
+                continue
+            if candidatas is None or len(posicoes) < len(candidatas):
+                candidatas = posicoes
+        return candidatas
+
+    def consultar(
+        self,
+        filtros: Optional[Dict[str, Any]] = None,
+        intervalo: Optional[Intervalo] = None,
+        ordenar_por: Optional[str] = None,
+        decrescente: bool = False
+    ) -> Iterator[dict]:
+        """
+        Filtros em campos indexados são resolvidos pelo índice; os demais
+        critérios são verificados apenas sobre os candidatos.
+        """
+        selecionados = self._selecionar(filtros or {}, intervalo, ordenar_por, decrescente)
+        return (registro for _, registro in selecionados)
+
+    def _selecionar(
+        self,
+        filtros: Dict[str, Any],
+        intervalo: Optional[Intervalo],
+        ordenar_por: Optional[str],
+        decrescente: bool
+    ) -> List[Tuple[int, dict]]:
+        """Pares (posição, registro) que satisfazem a consulta, já ordenados."""
+        self._garantir_atualizado()
+        with self._lock:
+            posicoes = self._posicoes(filtros)
+            if posicoes is None:
+                candidatos = list(enumerate(self._dados))
+            else:
+                candidatos = [(p, self._dados[p]) for p in sorted(posicoes)]
+
+        selecionados = [
+            (posicao, registro) for posicao, registro in candidatos
+            if all(registro.get(campo) == valor for campo, valor in filtros.items())
+            and _no_intervalo(registro, intervalo)
+        ]
+
+        if ordenar_por is not None:
+            # sort é estável (também com reverse): empates mantêm a ordem de inserção
+            selecionados.sort(key=lambda par: _chave_ordenacao(par[1].get(ordenar_por)), reverse=decrescente)
+        return selecionados
+
+    @staticmethod
+    def _inicio_apos(
+        selecionados: List[Tuple[int, dict]],
+        ordenar_por: Optional[str],
+        decrescente: bool,
+        apos: Optional[ChavePagina]
+    ) -> int:
+        """
+        Índice do primeiro par de `selecionados` (já ordenado) que vem depois
+        de `apos`, por busca binária: "vem depois" é falso até certo ponto
+        da lista e verdadeiro daí em diante.
+        """
+        if apos is None:
+            return 0
+        valor_apos, posicao_apos = apos
+        chave_apos = _chave_ordenacao(valor_apos)
+
+        def depois(par: Tuple[int, dict]) -> bool:
+            posicao, registro = par
+            if ordenar_por is None:
+                return posicao > posicao_apos
+            chave = _chave_ordenacao(registro.get(ordenar_por))
+            if chave == chave_apos:
+                return posicao > posicao_apos
+            return chave < chave_apos if decrescente else chave > chave_apos
+
+        inicio, fim = 0, len(selecionados)
+        while inicio < fim:
+            meio = (inicio + fim) // 2
+            if depois(selecionados[meio]):
+                fim = meio
+            else:
+                inicio = meio + 1
+        return inicio
+
+    def pagina(
+        self,
+        filtros: Optional[Dict[str, Any]] = None,
+        intervalo: Optional[Intervalo] = None,
+        ordenar_por: Optional[str] = None,
+        decrescente: bool = False,
+        apos: Optional[ChavePagina] = None,
+        limite: Optional[int] = None
+    ) -> Tuple[List[dict], Optional[ChavePagina]]:
+        selecionados = self._selecionar(filtros or {}, intervalo, ordenar_por, decrescente)
+        inicio = self._inicio_apos(selecionados, ordenar_por, decrescente, apos)
+
+        if limite is None or len(selecionados) - inicio <= limite:
+            return [registro for _, registro in selecionados[inicio:]], None
+        pagina = selecionados[inicio:inicio + limite]
+        posicao, registro = pagina[-1]
+        return [registro for _, registro in pagina], (registro.get(ordenar_por) if ordenar_por else None, posicao)
+
+    def blocos(
+        self,
+        filtros: Optional[Dict[str, Any]] = None,
+        intervalo: Optional[Intervalo] = None,
+        ordenar_por: Optional[str] = None,
+        decrescente: bool = False,
+        apos: Optional[ChavePagina] = None,
+        tamanho: int = 500
+    ) -> Iterator[List[dict]]:
+        """Seleciona e ordena uma única vez e entrega a lista em fatias."""
+        selecionados = self._selecionar(filtros or {}, intervalo, ordenar_por, decrescente)
+        inicio = self._inicio_apos(selecionados, ordenar_por, decrescente, apos)
+        for fatia in range(inicio, len(selecionados), tamanho):
+            yield [registro for _, registro in selecionados[fatia:fatia + tamanho]]
+
+    def contar(self, intervalo: Optional[Intervalo] = None, **filtros) -> int:
+        """
+        Conta registros que satisfazem os filtros. Um único filtro indexado
+        (sem intervalo) é respondido pelo tamanho do bucket do índice.
+        """
+        self._garantir_atualizado()
+        if intervalo is None:
+            if not filtros:
+                return len(self._dados)
+            if len(filtros) == 1:
+                (campo, valor), = filtros.items()
+                if campo in self._indices:
+                    with self._lock:
+                        return len(self._indices[campo].get(valor, ()))
+        return len(self._selecionar(filtros, intervalo, None, False))
+
+    def valores(self, campo: str) -> List[Any]:
+        """Lista os valores distintos de um campo indexado."""
+        self._garantir_atualizado()
+        with self._lock:
+            if campo == "id":
+                return list(self._por_id.keys())
+            return list(self._indices.get(campo, {}).keys())
+
+    # ==================== ESCRITA ====================
+
+    def _substituir(self, posicao: int, registro: dict):
+        """Troca o registro de uma posição mantendo os índices consistentes."""
+        self._desindexar(posicao, self._dados[posicao])
+        self._dados[posicao] = registro
+        self._indexar(posicao, registro)
+
+    def _aplicar_insercao(self, registro: dict):
+        """
+        Reaplica uma inserção do journal: se o id já existir, substitui o
+        registro (reaplicação idempotente). Escritas novas usam `_inserir_novo`.
+        """
+        posicao = self._por_id.get(registro.get("id"))
+        if posicao is not None:
+            self._substituir(posicao, registro)
+            return
+
+        self._dados.append(registro)
+        self._indexar(len(self._dados) - 1, registro)
+
+    def _inserir_novo(self, registro: dict):
+        """
+        Insere um registro novo; um id já existente é RegistroDuplicado.
+        Sem id, recebe o sucessor do maior id da coleção já sincronizada.
+        """
+        if registro.get("id") is None and self.formato_id is not None:
+            prefixo, digitos = self.formato_id
+            registro["id"] = f"{prefixo}{self._maior_sequencia + 1:0{digitos}d}"
+        registro_id = registro.get("id")
+        if registro_id is not None and registro_id in self._por_id:
+            raise RegistroDuplicado(self.nome, ("id",), (registro_id,))
+        self._verificar_unicidade(registro)
+        self._dados.append(registro)
+        self._indexar(len(self._dados) - 1, registro)
+
+    def _desfazer_insercao(self, registro: dict):
+        """Reverte `_inserir_novo` quando a persistência falha."""
+        posicao = len(self._dados) - 1
+        self._desindexar(posicao, registro)
+        self._por_id.pop(registro.get("id"), None)
+        self._dados.pop()
+
+    def _aplicar_atualizacao(self, registro_id: str, alteracoes: dict) -> Optional[dict]:
+        """Aplica alterações em memória. Retorna o novo registro ou None."""
+        posicao = self._por_id.get(registro_id)
+        if posicao is None:
+            return None
+        novo = {**self._dados[posicao], **alteracoes}
+        self._substituir(posicao, novo)
+        return novo
+
+    def _persistir_lote(self, operacoes: List[dict]):
+        """Grava um lote de operações no disco (reescreve o arquivo inteiro)."""
+        self._persistir()
+
+    def aplicar_lote(self, operacoes: List[dict]) -> List[Optional[dict]]:
+        """
+        Aplica um lote de operações e persiste tudo em uma única gravação.
+
+        Operações no formato `{"op": "inserir", "registro": ...}` ou
+        `{"op": "atualizar", "id": ..., "alteracoes": ...}`; uma atualização
+        com `"condicoes": {campo: valor}` só é aplicada se o registro atual
+        tiver esses valores (compare-and-set). Retorna o registro resultante
+        de cada operação (None para id inexistente ou condição não atendida).
+        Inserções sem id recebem o próximo id sequencial (`FORMATOS_ID`).
+        Se a gravação falhar, nenhuma operação do lote permanece aplicada.
+
+        Todo o lote (sincronização, aplicação e gravação) ocorre sob o lock
+        do arquivo, então escritas de outros processos não se perdem.
+        """
+        with self._escrita_exclusiva():
+            resultados: List[Optional[dict]] = []
+            aplicadas: List[dict] = []
+            desfazer = []
+            try:
+                for operacao in operacoes:
+                    if operacao["op"] == "inserir":
+                        registro = operacao["registro"]
+                        self._inserir_novo(registro)
+                        desfazer.append(lambda r=registro: self._desfazer_insercao(r))
+                        resultados.append(registro)
+                        aplicadas.append(operacao)
+                        continue
+
+                    posicao = self._por_id.get(operacao["id"])
+                    if posicao is None or not _satisfaz(self._dados[posicao], operacao.get("condicoes")):
+                        resultados.append(None)
+                        continue
+                    antigo = self._dados[posicao]
+                    self._verificar_unicidade({**antigo, **operacao["alteracoes"]})
+                    resultados.append(self._aplicar_atualizacao(operacao["id"], operacao["alteracoes"]))
+                    desfazer.append(lambda p=posicao, a=antigo: self._substituir(p, a))
+                    # As condições já foram verificadas: o journal guarda só a alteração
+                    aplicadas.append({"op": "atualizar", "id": operacao["id"], "alteracoes": operacao["alteracoes"]})
+
+                if aplicadas:
+                    self._persistir_lote(aplicadas)
+            except Exception:
+                for acao in reversed(desfazer):
+                    acao()
+                raise
+        return resultados
+
+    def _verificar_unicidade(self, registro: dict):
+        """Levanta RegistroDuplicado se outro registro ocupa a chave única."""
+        for campos, indice in self._unicos.items():
+            valores = tuple(registro.get(campo) for campo in campos)
+            posicao = indice.get(valores)
+            if posicao is not None and self._dados[posicao].get("id") != registro.get("id"):
+                raise RegistroDuplicado(self.nome, campos, valores)
+
+    def inserir(self, registro: dict) -> dict:
+        """Adiciona um registro e persiste a coleção."""
+        return self.aplicar_lote([{"op": "inserir", "registro": registro}])[0]
+
+    def atualizar(self, registro_id: str, alteracoes: dict) -> Optional[dict]:
+        """
+        Substitui um registro por uma cópia com as alterações aplicadas.
+        Retorna o novo registro ou None se o id não existir.
+        """
+        return self.aplicar_lote([{"op": "atualizar", "id": registro_id, "alteracoes": alteracoes}])[0]
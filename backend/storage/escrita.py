@@ -0,0 +1,173 @@
+"""
+Escritor único por coleção com group commit.
+As escritas dos routers entram em uma fila; uma thread por coleção junta as
+operações que chegam dentro de poucos milissegundos e grava todas em um
+único commit durável. Cada requisição só é respondida após esse commit.
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, List, Optional, Set, Tuple
+
+from config import settings
+from .colecao import Colecao, RegistroDuplicado
+
+logger = logging.getLogger(__name__)
+
+class EscritorColecao:
+    """
+    Fila de escrita de uma coleção, consumida por uma única thread.
+
+    - Inserções e atualizações são enfileiradas e confirmadas em lote
+      (`Colecao.aplicar_lote`): uma gravação + fsync por lote
+    - Ids sequenciais são atribuídos pela coleção dentro do commit, a partir
+      do maior id gravado, então nunca colidem entre requisições nem entre
+      processos
+    - Os índices únicos da coleção são verificados na própria thread, sem a
+      janela entre checagem e gravação; só a operação duplicada é rejeitada
+    """
+
+    def __init__(self, colecao: Colecao):
+        self.colecao = colecao
+        self._fila: "queue.Queue[Tuple[dict, Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    # ==================== API ====================
+
+    def enfileirar_insercao(self, registro: dict) -> Future:
+        """
+        Enfileira uma inserção. Sem `id` no registro, um id sequencial é
+        gerado. Falha com RegistroDuplicado se violar um índice único.
+        """
+        return self._enfileirar({"op": "inserir", "registro": registro})
+
+    def enfileirar_atualizacao(
+        self,
+        registro_id: str,
+        alteracoes: dict,
+        condicoes: Optional[dict] = None
+    ) -> Future:
+        """
+        Enfileira uma atualização parcial de um registro. Com `condicoes`,
+        ela só é aplicada se o registro ainda tiver esses valores no commit
+        (senão o resultado é None), inclusive entre processos.
+        """
+        operacao = {"op": "atualizar", "id": registro_id, "alteracoes": alteracoes}
+        if condicoes is not None:
+            operacao["condicoes"] = condicoes
+        return self._enfileirar(operacao)
+
+    def inserir(self, registro: dict) -> dict:
+        """Insere e aguarda o commit (endpoints síncronos)."""
+        return self.enfileirar_insercao(registro).result()
+
+    def atualizar(
+        self,
+        registro_id: str,
+        alteracoes: dict,
+        condicoes: Optional[dict] = None
+    ) -> Optional[dict]:
+        """Atualiza e aguarda o commit (endpoints síncronos)."""
+        return self.enfileirar_atualizacao(registro_id, alteracoes, condicoes).result()
+
+    async def inserir_async(self, registro: dict) -> dict:
+        """Insere e aguarda o commit sem bloquear o event loop."""
+        return await asyncio.wrap_future(self.enfileirar_insercao(registro))
+
+    async def atualizar_async(self, registro_id: str, alteracoes: dict) -> Optional[dict]:
+        """Atualiza e aguarda o commit sem bloquear o event loop."""
+        return await asyncio.wrap_future(self.enfileirar_atualizacao(registro_id, alteracoes))
+
+    # ==================== THREAD ESCRITORA ====================
+
+    def _enfileirar(self, operacao: dict) -> Future:
+        self._iniciar()
+        futuro: Future = Future()
+        self._fila.put((operacao, futuro))
+        return futuro
+
+    def _iniciar(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._executar, name=f"escritor-{self.colecao.nome}", daemon=True
+                )
+                self._thread.start()
+
+    def _executar(self):
+        while True:
+            self._processar_lote(self._coletar_lote())
+
+    def _coletar_lote(self) -> List[Tuple[dict, Future]]:
+        """
+        Bloqueia até a primeira operação e junta as que chegarem durante a
+        janela de group commit (ou até atingir o tamanho máximo do lote).
+        """
+        lote = [self._fila.get()]
+        limite = time.monotonic() + settings.escrita_janela_ms / 1000
+        while len(lote) < settings.escrita_lote_maximo:
+            restante = limite - time.monotonic()
+            try:
+                item = self._fila.get(timeout=restante) if restante > 0 else self._fila.get_nowait()
+            except queue.Empty:
+                break
+            lote.append(item)
+        return lote
+
+    def _processar_lote(self, lote: List[Tuple[dict, Future]]):
+        operacoes: List[dict] = []
+        futuros: List[Future] = []
+        chaves_no_lote: Set[Tuple[Any, ...]] = set()
+
+        for operacao, futuro in lote:
+            if not futuro.set_running_or_notify_cancel():
+                continue
+            try:
+                if operacao["op"] == "inserir":
+                    self._verificar_unicidade(operacao["registro"], chaves_no_lote)
+            except Exception as e:
+                futuro.set_exception(e)
+                continue
+            operacoes.append(operacao)
+            futuros.append(futuro)
+
+        if not operacoes:
+            return
+
+        try:
+            resultados = self.colecao.aplicar_lote(operacoes)
+        except Exception as e:
+            logger.error(f"❌ Falha no commit de {len(operacoes)} operações em '{self.colecao.nome}': {e}")
+            for futuro in futuros:
+                futuro.set_exception(e)
+            return
+
+        if len(operacoes) > 1:
+            logger.debug(f"Group commit em '{self.colecao.nome}': {len(operacoes)} operações")
+        for futuro, resultado in zip(futuros, resultados):
+            futuro.set_result(resultado)
+
+    def _verificar_unicidade(self, registro: dict, chaves_no_lote: Set[Tuple[Any, ...]]):
+        """
+        Rejeita o registro se ele repetir o id ou a chave de um índice único,
+        já gravados ou usados por outra inserção do mesmo lote.
+        """
+        registro_id = registro.get("id")
+        if registro_id is not None:
+            chave = (("id",), registro_id)
+            if chave in chaves_no_lote or self.colecao.obter(registro_id) is not None:
+                raise RegistroDuplicado(self.colecao.nome, ("id",), (registro_id,))
+            chaves_no_lote.add(chave)
+        for campos in self.colecao.indices_unicos:
+            valores = tuple(registro.get(campo) for campo in campos)
+            chave = (campos,) + valores
+            existente = self.colecao.obter_por_chave(campos, valores)
+            if chave in chaves_no_lote or (existente is not None and existente.get("id") != registro.get("id")):
+                raise RegistroDuplicado(self.colecao.nome, campos, valores)
+            chaves_no_lote.add(chave)
@@ -0,0 +1,181 @@
+"""
+Coleções com journal append-only.
+Cada escrita vira uma linha em `<nome>.journal.jsonl`; o arquivo `<nome>.json`
+passa a ser o snapshot, reescrito apenas na compactação periódica.
+"""
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+from config import settings
+from .colecao import CAMPOS_INDEXADOS, ColecaoJSON, _json_default
+
+logger = logging.getLogger(__name__)
+
+
+class ColecaoJournal(ColecaoJSON):
+    """
+    Coleção transacional persistida como snapshot + journal.
+
+    - Inserção/atualização: uma linha JSON anexada ao journal (O(1) no disco);
+      um lote de operações é gravado com uma única escrita + fsync
+    - Carga: snapshot + reaplicação do journal
+    - Outros processos: apenas o trecho novo do journal é relido
+    - Compactação: após `journal_compactar_apos` entradas o snapshot é
+      regravado de forma atômica e o journal é zerado
+    - Vários processos: sincronização, anexo e compactação ocorrem sob o
+      lock do arquivo `<nome>.lock`, então uma compactação nunca descarta
+      entradas anexadas por outro processo
+
+    A reaplicação é idempotente (inserções com id existente substituem o
+    registro), então uma queda entre a troca do snapshot e o truncamento do
+    journal não duplica registros.
+    """
+
+    def __init__(
+        self,
+        nome: str,
+        arquivo: Path,
+        campos_indexados: Tuple[str, ...] = CAMPOS_INDEXADOS,
+        indices_unicos: Tuple[Tuple[str, ...], ...] = ()
+    ):
+        super().__init__(nome, arquivo, campos_indexados, indices_unicos)
+        self.arquivo_journal = arquivo.with_suffix(".journal.jsonl")
+        self._offset_journal = 0
+        self._entradas_journal = 0
+
+    # ==================== CARGA ====================
+
+    @staticmethod
+    def _stat(caminho: Path) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(caminho)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _assinatura_arquivo(self) -> Optional[Tuple[Any, Any]]:
+        """Assinatura combinada de snapshot e journal."""
+        return (self._stat(self.arquivo), self._stat(self.arquivo_journal))
+
+    def _carregar(self, assinatura):
+        """
+        Recarrega snapshot + journal, ou apenas o final do journal quando o
+        snapshot não mudou e o journal só cresceu (escrita de outro processo).
+        """
+        snapshot, journal = assinatura
+
+        if self._carregado and self._assinatura is not None:
+            snapshot_anterior, journal_anterior = self._assinatura
+            so_cresceu = (
+                snapshot == snapshot_anterior
+                and journal is not None
+                and journal_anterior is not None
+                and journal[0] == journal_anterior[0]
+                and journal[2] >= self._offset_journal
+            )
+            if so_cresceu:
+                self._reaplicar_journal(self._offset_journal)
+                self._assinatura = assinatura
+                return
+
+        super()._carregar(snapshot)
+        self._offset_journal = 0
+        self._entradas_journal = 0
+        self._reaplicar_journal(0)
+        self._assinatura = assinatura
+
+        if self._entradas_journal:
+            logger.info(
+                f"Coleção '{self.nome}' reconstruída: snapshot + {self._entradas_journal} entradas do journal"
+            )
+
+    def _reaplicar_journal(self, offset: int):
+        """Reaplica as entradas do journal a partir de `offset` (em bytes)."""
+        if not self.arquivo_journal.exists():
+            return
+
+        with open(self.arquivo_journal, "rb") as f:
+            f.seek(offset)
+            conteudo = f.read()
+
+        # Uma última linha sem '\n' é uma escrita interrompida: ignorar
+        fim = conteudo.rfind(b"\n") + 1
+        for linha in conteudo[:fim].splitlines():
+            if not linha.strip():
+                continue
+            try:
+                entrada = json.loads(linha)
+            except json.JSONDecodeError:
+                logger.warning(f"Entrada corrompida ignorada no journal de '{self.nome}'")
+                continue
+            self._aplicar_entrada(entrada)
+            self._entradas_journal += 1
+
+        self._offset_journal = offset + fim
+
+    def _aplicar_entrada(self, entrada: dict):
+        """Aplica em memória uma entrada do journal."""
+        if entrada.get("op") == "inserir":
+            self._aplicar_insercao(entrada["registro"])
+        elif entrada.get("op") == "atualizar":
+            self._aplicar_atualizacao(entrada["id"], entrada["alteracoes"])
+
+    # ==================== ESCRITA ====================
+
+    def _anexar(self, *entradas: dict):
+        """
+        Anexa entradas ao journal com uma única escrita (e fsync). Roda sob o
+        lock entre processos com o journal já sincronizado: bytes depois de
+        `_offset_journal` são o resto de uma escrita interrompida e são
+        descartados, senão colariam na primeira entrada nova.
+        """
+        bloco = b"".join(
+            json.dumps(entrada, ensure_ascii=False, default=_json_default).encode("utf-8") + b"\n"
+            for entrada in entradas
+        )
+
+        self.arquivo_journal.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.arquivo_journal, "ab") as f:
+            if f.seek(0, os.SEEK_END) > self._offset_journal:
+                f.truncate(self._offset_journal)
+            f.write(bloco)
+            f.flush()
+            if settings.journal_fsync:
+                os.fsync(f.fileno())
+
+        self._offset_journal += len(bloco)
+        self._entradas_journal += len(entradas)
+        self._assinatura = self._assinatura_arquivo()
+
+        if self._entradas_journal >= settings.journal_compactar_apos:
+            self.compactar()
+
+    def _persistir_lote(self, operacoes: List[dict]):
+        # As operações já estão no formato das entradas do journal
+        self._anexar(*operacoes)
+
+    def compactar(self):
+        """
+        Grava um novo snapshot com o estado atual e zera o journal.
+        O snapshot é escrito em arquivo temporário e trocado com os.replace;
+        a coleção é sincronizada antes, sob o lock entre processos.
+        """
+        with self._escrita_exclusiva():
+            temporario = self.arquivo.with_suffix(".json.tmp")
+            with open(temporario, "w", encoding="utf-8") as f:
+                json.dump(self._conteudo_json(), f, ensure_ascii=False, indent=2, default=_json_default)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporario, self.arquivo)
+            self._gravar_snapshot()
+
+            with open(self.arquivo_journal, "wb"):
+                pass
+
+            logger.info(f"🗜️ Journal de '{self.nome}' compactado ({self._entradas_journal} entradas)")
+            self._offset_journal = 0
+            self._entradas_journal = 0
+            self._assinatura = self._assinatura_arquivo()
@@ -0,0 +1,45 @@
+"""
+Migração dos arquivos JSON de `data/` para o banco SQLite.
+
+Uso:
+    python -m storage.migracao [caminho_do_banco]
+
+Lê cada coleção pelo backend JSON (snapshot + journal) e grava no SQLite.
+Pode ser executada novamente: registros com o mesmo id são substituídos.
+"""
+import logging
+import sys
+from pathlib import Path
+
+from .repositorio import DATA_DIR, SQLITE_PADRAO, Repositorio
+from .sqlite import ESQUEMAS, BancoSQLite, ColecaoSQLite
+
+logger = logging.getLogger(__name__)
+
+
+def migrar_json_para_sqlite(caminho_banco: Path = SQLITE_PADRAO, data_dir: Path = DATA_DIR) -> dict:
+    """
+    Importa as coleções suportadas pelo backend SQLite.
+
+    Returns:
+        Dicionário {coleção: registros importados}
+    """
+    origem = Repositorio(data_dir, backend="json")
+    banco = BancoSQLite(caminho_banco)
+    resumo = {}
+
+    for nome in ESQUEMAS:
+        registros = origem.colecao(nome).todos()
+        ColecaoSQLite(nome, banco).inserir_varios(registros)
+        resumo[nome] = len(registros)
+        logger.info(f"✅ {nome}: {len(registros)} registros importados")
+
+    return resumo
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    destino = Path(sys.argv[1]) if len(sys.argv) > 1 else SQLITE_PADRAO
+    print(f"📦 Migrando {DATA_DIR} → {destino}")
+    resumo = migrar_json_para_sqlite(destino)
+    print(f"✅ Migração concluída: {sum(resumo.values())} registros em {len(resumo)} coleções")
@@ -0,0 +1,118 @@
+"""
+Repositório de dados em memória com índices.
+Carrega cada arquivo JSON de `data/` uma única vez e mantém índices hash
+por campo, recarregando automaticamente quando o arquivo muda no disco.
+
+Com STORAGE_BACKEND=sqlite as coleções transacionais e os cadastros passam
+a ser servidos por um banco SQLite (ver `storage.sqlite`); os demais
+arquivos de referência continuam em JSON.
+"""
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from config import settings
+from .colecao import CAMPOS_INDEXADOS, Colecao, ColecaoJSON
+from .escrita import EscritorColecao
+from .journal import ColecaoJournal
+from .sqlite import ESQUEMAS, BancoSQLite, ColecaoSQLite
+
+logger = logging.getLogger(__name__)
+
+# Caminho para os dados
+DATA_DIR = Path(__file__).parent.parent / "data"
+
+# Banco SQLite padrão (quando STORAGE_BACKEND=sqlite)
+SQLITE_PADRAO = DATA_DIR / "conecta_merenda.db"
+
+# Coleções transacionais gravadas em journal append-only
+COLECOES_JOURNAL = {
+    "pedidos",
+    "avaliacoes",
+    "feedbacks",
+    "consumo_diario",
+    "notas_fiscais",
+    "analises_fiscalizacao",
+    "jobs_cardapio",
+}
+
+# Índices únicos por coleção (combinações que não podem se repetir)
+INDICES_UNICOS = {
+    "notas_fiscais": (("escola_id", "numero_nota"),),
+}
+
+# Índices adicionais por coleção
+INDICES_EXTRAS = {
+    "avaliacoes": ("pedido_id",),
+    "consumo_diario": ("professor_id",),
+    "analises_fiscalizacao": ("nota_fiscal_id", "status_parecer"),
+}
+
+
+class Repositorio:
+    """
+    Ponto único de acesso às coleções de dados.
+    Cada coleção é criada sob demanda e compartilhada por todos os routers.
+    """
+
+    def __init__(self, data_dir: Path = DATA_DIR, backend: Optional[str] = None):
+        self.data_dir = data_dir
+        self.backend = backend or settings.storage_backend
+        self._colecoes: Dict[str, Colecao] = {}
+        self._escritores: Dict[str, EscritorColecao] = {}
+        self._lock = threading.Lock()
+        self._banco: Optional[BancoSQLite] = None
+
+        if self.backend == "sqlite":
+            caminho = Path(settings.sqlite_path) if settings.sqlite_path else data_dir / SQLITE_PADRAO.name
+            self._banco = BancoSQLite(caminho)
+        elif self.backend != "json":
+            raise ValueError(f"Backend de armazenamento desconhecido: {self.backend}")
+
+    def _criar_colecao(self, nome: str) -> Colecao:
+        """Escolhe a implementação da coleção conforme o backend configurado."""
+        if self._banco is not None and nome in ESQUEMAS:
+            return ColecaoSQLite(nome, self._banco)
+
+        campos = CAMPOS_INDEXADOS + INDICES_EXTRAS.get(nome, ())
+        classe = ColecaoJournal if nome in COLECOES_JOURNAL else ColecaoJSON
+        return classe(nome, self.data_dir / f"{nome}.json", campos, INDICES_UNICOS.get(nome, ()))
+
+    def colecao(self, nome: str) -> Colecao:
+        """Retorna a coleção associada a `data/<nome>.json`."""
+        colecao = self._colecoes.get(nome)
+        if colecao is None:
+            with self._lock:
+                colecao = self._colecoes.get(nome)
+                if colecao is None:
+                    colecao = self._criar_colecao(nome)
+                    self._colecoes[nome] = colecao
+        return colecao
+
+    def escritor(self, nome: str) -> EscritorColecao:
+        """
+        Retorna o escritor (fila de group commit) da coleção.
+        Escritas concorrentes de uma mesma coleção devem passar por ele.
+        """
+        escritor = self._escritores.get(nome)
+        if escritor is None:
+            colecao = self.colecao(nome)
+            with self._lock:
+                escritor = self._escritores.get(nome)
+                if escritor is None:
+                    escritor = EscritorColecao(colecao)
+                    self._escritores[nome] = escritor
+        return escritor
+
+    def carregar_todos(self):
+        """Carrega todas as coleções de `data/` (chamado no startup)."""
+        for arquivo in sorted(self.data_dir.glob("*.json")):
+            colecao = self.colecao(arquivo.stem)
+            if isinstance(colecao, ColecaoJSON):
+                colecao.dados()
+        logger.info(f"📦 Repositório carregado: {len(self._colecoes)} coleções")
+
+
+# Instância global do repositório
+repositorio = Repositorio()
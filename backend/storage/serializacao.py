@@ -0,0 +1,136 @@
+"""
+Cache de serialização dos registros do repositório.
+Cada registro é validado pelo response model uma única vez e guardado como
+bytes JSON; as listagens juntam esses bytes sem validar tudo de novo.
+"""
+import json
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+from config import settings
+from .colecao import Colecao, Observador
+
+
+class CacheSerializacao:
+    """
+    Bytes JSON por id de registro para um response model e uma coleção.
+
+    O cache observa a coleção: cada escrita (ou recarga) descarta as
+    entradas afetadas, então um acerto não precisa comparar o registro.
+    Escritas de outros processos chegam como nos demais observadores.
+    """
+
+    def __init__(self, modelo: Type[BaseModel]):
+        self.modelo = modelo
+        self._cache: Dict[Any, bytes] = {}
+        # Conta os descartes: validação concorrente a uma escrita não grava
+        self._geracao = 0
+        self._sufixos: Dict[Tuple[str, ...], Optional[bytes]] = {}
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def serializar(self, registro: dict) -> bytes:
+        """JSON do registro validado pelo modelo (do cache quando possível)."""
+        chave = registro.get("id")
+        dados = self._cache.get(chave) if chave is not None else None
+        if dados is not None:
+            self.acertos += 1
+            return dados
+
+        self.falhas += 1
+        geracao = self._geracao
+        dados = self.modelo.model_validate(registro).model_dump_json().encode("utf-8")
+        if chave is not None and settings.serializacao_cache:
+            with self._lock:
+                if self._geracao == geracao:
+                    self._cache[chave] = dados
+        return dados
+
+    def serializar_com(self, registro: dict, campos: Dict[str, Any]) -> bytes:
+        """
+        JSON do registro com `campos` preenchidos — campos opcionais que
+        fecham o modelo e não existem no registro (ex.: os calculados de uma
+        busca). Reaproveita os bytes em cache do registro e só escreve os
+        valores desses campos.
+        """
+        sufixo = self._sufixo_nulo(tuple(campos))
+        dados = self.serializar(registro)
+        if sufixo is None or not dados.endswith(sufixo):
+            return self.modelo.model_validate({**registro, **campos}).model_dump_json().encode("utf-8")
+        valores = ",".join(
+            f"{json.dumps(nome)}:{json.dumps(valor, ensure_ascii=False)}" for nome, valor in campos.items()
+        )
+        return dados[:-len(sufixo)] + b"," + valores.encode("utf-8") + b"}"
+
+    def _sufixo_nulo(self, nomes: Tuple[str, ...]) -> Optional[bytes]:
+        """Final do JSON com os campos `nomes` nulos (None se não fecham o modelo)."""
+        if nomes not in self._sufixos:
+            campos = self.modelo.model_fields
+            ultimos = tuple(campos)[-len(nomes):] if nomes else ()
+            if nomes and ultimos == nomes and all(campos[nome].default is None for nome in nomes):
+                self._sufixos[nomes] = ("," + ",".join(f'"{nome}":null' for nome in nomes) + "}").encode("utf-8")
+            else:
+                self._sufixos[nomes] = None
+        return self._sufixos[nomes]
+
+    def lista_json(self, registros: Iterable[dict]) -> bytes:
+        """Array JSON com os registros (mesmo formato do response_model)."""
+        return b"[" + b",".join(self.serializar(r) for r in registros) + b"]"
+
+    def linhas_ndjson(self, registros: Iterable[dict]) -> bytes:
+        """Um registro JSON por linha."""
+        return b"".join(self.serializar(r) + b"\n" for r in registros)
+
+    def descartar(self, registro_id: Any):
+        """Invalida a entrada de um registro (escrito ou removido)."""
+        with self._lock:
+            self._geracao += 1
+            self._cache.pop(registro_id, None)
+
+    def limpar(self):
+        with self._lock:
+            self._geracao += 1
+            self._cache.clear()
+
+
+class _ObservadorCache(Observador):
+    """Descarta do cache os registros que a coleção substitui ou recarrega."""
+
+    def __init__(self, cache: CacheSerializacao):
+        self.cache = cache
+
+    def limpar(self):
+        self.cache.limpar()
+
+    def adicionar(self, registro: dict):
+        if registro.get("id") is not None:
+            self.cache.descartar(registro["id"])
+
+    def remover(self, registro: dict):
+        if registro.get("id") is not None:
+            self.cache.descartar(registro["id"])
+
+
+_caches: Dict[Tuple[Type[BaseModel], str], CacheSerializacao] = {}
+_lock = threading.Lock()
+
+
+def cache_serializacao(modelo: Type[BaseModel], colecao: Colecao) -> CacheSerializacao:
+    """
+    Retorna o cache compartilhado de um response model para os registros
+    de `colecao` (que passa a notificá-lo a cada escrita).
+    """
+    chave = (modelo, colecao.nome)
+    cache = _caches.get(chave)
+    if cache is None:
+        with _lock:
+            cache = _caches.get(chave)
+            if cache is None:
+                cache = CacheSerializacao(modelo)
+                # O cache começa vazio: só as escritas seguintes interessam
+                colecao.observar(_ObservadorCache(cache), atuais=False)
+                _caches[chave] = cache
+    return cache
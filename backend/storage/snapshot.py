@@ -0,0 +1,285 @@
+"""
+Snapshot binário das coleções JSON.
+Gravado ao lado de `<nome>.json` como `<nome>.snap`: os registros ficam em
+JSON compacto com uma tabela de offsets, e os índices da coleção já vêm
+prontos no arquivo. Na carga o snapshot é mapeado em memória (mmap) e cada
+registro só é decodificado quando acessado.
+
+Layout (inteiros na ordem de bytes da máquina que gravou):
+
+    MAGIC (8 bytes) | tamanho do cabeçalho (uint64) | cabeçalho JSON | seções
+
+O cabeçalho guarda a assinatura do arquivo JSON de origem (inode, mtime,
+tamanho), os campos indexados e a posição de cada seção. Um snapshot cuja
+origem não bate com o JSON atual é ignorado.
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import MutableSequence
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"CMSNAP01"
+VERSAO = 1
+
+# Alinhamento das seções (os arrays numéricos são lidos sem cópia)
+ALINHAMENTO = 8
+
+
+def _alinhar(tamanho: int) -> int:
+    return -tamanho % ALINHAMENTO
+
+
+# JSON compacto dos registros (Decimal dos schemas vira float, como no arquivo JSON)
+_CODIFICADOR = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=float)
+
+
+def _json_compacto(valor: Any) -> bytes:
+    return _CODIFICADOR.encode(valor).encode("utf-8")
+
+
+def gravar_snapshot(
+    caminho: Path,
+    origem: Tuple[int, int, int],
+    registros: Sequence[dict],
+    indices: Dict[str, Dict[Any, List[int]]],
+    unicos: Dict[Tuple[str, ...], Dict[Tuple[Any, ...], int]]
+):
+    """
+    Grava o snapshot dos registros e de seus índices (os mesmos da coleção
+    em memória) de forma atômica: arquivo temporário + os.replace.
+    """
+    secoes: List[Tuple[str, bytes]] = []
+
+    offsets = array("Q", [0])
+    blocos = []
+    for registro in registros:
+        dados = _json_compacto(registro)
+        blocos.append(dados)
+        offsets.append(offsets[-1] + len(dados))
+    secoes.append(("offsets", offsets.tobytes()))
+    secoes.append(("registros", b"".join(blocos)))
+    secoes.append(("ids", _json_compacto([registro.get("id") for registro in registros])))
+
+    # Índices hash: valores distintos + posições agrupadas por valor
+    for campo, indice in indices.items():
+        secoes.append((f"valores:{campo}", _json_compacto(list(indice.keys()))))
+        secoes.append((f"contagens:{campo}", array("I", map(len, indice.values())).tobytes()))
+        posicoes = array("I")
+        for lista in indice.values():
+            posicoes.extend(lista)
+        secoes.append((f"posicoes:{campo}", posicoes.tobytes()))
+
+    secoes.append(("unicos", _json_compacto([
+        [[list(chave), posicao] for chave, posicao in indice.items()]
+        for indice in unicos.values()
+    ])))
+
+    corpo = bytearray()
+    posicoes_secoes: Dict[str, Tuple[int, int]] = {}
+    for nome, dados in secoes:
+        posicoes_secoes[nome] = (len(corpo), len(dados))
+        corpo += dados
+        corpo += b"\0" * _alinhar(len(corpo))
+
+    cabecalho = _json_compacto({
+        "versao": VERSAO,
+        "ordem": sys.byteorder,
+        "origem": list(origem),
+        "total": len(registros),
+        "campos": list(indices.keys()),
+        "unicos": [list(campos) for campos in unicos.keys()],
+        "secoes": posicoes_secoes,
+    })
+    cabecalho += b" " * _alinhar(len(MAGIC) + 8 + len(cabecalho))
+
+    temporario = caminho.with_name(f"{caminho.name}.{os.getpid()}.tmp")
+    try:
+        with open(temporario, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<Q", len(cabecalho)))
+            f.write(cabecalho)
+            f.write(corpo)
+        # No Windows falha se o destino ainda estiver mapeado (ver `desmapear`)
+        os.replace(temporario, caminho)
+    except OSError:
+        temporario.unlink(missing_ok=True)
+        raise
+
+
+class SnapshotBinario:
+    """Snapshot mapeado em memória; lê registros e índices sob demanda."""
+
+    def __init__(self, mapa: mmap.mmap, cabecalho: dict, inicio_corpo: int):
+        self._mapa = mapa
+        self._inicio = inicio_corpo
+        self._secoes: Dict[str, List[int]] = cabecalho["secoes"]
+        self.total: int = cabecalho["total"]
+        self._offsets = self._array("offsets", "Q")
+        self._base_registros = self._inicio + self._secoes["registros"][0]
+
+    def _bytes(self, secao: str) -> bytes:
+        inicio, tamanho = self._secoes[secao]
+        return self._mapa[self._inicio + inicio:self._inicio + inicio + tamanho]
+
+    def _array(self, secao: str, tipo: str) -> memoryview:
+        """Seção numérica vista diretamente sobre o mmap (sem cópia)."""
+        inicio, tamanho = self._secoes[secao]
+        return memoryview(self._mapa)[self._inicio + inicio:self._inicio + inicio + tamanho].cast(tipo)
+
+    def registro(self, posicao: int) -> Any:
+        """Decodifica um único registro."""
+        inicio = self._base_registros + self._offsets[posicao]
+        fim = self._base_registros + self._offsets[posicao + 1]
+        return json.loads(self._mapa[inicio:fim])
+
+    def por_id(self) -> Dict[Any, int]:
+        ids = json.loads(self._bytes("ids"))
+        por_id = dict(zip(ids, range(len(ids))))
+        por_id.pop(None, None)
+        return por_id
+
+    def indice(self, campo: str) -> Dict[Any, List[int]]:
+        valores = json.loads(self._bytes(f"valores:{campo}"))
+        with self._array(f"contagens:{campo}", "I") as vista:
+            contagens = vista.tolist()
+        with self._array(f"posicoes:{campo}", "I") as vista:
+            posicoes = vista.tolist()
+        indice: Dict[Any, List[int]] = {}
+        inicio = 0
+        for valor, contagem in zip(valores, contagens):
+            indice[valor] = posicoes[inicio:inicio + contagem]
+            inicio += contagem
+        return indice
+
+    def unicos(self) -> List[Dict[Tuple[Any, ...], int]]:
+        return [
+            {tuple(chave): posicao for chave, posicao in pares}
+            for pares in json.loads(self._bytes("unicos"))
+        ]
+
+    def fechar(self):
+        """Desfaz o mapeamento (o snapshot não pode mais ser lido)."""
+        self._offsets.release()
+        self._mapa.close()
+
+
+def abrir_snapshot(
+    caminho: Path,
+    origem: Tuple[int, int, int],
+    campos: Sequence[str],
+    unicos: Sequence[Tuple[str, ...]]
+) -> Optional[SnapshotBinario]:
+    """
+    Mapeia o snapshot se ele corresponder ao JSON de `origem` e aos índices
+    configurados da coleção; caso contrário retorna None (carga pelo JSON).
+    """
+    try:
+        with open(caminho, "rb") as f:
+            mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    try:
+        if mapa[:len(MAGIC)] != MAGIC:
+            mapa.close()
+            return None
+        (tamanho,) = struct.unpack("<Q", mapa[len(MAGIC):len(MAGIC) + 8])
+        inicio_corpo = len(MAGIC) + 8 + tamanho
+        cabecalho = json.loads(mapa[len(MAGIC) + 8:inicio_corpo])
+        valido = (
+            cabecalho.get("versao") == VERSAO
+            and cabecalho.get("ordem") == sys.byteorder
+            and cabecalho.get("origem") == list(origem)
+            and cabecalho.get("campos") == list(campos)
+            and cabecalho.get("unicos") == [list(c) for c in unicos]
+        )
+        if not valido:
+            mapa.close()
+            return None
+        return SnapshotBinario(mapa, cabecalho, inicio_corpo)
+    except (ValueError, TypeError, KeyError, struct.error) as e:
+        logger.warning(f"Snapshot binário inválido ignorado ({caminho.name}): {e}")
+        mapa.close()
+        return None
+
+
+class RegistrosSnapshot(MutableSequence):
+    """
+    Lista de registros apoiada em um snapshot: cada posição é decodificada
+    no primeiro acesso e guardada. Registros inseridos ou substituídos
+    depois da carga ficam apenas em memória.
+    """
+
+    def __init__(self, snapshot: SnapshotBinario):
+        self._snapshot: Optional[SnapshotBinario] = snapshot
+        self._registros: List[Any] = [None] * snapshot.total
+        self._decodificados = [False] * snapshot.total
+
+    def __len__(self) -> int:
+        return len(self._registros)
+
+    def __getitem__(self, posicao):
+        if isinstance(posicao, slice):
+            return [self[p] for p in range(*posicao.indices(len(self)))]
+        if posicao < 0:
+            posicao += len(self._registros)
+        if posicao < len(self._decodificados) and not self._decodificados[posicao]:
+            self._registros[posicao] = self._snapshot.registro(posicao)
+            self._decodificados[posicao] = True
+        return self._registros[posicao]
+
+    def __setitem__(self, posicao: int, registro: Any):
+        if posicao < 0:
+            posicao += len(self._registros)
+        self._registros[posicao] = registro
+        if posicao < len(self._decodificados):
+            self._decodificados[posicao] = True
+
+    def __iter__(self) -> Iterator[Any]:
+        for posicao in range(len(self._registros)):
+            yield self[posicao]
+
+    def insert(self, posicao: int, registro: Any):
+        if posicao < len(self._registros):
+            self._materializar()
+        self._registros.insert(posicao, registro)
+
+    def __delitem__(self, posicao):
+        if isinstance(posicao, int) and posicao in (-1, len(self._registros) - 1):
+            # Remover o último não desloca as demais posições
+            del self._registros[-1]
+            del self._decodificados[len(self._registros):]
+            return
+        self._materializar()
+        del self._registros[posicao]
+
+    def _materializar(self):
+        """Decodifica o restante do snapshot (as posições deixam de corresponder a ele)."""
+        if self._snapshot is None:
+            return
+        for posicao, decodificado in enumerate(self._decodificados):
+            if not decodificado:
+                self._registros[posicao] = self._snapshot.registro(posicao)
+        self._decodificados = []
+        self._snapshot = None
+
+    def desmapear(self) -> List[Any]:
+        """
+        Decodifica o restante, fecha o mapeamento e retorna a lista comum
+        de registros. Necessário antes de substituir o arquivo do snapshot.
+        Quem ainda tiver esta sequência continua lendo os registros, agora
+        em memória.
+        """
+        snapshot = self._snapshot
+        self._materializar()
+        if snapshot is not None:
+            snapshot.fechar()
+        return self._registros
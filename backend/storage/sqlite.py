@@ -0,0 +1,379 @@
+"""
+Backend SQLite do repositório.
+Cada coleção vira uma tabela com o registro completo em JSON e colunas
+extraídas para os campos usados em filtros, com índices compostos.
+"""
+import json
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .colecao import FORMATOS_ID, ChavePagina, Colecao, Intervalo, RegistroDuplicado, _json_default, _satisfaz
+
+logger = logging.getLogger(__name__)
+
+
+# Colunas e índices por coleção (espelham os filtros usados pelos routers)
+ESQUEMAS = {
+    "pedidos": {
+        "colunas": ("escola_id", "produtor_id", "status"),
+        # listar_pedidos: escola+status, produtor+status, status
+        "indices": (("escola_id", "status"), ("produtor_id", "status"), ("status",)),
+    },
+    "consumo_diario": {
+        "colunas": ("escola_id", "professor_id", "data"),
+        # listar_consumo_escola / listar_consumo_professor: período ordenado por data
+        "indices": (("escola_id", "data"), ("professor_id", "data")),
+    },
+    "notas_fiscais": {
+        "colunas": ("escola_id", "numero_nota", "data_upload"),
+        # listar_notas_escola / histórico da escola: ordenado por data de upload
+        "indices": (("escola_id", "data_upload"),),
+        # enviar_nota_fiscal: uma nota por número em cada escola
+        "unicos": (("escola_id", "numero_nota"),),
+    },
+    "avaliacoes": {
+        "colunas": ("pedido_id", "escola_id", "produtor_id", "nota"),
+        # obter_avaliacoes_baixas: nota <= N; avaliações por produtor
+        "indices": (("nota",), ("produtor_id",), ("pedido_id",)),
+    },
+    "feedbacks": {
+        "colunas": ("escola_id",),
+        "indices": (("escola_id",),),
+    },
+    "analises_fiscalizacao": {
+        "colunas": ("nota_fiscal_id", "escola_id"),
+        "indices": (("nota_fiscal_id",), ("escola_id",)),
+    },
+    "jobs_cardapio": {
+        "colunas": ("escola_id", "status"),
+        # fila de cardápios: jobs pendentes/interrompidos na retomada
+        "indices": (("status",), ("escola_id",)),
+    },
+    "escolas": {"colunas": (), "indices": ()},
+    "produtores": {"colunas": (), "indices": ()},
+}
+
+
+class BancoSQLite:
+    """
+    Conexões SQLite por thread sobre um único arquivo em modo WAL.
+    WAL permite leituras concorrentes enquanto um processo escreve.
+    """
+
+    def __init__(self, caminho: Path):
+        self.caminho = caminho
+        self._local = threading.local()
+
+    def conexao(self) -> sqlite3.Connection:
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is None:
+            self.caminho.parent.mkdir(parents=True, exist_ok=True)
+            conexao = sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("PRAGMA synchronous=NORMAL")
+            conexao.execute("PRAGMA busy_timeout=30000")
+            self._local.conexao = conexao
+        return conexao
+
+
+class ColecaoSQLite(Colecao):
+    """
+    Coleção armazenada em uma tabela SQLite.
+
+    Filtros em colunas extraídas usam os índices da tabela; filtros em outros
+    campos recorrem a `json_extract` sobre o registro completo.
+    """
+
+    def __init__(self, nome: str, banco: BancoSQLite):
+        self.nome = nome
+        self.banco = banco
+        esquema = ESQUEMAS.get(nome, {"colunas": (), "indices": ()})
+        self.colunas: Tuple[str, ...] = esquema["colunas"]
+        self.indices: Tuple[Tuple[str, ...], ...] = esquema["indices"]
+        self.indices_unicos: Tuple[Tuple[str, ...], ...] = esquema.get("unicos", ())
+        self.formato_id: Optional[Tuple[str, int]] = FORMATOS_ID.get(nome)
+        self._tabela = f'"{nome}"'
+        self._observadores = []
+        self._criar_tabela()
+
+    def _criar_tabela(self):
+        colunas = "".join(f", {coluna}" for coluna in self.colunas)
+        conexao = self.banco.conexao()
+        conexao.execute(
+            f"CREATE TABLE IF NOT EXISTS {self._tabela} ("
+            f"seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT UNIQUE{colunas}, dados TEXT NOT NULL)"
+        )
+        for campos in self.indices:
+            nome_indice = f"idx_{self.nome}_{'_'.join(campos)}"
+            conexao.execute(
+                f"CREATE INDEX IF NOT EXISTS {nome_indice} ON {self._tabela} ({', '.join(campos)})"
+            )
+        for campos in self.indices_unicos:
+            sufixo = "_".join(campos)
+            try:
+                conexao.execute(
+                    f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{self.nome}_{sufixo} "
+                    f"ON {self._tabela} ({', '.join(campos)})"
+                )
+            except sqlite3.IntegrityError:
+                # Dados antigos já repetidos: a unicidade segue garantida na escrita
+                logger.warning(f"Índice único ({', '.join(campos)}) não criado em '{self.nome}': há duplicatas")
+                continue
+            # Bancos antigos tinham um índice comum com as mesmas colunas
+            conexao.execute(f"DROP INDEX IF EXISTS idx_{self.nome}_{sufixo}")
+
+    def _expressao(self, campo: str) -> str:
+        """Coluna extraída ou json_extract para campos não extraídos."""
+        if campo == "id" or campo in self.colunas:
+            return campo
+        if not campo.replace("_", "").isalnum():
+            raise ValueError(f"Campo inválido: {campo}")
+        return f"json_extract(dados, '$.{campo}')"
+
+    def _onde(self, filtros: Dict[str, Any], intervalo: Optional[Intervalo]) -> Tuple[str, List[Any]]:
+        """Monta a cláusula WHERE e os parâmetros."""
+        condicoes = []
+        parametros: List[Any] = []
+        for campo, valor in filtros.items():
+            condicoes.append(f"{self._expressao(campo)} = ?")
+            parametros.append(valor)
+        if intervalo is not None:
+            campo, minimo, maximo = intervalo
+            expressao = self._expressao(campo)
+            condicoes.append(f"{expressao} IS NOT NULL")
+            if minimo is not None:
+                condicoes.append(f"{expressao} >= ?")
+                parametros.append(minimo)
+            if maximo is not None:
+                condicoes.append(f"{expressao} <= ?")
+                parametros.append(maximo)
+        onde = f" WHERE {' AND '.join(condicoes)}" if condicoes else ""
+        return onde, parametros
+
+    def _linha(self, registro: dict) -> List[Any]:
+        """Valores da linha: id, colunas extraídas e o JSON completo."""
+        return (
+            [registro.get("id")]
+            + [registro.get(coluna) for coluna in self.colunas]
+            + [json.dumps(registro, ensure_ascii=False, default=_json_default)]
+        )
+
+    # ==================== LEITURA ====================
+
+    def consultar(
+        self,
+        filtros: Optional[Dict[str, Any]] = None,
+        intervalo: Optional[Intervalo] = None,
+        ordenar_por: Optional[str] = None,
+        decrescente: bool = False
+    ) -> Iterator[dict]:
+        onde, parametros = self._onde(filtros or {}, intervalo)
+        ordem = "seq"
+        if ordenar_por is not None:
+            ordem = f"{self._expressao(ordenar_por)} {'DESC' if decrescente else 'ASC'}, seq"
+        cursor = self.banco.conexao().execute(
+            f"SELECT dados FROM {self._tabela}{onde} ORDER BY {ordem}", parametros
+        )
+        for (dados,) in cursor:
+            yield json.loads(dados)
+
+    def obter(self, registro_id: str) -> Optional[dict]:
+        return self._ler(self.banco.conexao(), registro_id)
+
+    def pagina(
+        self,
+        filtros: Optional[Dict[str, Any]] = None,
+        intervalo: Optional[Intervalo] = None,
+        ordenar_por: Optional[str] = None,
+        decrescente: bool = False,
+        apos: Optional[ChavePagina] = None,
+        limite: Optional[int] = None
+    ) -> Tuple[List[dict], Optional[ChavePagina]]:
+        onde, parametros = self._onde(filtros or {}, intervalo)
+        expressao = self._expressao(ordenar_por) if ordenar_por is not None else "NULL"
+
+        if apos is not None:
+            valor_apos, seq_apos = apos
+            if ordenar_por is None:
+                condicao = "seq > ?"
+                parametros += [seq_apos]
+            elif valor_apos is None:
+                # NULL vem antes de tudo em ASC e depois de tudo em DESC
+                if decrescente:
+                    condicao = f"({expressao} IS NULL AND seq > ?)"
+                else:
+                    condicao = f"({expressao} IS NOT NULL OR seq > ?)"
+                parametros += [seq_apos]
+            else:
+                operador = "<" if decrescente else ">"
+                condicao = f"({expressao} {operador} ? OR ({expressao} = ? AND seq > ?))"
+                if decrescente:
+                    # NULLs ficam no fim em DESC: também vêm depois do cursor
+                    condicao = f"({condicao} OR {expressao} IS NULL)"
+                parametros += [valor_apos, valor_apos, seq_apos]
+            onde = f"{onde} AND {condicao}" if onde else f" WHERE {condicao}"
+
+        ordem = "seq"
+        if ordenar_por is not None:
+            ordem = f"{expressao} {'DESC' if decrescente else 'ASC'}, seq"
+        sql = f"SELECT seq, {expressao}, dados FROM {self._tabela}{onde} ORDER BY {ordem}"
+        if limite is not None:
+            # Um registro a mais indica se existe próxima página
+            sql += " LIMIT ?"
+            parametros += [limite + 1]
+
+        linhas = self.banco.conexao().execute(sql, parametros).fetchall()
+        proxima = None
+        if limite is not None and len(linhas) > limite:
+            linhas = linhas[:limite]
+            seq, valor, _ = linhas[-1]
+            proxima = (valor, seq)
+        return [json.loads(dados) for _, _, dados in linhas], proxima
+
+    def contar(self, intervalo: Optional[Intervalo] = None, **filtros) -> int:
+        onde, parametros = self._onde(filtros, intervalo)
+        return self.banco.conexao().execute(
+            f"SELECT COUNT(*) FROM {self._tabela}{onde}", parametros
+        ).fetchone()[0]
+
+    def valores(self, campo: str) -> List[Any]:
+        """Lista os valores distintos de um campo."""
+        expressao = self._expressao(campo)
+        cursor = self.banco.conexao().execute(
+            f"SELECT DISTINCT {expressao} FROM {self._tabela} WHERE {expressao} IS NOT NULL"
+        )
+        return [valor for (valor,) in cursor]
+
+    # ==================== ESCRITA ====================
+
+    def _sql_inserir(self, substituir: bool = False) -> str:
+        """
+        INSERT simples: um id existente é erro (IntegrityError), nunca uma
+        substituição silenciosa. `substituir=True` gera o upsert pelo id usado
+        na migração (reexecução idempotente); violações de índices únicos
+        continuam sendo erros nos dois casos.
+        """
+        campos = self.colunas + ("dados",)
+        colunas = ", ".join(("id",) + campos)
+        marcadores = ", ".join("?" for _ in range(len(campos) + 1))
+        sql = f"INSERT INTO {self._tabela} ({colunas}) VALUES ({marcadores})"
+        if substituir:
+            atualizacao = ", ".join(f"{campo} = excluded.{campo}" for campo in campos)
+            sql += f" ON CONFLICT(id) DO UPDATE SET {atualizacao}"
+        return sql
+
+    def obter_por_chave(self, campos: Tuple[str, ...], valores: Tuple[Any, ...]) -> Optional[dict]:
+        onde, parametros = self._onde(dict(zip(campos, valores)), None)
+        linha = self.banco.conexao().execute(
+            f"SELECT dados FROM {self._tabela}{onde} LIMIT 1", parametros
+        ).fetchone()
+        return json.loads(linha[0]) if linha else None
+
+    def _verificar_unicidade(self, conexao: sqlite3.Connection, registro: dict):
+        """Levanta RegistroDuplicado se outro registro ocupa a chave única."""
+        for campos in self.indices_unicos:
+            valores = tuple(registro.get(campo) for campo in campos)
+            condicoes = " AND ".join(f"{campo} = ?" for campo in campos)
+            existente = conexao.execute(
+                f"SELECT 1 FROM {self._tabela} WHERE {condicoes} AND id IS NOT ? LIMIT 1",
+                valores + (registro.get("id"),)
+            ).fetchone()
+            if existente:
+                raise RegistroDuplicado(self.nome, campos, valores)
+
+    def _aplicar(
+        self,
+        conexao: sqlite3.Connection,
+        operacao: dict,
+        mudancas: List[Tuple[Optional[dict], dict]]
+    ) -> Optional[dict]:
+        """
+        Executa uma operação dentro da transação corrente, anotando
+        (anterior, novo) em `mudancas` quando há observadores.
+        """
+        if operacao["op"] == "inserir":
+            registro = operacao["registro"]
+            if self._ler(conexao, registro.get("id")) is not None:
+                raise RegistroDuplicado(self.nome, ("id",), (registro["id"],))
+            self._verificar_unicidade(conexao, registro)
+            conexao.execute(self._sql_inserir(), self._linha(registro))
+            mudancas.append((None, registro))
+            return registro
+
+        antigo = self._ler(conexao, operacao["id"])
+        if antigo is None or not _satisfaz(antigo, operacao.get("condicoes")):
+            return None
+        novo = {**antigo, **operacao["alteracoes"]}
+        self._verificar_unicidade(conexao, novo)
+        mudancas.append((antigo, novo))
+        atribuicoes = ", ".join(f"{coluna} = ?" for coluna in self.colunas + ("dados",))
+        conexao.execute(
+            f"UPDATE {self._tabela} SET {atribuicoes} WHERE id = ?",
+            self._linha(novo)[1:] + [operacao["id"]]
+        )
+        return novo
+
+    def _atribuir_ids(self, conexao: sqlite3.Connection, operacoes: List[dict]):
+        """
+        Gera os ids sequenciais das inserções sem id, dentro da transação
+        corrente: o maior id é lido do banco (com o lock de escrita já
+        obtido), então processos diferentes nunca geram o mesmo id.
+        """
+        sem_id = [
+            operacao["registro"] for operacao in operacoes
+            if operacao["op"] == "inserir" and operacao["registro"].get("id") is None
+        ]
+        if not sem_id or self.formato_id is None:
+            return
+        prefixo, digitos = self.formato_id
+        # Faixa do prefixo no índice do id (ex: "PED" <= id < "PEE")
+        limite = prefixo[:-1] + chr(ord(prefixo[-1]) + 1)
+        maior = conexao.execute(
+            f"SELECT MAX(CAST(SUBSTR(id, ?) AS INTEGER)) FROM {self._tabela} "
+            f"WHERE id >= ? AND id < ? AND SUBSTR(id, ?) NOT GLOB '*[^0-9]*'",
+            (len(prefixo) + 1, prefixo, limite, len(prefixo) + 1)
+        ).fetchone()[0] or 0
+        for sequencia, registro in enumerate(sem_id, start=maior + 1):
+            registro["id"] = f"{prefixo}{sequencia:0{digitos}d}"
+
+    def _ler(self, conexao: sqlite3.Connection, registro_id: Any) -> Optional[dict]:
+        linha = conexao.execute(
+            f"SELECT dados FROM {self._tabela} WHERE id = ?", (registro_id,)
+        ).fetchone()
+        return json.loads(linha[0]) if linha else None
+
+    def aplicar_lote(self, operacoes: List[dict]) -> List[Optional[dict]]:
+        """
+        Aplica o lote em uma única transação (um commit no WAL).
+        Os observadores são notificados só depois do commit; escritas de
+        outros processos não passam por eles.
+        """
+        conexao = self.banco.conexao()
+        mudancas: List[Tuple[Optional[dict], dict]] = []
+        with conexao:
+            # BEGIN IMMEDIATE: leitura + escrita sem atualização perdida entre processos
+            conexao.execute("BEGIN IMMEDIATE")
+            self._atribuir_ids(conexao, operacoes)
+            resultados = [self._aplicar(conexao, operacao, mudancas) for operacao in operacoes]
+
+        for anterior, novo in mudancas:
+            if anterior is not None:
+                self._notificar_remocao(anterior)
+            self._notificar_adicao(novo)
+        return resultados
+
+    def inserir(self, registro: dict) -> dict:
+        return self.aplicar_lote([{"op": "inserir", "registro": registro}])[0]
+
+    def inserir_varios(self, registros: List[dict]):
+        """Insere (ou substitui, pelo id) vários registros em uma única transação."""
+        conexao = self.banco.conexao()
+        with conexao:
+            conexao.execute("BEGIN IMMEDIATE")
+            conexao.executemany(self._sql_inserir(substituir=True), [self._linha(r) for r in registros])
+
+    def atualizar(self, registro_id: str, alteracoes: dict) -> Optional[dict]:
+        return self.aplicar_lote([{"op": "atualizar", "id": registro_id, "alteracoes": alteracoes}])[0]
@@ -0,0 +1,105 @@
+"""
+Testes da camada de dados: journal, compactação e escritas concorrentes.
+"""
+import json
+import threading
+
+import pytest
+
+from config import settings
+from storage import ColecaoJournal, EscritorColecao, RegistroDuplicado, Repositorio
+
+
+@pytest.fixture
+def sem_fsync(monkeypatch):
+    monkeypatch.setattr(settings, "journal_fsync", False)
+
+
+def _abrir(pasta, nome="pedidos") -> ColecaoJournal:
+    """Nova instância da coleção (como a de outro processo, sem estado em memória)."""
+    return ColecaoJournal(nome, pasta / f"{nome}.json")
+
+
+def test_dois_escritores_no_mesmo_journal(tmp_path, monkeypatch, sem_fsync):
+    """Escritores de instâncias diferentes não perdem registros nem repetem ids."""
+    monkeypatch.setattr(settings, "journal_compactar_apos", 7)
+    escritores = [EscritorColecao(_abrir(tmp_path)), EscritorColecao(_abrir(tmp_path))]
+
+    def inserir(escritor: EscritorColecao, origem: str):
+        for numero in range(60):
+            escritor.inserir({"escola_id": "ESC001", "origem": origem, "numero": numero})
+
+    threads = [
+        threading.Thread(target=inserir, args=(escritor, origem))
+        for escritor, origem in zip(escritores, ("a", "b"))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    registros = _abrir(tmp_path).todos()
+    assert len(registros) == 120
+    assert len({registro["id"] for registro in registros}) == 120
+    assert sorted(registro["id"] for registro in registros)[-1] == "PED000120"
+    for origem in ("a", "b"):
+        assert sorted(r["numero"] for r in registros if r["origem"] == origem) == list(range(60))
+
+
+def test_reaplicacao_ignora_ultima_linha_truncada(tmp_path, sem_fsync):
+    colecao = _abrir(tmp_path)
+    for numero in range(3):
+        colecao.inserir({"numero": numero})
+    with open(colecao.arquivo_journal, "ab") as f:
+        f.write(b'{"op": "inserir", "registro": {"id": "PED0')
+
+    recarregada = _abrir(tmp_path)
+    assert [registro["numero"] for registro in recarregada.todos()] == [0, 1, 2]
+
+    # A próxima escrita descarta o resto da linha interrompida
+    recarregada.inserir({"numero": 3})
+    assert [registro["numero"] for registro in _abrir(tmp_path).todos()] == [0, 1, 2, 3]
+
+
+def test_compactacao_ida_e_volta(tmp_path, sem_fsync):
+    colecao = _abrir(tmp_path)
+    for numero in range(20):
+        colecao.inserir({"escola_id": f"ESC{numero % 3:03d}", "status": "pendente", "numero": numero})
+    colecao.atualizar("PED000005", {"status": "entregue"})
+    antes = colecao.todos()
+
+    colecao.compactar()
+
+    assert colecao.arquivo_journal.stat().st_size == 0
+    with open(colecao.arquivo, encoding="utf-8") as f:
+        assert json.load(f) == antes
+
+    recarregada = _abrir(tmp_path)
+    assert recarregada.todos() == antes
+    assert recarregada.obter("PED000005")["status"] == "entregue"
+    assert recarregada.contar(status="pendente") == 19
+    assert len(recarregada.filtrar(escola_id="ESC001")) == 7
+
+    # Escritas depois da compactação continuam a sequência de ids
+    assert recarregada.inserir({"numero": 20})["id"] == "PED000021"
+
+
+def test_nota_fiscal_duplicada_na_escola(tmp_path, sem_fsync):
+    """Índice único (escola_id, numero_nota) das notas fiscais."""
+    repositorio = Repositorio(tmp_path, backend="json")
+    escritor = repositorio.escritor("notas_fiscais")
+    nota = escritor.inserir({"escola_id": "ESC001", "numero_nota": "123", "valor_total": 10.0})
+    assert nota["id"] == "NF00001"
+
+    with pytest.raises(RegistroDuplicado) as erro:
+        escritor.inserir({"escola_id": "ESC001", "numero_nota": "123", "valor_total": 20.0})
+    assert erro.value.campos == ("escola_id", "numero_nota")
+
+    # Mesmo número em outra escola é outra nota
+    escritor.inserir({"escola_id": "ESC002", "numero_nota": "123", "valor_total": 30.0})
+    # Um id já existente também é duplicata, nunca substituição
+    with pytest.raises(RegistroDuplicado):
+        escritor.inserir({"id": "NF00001", "escola_id": "ESC003", "numero_nota": "9"})
+
+    notas = Repositorio(tmp_path, backend="json").colecao("notas_fiscais").todos()
+    assert [(n["escola_id"], n["valor_total"]) for n in notas] == [("ESC001", 10.0), ("ESC002", 30.0)]